@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.utils.functional import cached_property
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+from .tokens import ROLE_CLAIM
+
+
+class ClaimsUser(TokenUser):
+    """
+    Benutzer aus den Token-Claims (id, username, roles, is_staff), ohne DB-Zugriff.
+    Weitere Attribute (z. B. email) laden den User beim ersten Zugriff nach.
+    """
+
+    @cached_property
+    def id(self):
+        # simplejwt legt die User-ID als String in den Token
+        user_id = self.token[api_settings.USER_ID_CLAIM]
+        return int(user_id) if str(user_id).isdigit() else user_id
+
+    @cached_property
+    def _user(self):
+        return User.objects.get(id=self.id)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self._user, name)
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    Wie JWTAuthentication; mit settings.AUTH_STATELESS_READS werden lesende Requests
+    (GET/HEAD/OPTIONS) mit Rollen-Claim ohne User-Query authentifiziert.
+    Gesperrte/gelöschte User bleiben dann bis zum Ablauf des Access-Tokens angemeldet.
+    """
+
+    def authenticate(self, request):
+        self.stateless = (
+            getattr(settings, "AUTH_STATELESS_READS", False) and request.method in SAFE_METHODS
+        )
+        return super().authenticate(request)
+
+    def get_user(self, validated_token):
+        if self.stateless and ROLE_CLAIM in validated_token:
+            return ClaimsUser(validated_token)
+        return super().get_user(validated_token)
@@ -0,0 +1,34 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.provisioning import provision_patients
+
+
+class Command(BaseCommand):
+    help = "Legt Patienten-Accounts aus einer CSV-Datei (username,password[,email]) an."
+
+    def add_arguments(self, parser):
+        parser.add_argument("csv_file")
+        parser.add_argument("--workers", type=int, default=None, help="Prozesse für das Passwort-Hashing (0 = keiner)")
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Patienten pro Transaktion")
+
+    def handle(self, *args, **options):
+        try:
+            with open(options["csv_file"], newline="", encoding="utf-8-sig") as f:
+                rows = list(csv.DictReader(f))
+        except OSError as e:
+            raise CommandError(str(e))
+
+        created = failed = 0
+        size = options["chunk_size"]
+        for offset in range(0, len(rows), size):
+            for result in provision_patients(rows[offset:offset + size], workers=options["workers"]):
+                if result["status"] == 201:
+                    created += 1
+                else:
+                    failed += 1
+                    # Zeilennummer in der Datei (Kopfzeile = 1)
+                    self.stderr.write(f"Zeile {offset + result['index'] + 2} ({result['username']}): {result['detail']}")
+
+        self.stdout.write(self.style.SUCCESS(f"{created} Patienten angelegt, {failed} übersprungen."))
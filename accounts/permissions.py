@@ -1,13 +1,32 @@
 from rest_framework.permissions import BasePermission
 
+from .authentication import ClaimsUser
+from .tokens import ROLE_CLAIM, ROLE_GROUPS, ROLE_PATIENT, ROLE_PRACTITIONER
+
+
 def _in_group(user, group_name: str) -> bool:
     return bool(user and user.is_authenticated and user.groups.filter(name=group_name).exists())
 
+
+def has_role(request, role: str) -> bool:
+    """
+    Rolle aus dem JWT-Claim nur bei zustandsloser Authentifizierung (ClaimsUser, siehe
+    AUTH_STATELESS_READS); sonst ist der User ohnehin geladen und die Gruppen gelten,
+    damit ein entzogener Zugang sofort wirkt.
+    """
+    user = request.user
+    if not (user and user.is_authenticated):
+        return False
+    if isinstance(user, ClaimsUser):
+        return role in user.token[ROLE_CLAIM]
+    return _in_group(user, ROLE_GROUPS[role])
+
+
 class IsPatient(BasePermission):
     def has_permission(self, request, view):
-        return _in_group(request.user, "patients")
+        return has_role(request, ROLE_PATIENT)
+
 
 class IsPractitioner(BasePermission):
     def has_permission(self, request, view):
-        return _in_group(request.user, "practitioners")
-
+        return has_role(request, ROLE_PRACTITIONER)
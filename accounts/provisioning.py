@@ -0,0 +1,135 @@
+"""
+Massenanlage von Patienten-Accounts (Onboarding eines Studienzentrums).
+
+Die Passwort-Hashes (PBKDF2, bewusst teuer) berechnet das Management-Command
+provision_patients in einem Prozess-Pool, der HTTP-Endpoint im eigenen Prozess (kein
+fork im Request-Worker, daher dort das kleine MAX_ROWS). User, Gruppenzugehörigkeit und
+Patient-Profile werden danach mit je einem bulk_create angelegt.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.db import transaction
+from rest_framework import status
+
+from patients.models import Patient, assign_pseudonyms
+
+from .tokens import ROLE_GROUPS, ROLE_PATIENT
+
+DEFAULTS = {
+    "MAX_ROWS": 50,                 # pro Request an register/bulk/; größere Mengen per Command
+    "HASH_WORKERS": None,           # provision_patients: None = verfügbare CPUs, 0 = kein Pool
+    "PARALLEL_MIN_ROWS": 20,        # darunter lohnt sich der Pool nicht
+}
+
+
+def get_provisioning_settings() -> dict:
+    return {**DEFAULTS, **getattr(settings, "PATIENT_PROVISIONING", {})}
+
+
+def _available_cpus() -> int:
+    # cpu_count() zählt auch CPUs, auf die der Prozess (Container/Affinity) keinen Zugriff hat
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def hash_passwords(passwords: list, workers: int | None = None) -> list:
+    conf = get_provisioning_settings()
+    if workers is None:
+        workers = conf["HASH_WORKERS"]
+    if workers is None:
+        workers = _available_cpus()
+    if workers <= 1 or len(passwords) < conf["PARALLEL_MIN_ROWS"]:
+        return [make_password(password) for password in passwords]
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+        return list(pool.map(make_password, passwords, chunksize=max(1, len(passwords) // (workers * 4))))
+
+
+def _error(index: int, username, detail: str, code: int = status.HTTP_400_BAD_REQUEST) -> dict:
+    return {"index": index, "username": username, "status": code, "detail": detail}
+
+
+def validate_rows(rows: list) -> tuple:
+    """
+    -> (gültige [(index, username, password, email)], Fehler-Ergebnisse nach Index)
+    """
+    results = {}
+    candidates = []
+    seen = set()
+    for index, row in enumerate(rows):
+        if not isinstance(row, dict):
+            results[index] = _error(index, None, "Eintrag muss ein Objekt sein.")
+            continue
+        username = str(row.get("username") or "").strip()
+        password = row.get("password")
+        if not username or not password:
+            results[index] = _error(index, username or None, "username und password sind erforderlich.")
+            continue
+        if len(username) > User._meta.get_field("username").max_length:
+            results[index] = _error(index, username, "username ist zu lang.")
+            continue
+        if username in seen:
+            results[index] = _error(index, username, "username kommt mehrfach vor.")
+            continue
+        seen.add(username)
+        candidates.append((index, username, str(password), str(row.get("email") or "")))
+
+    existing = set(
+        User.objects.filter(username__in=[username for _, username, _, _ in candidates])
+        .values_list("username", flat=True)
+    )
+    valid = []
+    for index, username, password, email in candidates:
+        if username in existing:
+            results[index] = _error(index, username, "User already exists", status.HTTP_409_CONFLICT)
+        else:
+            valid.append((index, username, password, email))
+    return valid, results
+
+
+def provision_patients(rows: list, workers: int | None = 0) -> list:
+    """
+    Legt Patienten (User + Gruppe "patients" + Patient-Profil mit Pseudonym) an.
+    Liefert pro Eintrag {"index", "username", "status", ...} in Eingabereihenfolge.
+    workers: Prozesse für das Hashing; 0 = im aktuellen Prozess, None = HASH_WORKERS.
+    """
+    valid, results = validate_rows(rows)
+    if valid:
+        hashes = hash_passwords([password for _, _, password, _ in valid], workers)
+        users = [
+            User(username=username, email=email, password=password_hash)
+            for (_, username, _, email), password_hash in zip(valid, hashes)
+        ]
+
+        with transaction.atomic():
+            User.objects.bulk_create(users)
+            if any(user.pk is None for user in users):
+                # Backends ohne RETURNING: IDs über den (eindeutigen) Benutzernamen nachladen
+                ids = dict(User.objects.filter(username__in=[u.username for u in users]).values_list("username", "id"))
+                for user in users:
+                    user.pk = ids[user.username]
+
+            group, _ = Group.objects.get_or_create(name=ROLE_GROUPS[ROLE_PATIENT])
+            Membership = User.groups.through
+            Membership.objects.bulk_create([Membership(user_id=user.pk, group_id=group.pk) for user in users])
+
+            patients = assign_pseudonyms([Patient(user_id=user.pk) for user in users])
+            Patient.objects.bulk_create(patients)
+
+        for (index, username, _, _), user, patient in zip(valid, users, patients):
+            results[index] = {
+                "index": index,
+                "username": username,
+                "status": status.HTTP_201_CREATED,
+                "id": user.pk,
+                "pseudonym": patient.pseudonym,
+            }
+
+    return [results[index] for index in range(len(rows))]
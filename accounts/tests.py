@@ -1,3 +1,51 @@
-from django.test import TestCase
+from django.contrib.auth.models import Group, User
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from .tokens import ROLE_CLAIM, ROLE_PRACTITIONER, tokens_for_user
+
+
+class RoleClaimTests(TestCase):
+    """
+    Rollen-Claims im JWT: nur zustandslos ausgewertet, sonst gelten die Gruppen.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="doc", password="pw")
+        self.group = Group.objects.get_or_create(name="practitioners")[0]
+        self.user.groups.add(self.group)
+        response = APIClient().post("/api/accounts/login/", {"username": "doc", "password": "pw"}, format="json")
+        self.assertEqual(response.json()["roles"], [ROLE_PRACTITIONER])
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.json()['access']}")
+
+    def revoke(self):
+        self.user.groups.remove(self.group)
+
+    def test_claims_only_in_access_token(self):
+        refresh, access = tokens_for_user(self.user)
+        self.assertNotIn(ROLE_CLAIM, refresh)
+        self.assertEqual(access[ROLE_CLAIM], [ROLE_PRACTITIONER])
+
+    @override_settings(AUTH_STATELESS_READS=False)
+    def test_stateful_uses_groups(self):
+        self.assertEqual(self.client.get("/api/practitioners/me/").status_code, 200)
+
+        self.revoke()
+
+        self.assertEqual(self.client.get("/api/practitioners/me/").status_code, 403)
+
+    @override_settings(AUTH_STATELESS_READS=True)
+    def test_stateless_reads_use_claim(self):
+        self.revoke()
+
+        # zustandslos gilt der Claim bis zum Ablauf des Access-Tokens (AUTH_STATELESS_READS)
+        self.assertEqual(self.client.get("/api/practitioners/me/").status_code, 200)
+
+    @override_settings(AUTH_STATELESS_READS=True)
+    def test_stateless_writes_use_groups(self):
+        self.revoke()
+
+        response = self.client.post("/api/practitioners/assign-patients/", {"patient_ids": [1]}, format="json")
+
+        self.assertEqual(response.status_code, 403)
@@ -0,0 +1,42 @@
+"""
+JWT mit Rollen-Claims: die Gruppenzugehörigkeit wird beim Login einmal gelesen und in
+den Access-Token geschrieben. Ausgewertet wird der Claim nur bei zustandsloser
+Authentifizierung (AUTH_STATELESS_READS); dort wirken Änderungen an den Gruppen erst mit
+dem Ablauf des Access-Tokens, sonst sofort (accounts.permissions).
+"""
+
+from rest_framework_simplejwt.tokens import RefreshToken
+
+ROLE_CLAIM = "roles"
+
+ROLE_PATIENT = "patient"
+ROLE_PRACTITIONER = "practitioner"
+ROLE_ADMIN = "admin"
+
+# Rolle -> Django-Gruppe
+ROLE_GROUPS = {
+    ROLE_PATIENT: "patients",
+    ROLE_PRACTITIONER: "practitioners",
+}
+
+
+def user_roles(user) -> list:
+    group_roles = {group: role for role, group in ROLE_GROUPS.items()}
+    roles = {group_roles[name] for name in user.groups.values_list("name", flat=True) if name in group_roles}
+    if user.is_staff:
+        roles.add(ROLE_ADMIN)
+    return sorted(roles)
+
+
+def tokens_for_user(user) -> tuple:
+    """
+    -> (Refresh-Token, Access-Token mit roles, username und is_staff). Die Claims stehen
+    nur im kurzlebigen Access-Token, nicht im Refresh-Token, aus dem neue Access-Tokens
+    abgeleitet würden.
+    """
+    refresh = RefreshToken.for_user(user)
+    access = refresh.access_token
+    access[ROLE_CLAIM] = user_roles(user)
+    access["username"] = user.username
+    access["is_staff"] = user.is_staff
+    return refresh, access
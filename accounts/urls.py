@@ -3,6 +3,7 @@ from . import views
 
 urlpatterns = [
     path('register/', views.register),
+    path('register/bulk/', views.register_bulk),
     path('login/', views.login),
     path("create-practitioner/", views.create_practitioner),
 ]
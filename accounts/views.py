@@ -1,11 +1,14 @@
 from django.shortcuts import render
 
 from django.contrib.auth.models import User, Group
+from django.db import IntegrityError
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework_simplejwt.tokens import RefreshToken
+
+from .provisioning import get_provisioning_settings, provision_patients
+from .tokens import ROLE_CLAIM, tokens_for_user
 
 
 
@@ -46,10 +49,11 @@ def login(request):
             status=status.HTTP_401_UNAUTHORIZED
         )
 
-    refresh = RefreshToken.for_user(user)
+    refresh, access = tokens_for_user(user)
     return Response({
         "refresh": str(refresh),
-        "access": str(refresh.access_token),
+        "access": str(access),
+        "roles": access[ROLE_CLAIM],
     })
 
 @api_view(['POST'])
@@ -72,3 +76,37 @@ def create_practitioner(request):
     user.groups.add(practitioners_group)
 
     return Response({"message": "Practitioner created"}, status=status.HTTP_201_CREATED)
+
+
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def register_bulk(request):
+    """
+    POST /api/accounts/register/bulk/  (nur Admins)
+
+    Body: {"patients": [{"username": "...", "password": "...", "email": "..."}, ...]}
+
+    Legt alle gültigen Einträge als Patienten an (Gruppe "patients" + Pseudonym),
+    ungültige/vorhandene werden übersprungen. Ergebnis pro Eintrag in "results".
+    Die Passwörter werden im Request-Prozess gehasht; größere Mengen über
+    `manage.py provision_patients`.
+    """
+    rows = request.data.get("patients") if isinstance(request.data, dict) else None
+    if not isinstance(rows, list) or not rows:
+        return Response({"error": "patients (Liste) ist erforderlich"}, status=status.HTTP_400_BAD_REQUEST)
+
+    max_rows = get_provisioning_settings()["MAX_ROWS"]
+    if len(rows) > max_rows:
+        return Response({"error": f"Maximal {max_rows} Patienten pro Request"}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        results = provision_patients(rows)
+    except IntegrityError:
+        # gleichzeitig angelegter Benutzername: nichts wurde gespeichert
+        return Response(
+            {"error": "Benutzernamen wurden parallel angelegt, bitte erneut senden"},
+            status=status.HTTP_409_CONFLICT,
+        )
+
+    created = sum(1 for result in results if result["status"] == status.HTTP_201_CREATED)
+    return Response({"created": created, "failed": len(results) - created, "results": results})
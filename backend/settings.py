@@ -134,10 +134,97 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "accounts.authentication.ClaimsJWTAuthentication",
     ),
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
 }
 CORS_ALLOW_ALL_ORIGINS = True
 
+# Rollen (patient/practitioner/admin) stehen als Claims im JWT (accounts.tokens).
+# True: lesende Requests werden ohne User-Query authentifiziert (accounts.authentication);
+# Sperren/Gruppenänderungen greifen dann erst nach Ablauf des Access-Tokens.
+AUTH_STATELESS_READS = False
+
+# Questionnaire-Definitionen ändern sich selten: so lange (Sekunden) dürfen Clients
+# sie cachen, danach wird per If-None-Match/ETag revalidiert (304 ohne Body).
+QUESTIONNAIRE_CACHE_MAX_AGE = 300
+
+# Firely FHIR-Server (questionnaires.firely_client)
+# Timeouts in Sekunden; Retries mit Backoff nur für idempotente Requests.
+FIRELY = {
+    "BASE_URL": "http://localhost:4080",
+    "POOL_CONNECTIONS": 4,
+    "POOL_MAXSIZE": 20,
+    "CONNECT_TIMEOUT": 3.05,
+    "READ_TIMEOUT": 30,
+    "MAX_RETRIES": 3,
+    "BACKOFF_FACTOR": 0.5,
+    "PAGE_SIZE": 200,
+    # Abruf für viele Patienten: "subject" (Komma-ODER in einer Suche), "fanout" (eine
+    # Suche pro Patient, parallel) oder "auto" (subject, Rückfall auf fanout)
+    "MULTI_PATIENT_STRATEGY": "auto",
+    "SUBJECTS_PER_SEARCH": 50,
+    "FANOUT_WORKERS": 8,
+    "MULTI_FETCH_TIMEOUT": 120,
+}
+
+# Nur unter ASGI (backend.asgi) sinnvoll: Submit- und Patienten-Responses-Endpoint
+# laufen dann als async Views mit httpx (pip install httpx).
+QUESTIONNAIRES_ASYNC_VIEWS = False
+
+# Write-behind Outbox: Submits werden lokal gespeichert (QuestionnaireResponseModel)
+# und von `python manage.py drain_firely_outbox --loop` gebündelt an Firely übertragen.
+FIRELY_OUTBOX = {
+    "ENABLED": False,           # True nur mit laufendem drain_firely_outbox-Worker
+    "BATCH_SIZE": 100,
+    "MAX_ATTEMPTS": 10,
+    "RETRY_BACKOFF": 30,
+    "RETRY_BACKOFF_MAX": 3600,
+    "LEASE": 300,
+}
+
+# Lokaler Cache der Patienten-Responses: höchstens so oft (Sekunden) wird pro Patient
+# per _lastUpdated=ge<cursor> in Firely nach neuen Responses gefragt.
+RESPONSE_CACHE_SYNC_INTERVAL = 15
+
+
+
+# Asynchrone Export-Jobs (exports.jobs): Dateien werden von
+# `python manage.py run_export_jobs --loop` unter ROOT erzeugt. Parquet braucht pyarrow.
+EXPORT_JOBS = {
+    "ROOT": BASE_DIR / "exports_data",
+    "CHUNK_SIZE": 5000,
+    "PATIENT_CHUNK_SIZE": 500,
+    "LEASE": 3600,
+    "MAX_ATTEMPTS": 3,
+}
+
+# Pseudonyme der Patienten (patients.pseudonyms): PREFIX-<WIDTH Ziffern>, kollisionsfrei
+# über einen Zähler + geheime Permutation. KEY (Standard: aus SECRET_KEY) nach der
+# ersten Vergabe nicht mehr ändern. Alte 5-stellige Pseudonyme bleiben gültig.
+PSEUDONYMS = {
+    "PREFIX": "SL",
+    "WIDTH": 8,
+}
 
+# Kohorten-Auswertung (GET /api/practitioners/cohort/, patients.cohort): gecacht pro
+# Practitioner, invalidiert bei neuen Scores. WORSENING: Änderung zwischen den letzten
+# beiden Scores, ab der ein Patient als verschlechtert gilt (direction 1 = höher ist schlechter).
+COHORT_ANALYTICS = {
+    "CACHE_TIMEOUT": 600,
+    "TREND_MONTHS": 6,
+    "WORSENING": {
+        "irls": {"direction": 1, "threshold": 5},
+        "mhi5": {"direction": -1, "threshold": 10},
+    },
+}
+
+# Schlaftagebuch (questionnaires.sleep_diary, GET /api/patients/<id>/diary/):
+# DURATION_UNIT = Einheit der Dauer-Items 1/2 ("min" oder "h"), WINDOWS = rollierende
+# Fenster in Tagen, nachgeführt beim Speichern neuer Einträge, MAX_SPAN_HOURS = längere
+# Spannen zwischen zwei Uhrzeiten gelten als Eingabefehler.
+SLEEP_DIARY = {
+    "DURATION_UNIT": "min",
+    "WINDOWS": (7, 30),
+    "MAX_SPAN_HOURS": 16,
+}
@@ -1,3 +1,10 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import ExportJob
+
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "dataset", "format", "requested_by", "status", "row_count", "created_at", "finished_at")
+    list_filter = ("status", "dataset", "format")
+    readonly_fields = ("created_at", "started_at", "finished_at")
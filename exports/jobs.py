@@ -0,0 +1,465 @@
+"""
+Export-Jobs: Datensätze werden chunkweise aus der DB gelesen und von einem Writer
+(CSV, NDJSON, Parquet) in eine Spool-Datei geschrieben, die erst nach Abschluss
+atomar an ihren endgültigen Platz verschoben wird.
+"""
+
+import csv
+import logging
+import os
+from dataclasses import dataclass
+from operator import itemgetter
+from datetime import datetime, timedelta
+from itertools import islice
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+from patients.models import PractitionerPatient
+from questionnaires.firely_client import iter_search
+from questionnaires.models import QuestionnaireResponseModel, QuestionnaireScore
+from questionnaires.response_cache import parse_fhir_datetime, sync_patient
+
+from .models import ExportJob
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "ROOT": Path(settings.BASE_DIR) / "exports_data",
+    "CHUNK_SIZE": 5000,         # Zeilen pro DB-Chunk / Parquet Row-Group
+    "PATIENT_CHUNK_SIZE": 500,  # Patienten pro Score-Query
+    "LEASE": 3600,              # Sekunden, die ein laufender Job einem Worker gehört
+    "MAX_ATTEMPTS": 3,
+}
+
+
+def get_export_settings() -> dict:
+    return {**DEFAULTS, **getattr(settings, "EXPORT_JOBS", {})}
+
+
+def export_root() -> Path:
+    return Path(get_export_settings()["ROOT"])
+
+
+def job_path(job: ExportJob) -> Path:
+    return export_root() / job.file_name
+
+
+def _chunked(iterable, size: int):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+# ----------------------------
+# Datensätze
+# ----------------------------
+
+@dataclass(frozen=True)
+class Column:
+    name: str
+    type: str       # "string" | "int" | "float" | "timestamp" | "resource" (JSON-Objekt, nur NDJSON)
+
+
+@dataclass(frozen=True)
+class Dataset:
+    columns: tuple
+    rows: object    # rows(job, conf) -> Iterable[tuple]
+    formats: tuple | None = None        # None = alle Writer
+    content_type: str | None = None     # überschreibt den Content-Type des Writers beim Download
+
+    def supports(self, fmt: str) -> bool:
+        return self.formats is None or fmt in self.formats
+
+
+def assigned_patients(practitioner_id: int):
+    """
+    (User-ID, Pseudonym) der zugeordneten Patienten, per server-seitigem Cursor.
+    """
+    return (
+        PractitionerPatient.objects.filter(practitioner_id=practitioner_id)
+        .order_by("patient_id")
+        .values_list("patient_id", "patient__patient_profile__pseudonym")
+        .iterator(chunk_size=get_export_settings()["CHUNK_SIZE"])
+    )
+
+
+def sync_patients(patient_ids):
+    """
+    Lädt vor dem Lesen neue Responses der Patienten aus Firely in den lokalen Cache
+    (inkrementell, siehe response_cache.sync_patient). Schlägt ein Sync fehl, bricht der
+    Job ab und wird wiederholt, statt einen unvollständigen Export zu liefern.
+    """
+    for patient_id in patient_ids:
+        sync_patient(patient_id)
+
+
+SCORE_COLUMNS = (
+    Column("patient_id", "string"),
+    Column("pseudonym", "string"),
+    Column("questionnaire", "string"),
+    Column("authored", "timestamp"),
+    Column("total_score", "float"),
+    Column("interpretation", "string"),
+    Column("sleep_quality", "int"),
+    Column("nighttime", "int"),
+    Column("daytime_relaxation", "int"),
+    Column("control_activity", "int"),
+)
+
+
+def patient_score_rows(job: ExportJob, conf: dict):
+    """
+    Alle zugeordneten Patienten mit ihrem vollständigen Score-Verlauf (QuestionnaireScore),
+    nach einem Sync mit Firely. Die Firely-Patienten-ID ist die User-ID als String.
+    """
+    for patients in _chunked(assigned_patients(job.requested_by_id), conf["PATIENT_CHUNK_SIZE"]):
+        pseudonyms = {str(user_id): pseudonym or "" for user_id, pseudonym in patients}
+        sync_patients(pseudonyms)
+        scores = (
+            QuestionnaireScore.objects.filter(patient_id__in=list(pseudonyms))
+            .order_by("patient_id", "questionnaire_key", "authored")
+            .values_list(
+                "patient_id",
+                "questionnaire_slug",
+                "authored",
+                "total_score",
+                "interpretation",
+                "sleep_quality",
+                "nighttime",
+                "daytime_relaxation",
+                "control_activity",
+            )
+            .iterator(chunk_size=conf["CHUNK_SIZE"])
+        )
+        for patient_id, *rest in scores:
+            yield (patient_id, pseudonyms[patient_id], *rest)
+
+
+def _changed_since(since):
+    # Cache-Zeilen haben kein eigenes updated_at: neu angelegt, an Firely zugestellt
+    # oder per Sync mit neuerem meta.lastUpdated übernommen
+    return Q(created_at__gte=since) | Q(delivered_at__gte=since) | Q(last_updated__gte=since)
+
+
+def _response_resource(fhir_response: dict, fhir_id: str) -> dict:
+    return {"resourceType": "QuestionnaireResponse", **fhir_response, "id": fhir_id}
+
+
+def firely_response_params(since) -> list:
+    params = [("_sort", "_lastUpdated")]
+    if since is not None:
+        params.append(("_lastUpdated", f"ge{since.isoformat()}"))
+    return params
+
+
+def questionnaire_response_rows(job: ExportJob, conf: dict):
+    """
+    QuestionnaireResponses als FHIR-Ressourcen (FHIR Bulk Data $export).
+    params: scope "all" (alle) oder "patients" (zugeordnete Patienten des Anfragenden),
+    since (ISO-Zeitpunkt, nur seitdem neue/geänderte Responses).
+
+    scope "all" liest direkt aus Firely. Für "patients" wird der Cache der Patienten
+    vorher synchronisiert; exportiert werden nur an Firely zugestellte Responses, damit
+    ausstehende Outbox-Einträge nicht ohne id und nach der Zustellung ein zweites Mal
+    erscheinen.
+    """
+    since = parse_fhir_datetime(job.params.get("since"))
+
+    if job.params.get("scope") == "all":
+        for resource in iter_search("QuestionnaireResponse", firely_response_params(since)):
+            yield (resource,)
+        return
+
+    qs = QuestionnaireResponseModel.objects.filter(
+        delivery_status=QuestionnaireResponseModel.STATUS_DELIVERED,
+    ).exclude(fhir_id="")
+    if since is not None:
+        qs = qs.filter(_changed_since(since))
+
+    for patients in _chunked(assigned_patients(job.requested_by_id), conf["PATIENT_CHUNK_SIZE"]):
+        patient_ids = [str(user_id) for user_id, _ in patients]
+        sync_patients(patient_ids)
+        rows = (
+            qs.filter(patient_id__in=patient_ids)
+            .order_by("id")
+            .values_list("fhir_response", "fhir_id")
+            .iterator(chunk_size=conf["CHUNK_SIZE"])
+        )
+        for fhir_response, fhir_id in rows:
+            yield (_response_resource(fhir_response, fhir_id),)
+
+
+DATASETS = {
+    "patient_scores": Dataset(columns=SCORE_COLUMNS, rows=patient_score_rows),
+    "questionnaire_responses": Dataset(
+        columns=(Column("resource", "resource"),),
+        rows=questionnaire_response_rows,
+        formats=(ExportJob.FORMAT_NDJSON,),
+        content_type="application/fhir+ndjson",
+    ),
+}
+
+
+def register_dataset(name: str, dataset: Dataset):
+    DATASETS[name] = dataset
+
+
+# ----------------------------
+# Writer
+# ----------------------------
+
+class CsvWriter:
+    extension = "csv"
+    content_type = "text/csv"
+
+    def __init__(self, path: Path, columns: tuple):
+        self.file = open(path, "w", encoding="utf-8", newline="")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow([c.name for c in columns])
+
+    def write_rows(self, rows: list):
+        self.writer.writerows(
+            [value.isoformat() if isinstance(value, datetime) else value for value in row]
+            for row in rows
+        )
+
+    def close(self):
+        self.file.close()
+
+
+class NdjsonWriter:
+    extension = "ndjson"
+    content_type = "application/x-ndjson"
+
+    def __init__(self, path: Path, columns: tuple):
+        self.file = open(path, "w", encoding="utf-8")
+        self.names = [c.name for c in columns]
+        self.encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(",", ":"))
+        if len(columns) == 1 and columns[0].type == "resource":
+            # eine Ressource pro Zeile (FHIR NDJSON) statt {"spalte": wert}
+            self.line = itemgetter(0)
+
+    def write_rows(self, rows: list):
+        self.file.write("".join(self.encoder.encode(self.line(row)) + "\n" for row in rows))
+
+    def line(self, row):
+        return dict(zip(self.names, row))
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    extension = "parquet"
+    content_type = "application/vnd.apache.parquet"
+
+    def __init__(self, path: Path, columns: tuple):
+        if pa is None:
+            raise ImproperlyConfigured("pyarrow ist nicht installiert (pip install pyarrow).")
+        types = {
+            "string": pa.string(),
+            "int": pa.int64(),
+            "float": pa.float64(),
+            "timestamp": pa.timestamp("us", tz="UTC"),
+        }
+        self.schema = pa.schema([(c.name, types[c.type]) for c in columns])
+        self.writer = pq.ParquetWriter(str(path), self.schema, compression="zstd")
+
+    def write_rows(self, rows: list):
+        # ein Chunk = eine Row-Group, spaltenweise aufgebaut
+        columns = list(zip(*rows))
+        arrays = [pa.array(values, type=field.type) for values, field in zip(columns, self.schema)]
+        self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+WRITERS = {
+    ExportJob.FORMAT_CSV: CsvWriter,
+    ExportJob.FORMAT_NDJSON: NdjsonWriter,
+    ExportJob.FORMAT_PARQUET: ParquetWriter,
+}
+
+
+def format_available(fmt: str) -> bool:
+    return fmt in WRITERS and (fmt != ExportJob.FORMAT_PARQUET or pa is not None)
+
+
+# ----------------------------
+# Worker
+# ----------------------------
+
+def claim_job(lease: int) -> ExportJob | None:
+    """
+    Nächsten wartenden (oder verwaisten) Job für diesen Worker reservieren.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        qs = ExportJob.objects.filter(
+            Q(status=ExportJob.STATUS_QUEUED)
+            | Q(status=ExportJob.STATUS_RUNNING, lease_until__lt=now)  # Worker abgestürzt
+        ).order_by("created_at")
+        if connection.features.has_select_for_update_skip_locked:
+            qs = qs.select_for_update(skip_locked=True)
+
+        job = qs.first()
+        if job is None:
+            return None
+        job.status = ExportJob.STATUS_RUNNING
+        job.lease_until = now + timedelta(seconds=lease)
+        job.started_at = now
+        job.attempts += 1
+        job.save(update_fields=["status", "lease_until", "started_at", "attempts"])
+    return job
+
+
+class JobCancelled(Exception):
+    """
+    Der Job wurde abgebrochen, gelöscht oder nach Ablauf der Lease von einem anderen
+    Worker übernommen; dieser Worker darf nicht weiterschreiben.
+    """
+
+
+def spool_path(job: ExportJob) -> Path:
+    # je Versuch eine eigene Spool-Datei, falls ein zweiter Worker den Job übernimmt
+    return export_root() / f".{job.id}.{job.attempts}.{WRITERS[job.format].extension}.part"
+
+
+def _owned(job: ExportJob):
+    # Zeile nur ändern, solange dieser Versuch den Job noch hält
+    return ExportJob.objects.filter(id=job.id, status=ExportJob.STATUS_RUNNING, attempts=job.attempts)
+
+
+def renew_lease(job: ExportJob, lease: int):
+    """
+    Verlängert die Lease nach jedem Chunk; wirft JobCancelled, wenn der Job nicht mehr
+    diesem Versuch gehört.
+    """
+    job.lease_until = timezone.now() + timedelta(seconds=lease)
+    if not _owned(job).update(lease_until=job.lease_until):
+        raise JobCancelled(job.id)
+
+
+def run_job(job: ExportJob):
+    """
+    Schreibt den Export in eine Spool-Datei und verschiebt sie nach Abschluss.
+    """
+    conf = get_export_settings()
+    dataset = DATASETS[job.dataset]
+    writer_class = WRITERS[job.format]
+
+    root = export_root()
+    root.mkdir(parents=True, exist_ok=True)
+    file_name = f"{job.id}.{writer_class.extension}"
+    spool = spool_path(job)
+
+    row_count = 0
+    writer = writer_class(spool, dataset.columns)
+    try:
+        for chunk in _chunked(dataset.rows(job, conf), conf["CHUNK_SIZE"]):
+            writer.write_rows(chunk)
+            row_count += len(chunk)
+            renew_lease(job, conf["LEASE"])
+    finally:
+        writer.close()
+
+    final = root / file_name
+    os.replace(spool, final)
+
+    job.file_name = file_name
+    job.row_count = row_count
+    job.size = final.stat().st_size
+    job.status = ExportJob.STATUS_DONE
+    job.finished_at = timezone.now()
+    job.lease_until = None
+    job.error = ""
+    fields = ["file_name", "row_count", "size", "status", "finished_at", "lease_until", "error"]
+    if not _owned(job).update(**{field: getattr(job, field) for field in fields}):
+        # nach dem letzten Chunk abgebrochen
+        final.unlink(missing_ok=True)
+        raise JobCancelled(job.id)
+
+
+def finish_cancelled(job_id):
+    """
+    Löscht einen abgebrochenen Job samt Datei, nachdem sein Worker aufgehört hat.
+    """
+    with transaction.atomic():
+        job = ExportJob.objects.select_for_update().filter(id=job_id, status=ExportJob.STATUS_CANCELLED).first()
+        if job is not None:
+            delete_job_file(job)
+            job.delete()
+
+
+def purge_cancelled():
+    # abgebrochene Jobs, deren Worker abgestürzt ist (Lease abgelaufen)
+    stale = ExportJob.objects.filter(status=ExportJob.STATUS_CANCELLED, lease_until__lt=timezone.now())
+    for job_id in stale.values_list("id", flat=True):
+        finish_cancelled(job_id)
+
+
+def process_next() -> ExportJob | None:
+    """
+    Bearbeitet einen Job (falls vorhanden). Fehler werden am Job vermerkt.
+    """
+    conf = get_export_settings()
+    purge_cancelled()
+    job = claim_job(conf["LEASE"])
+    if job is None:
+        return None
+
+    try:
+        run_job(job)
+    except JobCancelled:
+        logger.info("Export-Job %s abgebrochen", job.id)
+        spool_path(job).unlink(missing_ok=True)
+        finish_cancelled(job.id)
+        job.status = ExportJob.STATUS_CANCELLED
+    except Exception as e:
+        logger.exception("Export-Job %s fehlgeschlagen", job.id)
+        spool_path(job).unlink(missing_ok=True)
+        job.error = str(e)
+        job.lease_until = None
+        if job.attempts >= conf["MAX_ATTEMPTS"] or isinstance(e, ImproperlyConfigured):
+            job.status = ExportJob.STATUS_FAILED
+            job.finished_at = timezone.now()
+        else:
+            job.status = ExportJob.STATUS_QUEUED
+        fields = ["error", "lease_until", "status", "finished_at"]
+        if not _owned(job).update(**{field: getattr(job, field) for field in fields}):
+            # während des Fehlers abgebrochen oder gelöscht
+            finish_cancelled(job.id)
+    return job
+
+
+def cancel_job(job: ExportJob) -> bool:
+    """
+    Löscht einen Job samt Datei. Läuft er gerade, wird er nur als abgebrochen markiert;
+    der Worker löscht ihn nach dem aktuellen Chunk (siehe renew_lease). -> True, wenn
+    der Job sofort gelöscht wurde.
+    """
+    if ExportJob.objects.filter(id=job.id, status=ExportJob.STATUS_RUNNING).update(
+        status=ExportJob.STATUS_CANCELLED,
+    ):
+        return False
+    delete_job_file(job)
+    job.delete()
+    return True
+
+
+def delete_job_file(job: ExportJob):
+    if job.file_name:
+        job_path(job).unlink(missing_ok=True)
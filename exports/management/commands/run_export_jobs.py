@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from exports.jobs import process_next
+
+
+class Command(BaseCommand):
+    help = "Erstellt die Dateien wartender Export-Jobs (CSV, NDJSON, Parquet)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--loop", action="store_true", help="Dauerhaft laufen (Worker-Modus)")
+        parser.add_argument("--interval", type=float, default=5.0, help="Pause (s), wenn kein Job wartet")
+
+    def handle(self, *args, **options):
+        while True:
+            job = process_next()
+            if job is not None:
+                self.stdout.write(
+                    f"{job.id} {job.dataset}.{job.format}: {job.status} rows={job.row_count} {job.error}".rstrip()
+                )
+                continue
+
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
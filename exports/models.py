@@ -1,3 +1,66 @@
+import uuid
+
+from django.contrib.auth.models import User
 from django.db import models
+from django.utils import timezone
+
+
+class ExportJob(models.Model):
+    """
+    Asynchroner Export: wird per API angelegt, von `python manage.py run_export_jobs`
+    in Chunks in eine Datei unter settings.EXPORT_JOBS["ROOT"] geschrieben und danach
+    vom Client heruntergeladen.
+    """
+
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+    # Abbruch eines laufenden Jobs: der Worker hört nach dem aktuellen Chunk auf und
+    # löscht Job und Dateien selbst
+    STATUS_CANCELLED = "cancelled"
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, "Queued"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_DONE, "Done"),
+        (STATUS_FAILED, "Failed"),
+        (STATUS_CANCELLED, "Cancelled"),
+    ]
+
+    FORMAT_CSV = "csv"
+    FORMAT_NDJSON = "ndjson"
+    FORMAT_PARQUET = "parquet"
+    FORMAT_CHOICES = [
+        (FORMAT_CSV, "CSV"),
+        (FORMAT_NDJSON, "NDJSON"),
+        (FORMAT_PARQUET, "Parquet"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    requested_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name="export_jobs")
+    dataset = models.CharField(max_length=50)
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES, default=FORMAT_CSV)
+    params = models.JSONField(default=dict, blank=True)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    # Worker-Lease: "running"-Jobs mit abgelaufener Lease werden erneut vergeben
+    lease_until = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+
+    file_name = models.CharField(max_length=255, blank=True)
+    row_count = models.PositiveBigIntegerField(default=0)
+    size = models.PositiveBigIntegerField(default=0)
+
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["status", "created_at"], name="export_job_queue_idx"),
+        ]
 
-# Create your models here.
+    def __str__(self):
+        return f"{self.dataset}.{self.format} – {self.requested_by.username} – {self.status}"
@@ -0,0 +1,66 @@
+from rest_framework import serializers
+from django.urls import reverse
+
+from .jobs import DATASETS, format_available
+from .models import ExportJob
+
+
+class ExportJobSerializer(serializers.ModelSerializer):
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ExportJob
+        fields = [
+            "id",
+            "dataset",
+            "format",
+            "params",
+            "status",
+            "error",
+            "row_count",
+            "size",
+            "created_at",
+            "started_at",
+            "finished_at",
+            "download_url",
+        ]
+        read_only_fields = [
+            "id",
+            "status",
+            "error",
+            "row_count",
+            "size",
+            "created_at",
+            "started_at",
+            "finished_at",
+        ]
+
+    def get_download_url(self, obj):
+        if obj.status != ExportJob.STATUS_DONE:
+            return None
+        url = reverse("export-job-download", args=[obj.id])
+        request = self.context.get("request")
+        return request.build_absolute_uri(url) if request else url
+
+    def validate_dataset(self, value):
+        if value not in DATASETS:
+            raise serializers.ValidationError(f"Unbekannter Datensatz. Verfügbar: {', '.join(sorted(DATASETS))}")
+        return value
+
+    def validate_format(self, value):
+        if not format_available(value):
+            raise serializers.ValidationError(f"Format '{value}' ist auf diesem Server nicht verfügbar.")
+        return value
+
+    def validate(self, attrs):
+        dataset = DATASETS[attrs["dataset"]]
+        fmt = attrs.get("format", ExportJob.FORMAT_CSV)
+        if not dataset.supports(fmt):
+            raise serializers.ValidationError({"format": f"Datensatz '{attrs['dataset']}' gibt es nur als {', '.join(dataset.formats)}."})
+
+        # Exporte über alle Patienten nur für Staff, sonst immer die eigenen Patienten
+        request = self.context.get("request")
+        params = attrs.get("params") or {}
+        if params.get("scope") == "all" and not (request and request.user.is_staff):
+            raise serializers.ValidationError({"params": "scope=all ist nur für Staff-Benutzer erlaubt."})
+        return attrs
@@ -0,0 +1,38 @@
+"""
+Gestreamte Exporte: Zeilen werden geschrieben, während sie aus der DB kommen.
+
+Vorlage für alle Exporte: Query mit .values_list(...).iterator(chunk_size=...) (server-seitiger
+Cursor, kein Queryset-Cache) und stream_csv(...) statt HttpResponse + csv.writer.
+"""
+
+import csv
+
+from django.http import StreamingHttpResponse
+
+# Zeilen pro DB-Roundtrip bei .iterator()
+EXPORT_CHUNK_SIZE = 2000
+
+
+class Echo:
+    """
+    Pseudo-Datei für csv.writer: write() gibt die formatierte Zeile direkt zurück.
+    """
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(header, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def stream_csv(header, rows, filename: str) -> StreamingHttpResponse:
+    """
+    CSV-Download, dessen Zeilen lazy aus `rows` (Iterable von Sequenzen) erzeugt werden.
+    """
+    response = StreamingHttpResponse(iter_csv(header, rows), content_type="text/csv")
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
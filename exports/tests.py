@@ -1,3 +1,152 @@
-from django.test import TestCase
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import Group, User
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import jobs
+from .models import ExportJob
+
+
+class ExportJobTestCase(TestCase):
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.root = Path(root.name)
+        settings = override_settings(EXPORT_JOBS={"ROOT": self.root, "CHUNK_SIZE": 2, "LEASE": 60})
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.user = User.objects.create(username="doc")
+        self.user.groups.add(Group.objects.get_or_create(name="practitioners")[0])
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def make_job(self, rows, **fields) -> ExportJob:
+        dataset = jobs.Dataset(columns=(jobs.Column("value", "int"),), rows=rows)
+        patcher = mock.patch.dict(jobs.DATASETS, {"test": dataset})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return ExportJob.objects.create(requested_by=self.user, dataset="test", format=ExportJob.FORMAT_CSV, **fields)
+
+    def files(self) -> list:
+        return sorted(path.name for path in self.root.iterdir())
+
+
+class ExportWorkerTests(ExportJobTestCase):
+    def test_job_is_written(self):
+        job = self.make_job(lambda job, conf: ((value,) for value in range(5)))
+
+        jobs.process_next()
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, ExportJob.STATUS_DONE)
+        self.assertEqual(job.row_count, 5)
+        self.assertEqual(self.files(), [job.file_name])
+
+    def test_lease_is_renewed_per_chunk(self):
+        leases = []
+
+        def rows(job, conf):
+            for value in range(6):
+                leases.append(ExportJob.objects.get(id=job.id).lease_until)
+                yield (value,)
+
+        self.make_job(rows)
+        jobs.process_next()
+
+        self.assertEqual(len(set(leases)), 3)
+
+    def test_delete_running_job_cancels_it(self):
+        def rows(job, conf):
+            yield (1,)
+            yield (2,)
+            response = self.client.delete(f"/api/exports/jobs/{job.id}/")
+            self.assertEqual(response.status_code, 202)
+            yield (3,)
+            yield (4,)
+
+        job = self.make_job(rows)
+        with self.assertLogs(jobs.logger, "INFO"):
+            result = jobs.process_next()
+
+        self.assertEqual(result.status, ExportJob.STATUS_CANCELLED)
+        self.assertFalse(ExportJob.objects.filter(id=job.id).exists())
+        self.assertEqual(self.files(), [])
+
+    def test_delete_queued_job(self):
+        job = self.make_job(lambda job, conf: [])
+
+        response = self.client.delete(f"/api/exports/jobs/{job.id}/")
+
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(ExportJob.objects.filter(id=job.id).exists())
+
+    def test_job_taken_over_by_another_worker_stops(self):
+        def rows(job, conf):
+            yield (1,)
+            yield (2,)
+            # Lease abgelaufen, ein zweiter Worker übernimmt den Job
+            ExportJob.objects.filter(id=job.id).update(attempts=job.attempts + 1)
+            yield (3,)
+
+        job = self.make_job(rows)
+        with self.assertLogs(jobs.logger, "INFO"):
+            jobs.process_next()
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, ExportJob.STATUS_RUNNING)
+        self.assertEqual(self.files(), [])
+
+    def test_stale_cancelled_job_is_purged(self):
+        job = self.make_job(
+            lambda job, conf: [],
+            status=ExportJob.STATUS_CANCELLED,
+            lease_until=timezone.now() - timedelta(seconds=1),
+        )
+
+        jobs.process_next()
+
+        self.assertFalse(ExportJob.objects.filter(id=job.id).exists())
+
+
+class BulkExportCancelTests(ExportJobTestCase):
+    def test_cancel_running_bulk_export(self):
+        response = self.client.get("/api/exports/Patient/$export")
+        self.assertEqual(response.status_code, 202)
+        status_url = response["Content-Location"]
+        job = ExportJob.objects.get()
+
+        def rows(job, conf):
+            yield ({"resourceType": "QuestionnaireResponse", "id": "1"},)
+            yield ({"resourceType": "QuestionnaireResponse", "id": "2"},)
+            self.assertEqual(self.client.delete(status_url).status_code, 202)
+            # nach dem Abbruch gibt es den Export laut Spezifikation nicht mehr
+            self.assertEqual(self.client.get(status_url).status_code, 404)
+            yield ({"resourceType": "QuestionnaireResponse", "id": "3"},)
+
+        dataset = jobs.DATASETS["questionnaire_responses"]
+        with mock.patch.dict(jobs.DATASETS, {"questionnaire_responses": jobs.Dataset(dataset.columns, rows, dataset.formats)}):
+            with self.assertLogs(jobs.logger, "INFO"):
+                jobs.process_next()
+
+        self.assertFalse(ExportJob.objects.filter(id=job.id).exists())
+        self.assertEqual(self.files(), [])
+
+    def test_cancel_finished_bulk_export_deletes_files(self):
+        self.client.get("/api/exports/Patient/$export")
+        job = ExportJob.objects.get()
+        with mock.patch.object(jobs, "sync_patients"):
+            jobs.process_next()
+        job.refresh_from_db()
+        self.assertEqual(self.files(), [job.file_name])
+
+        response = self.client.delete(f"/api/exports/bulk-status/{job.id}/")
+
+        self.assertEqual(response.status_code, 202)
+        self.assertFalse(ExportJob.objects.filter(id=job.id).exists())
+        self.assertEqual(self.files(), [])
@@ -3,5 +3,11 @@ from . import views
 
 urlpatterns = [
     path("patients.csv", views.export_assigned_patients_csv, name="export_patients_csv"),
+    path("jobs/", views.export_jobs, name="export-jobs"),
+    path("jobs/<uuid:job_id>/", views.export_job_detail, name="export-job-detail"),
+    path("jobs/<uuid:job_id>/download/", views.export_job_download, name="export-job-download"),
+    # FHIR Bulk Data
+    path("$export", views.bulk_export_system, name="bulk-export-system"),
+    path("Patient/$export", views.bulk_export_patients, name="bulk-export-patients"),
+    path("bulk-status/<uuid:job_id>/", views.bulk_export_status, name="bulk-export-status"),
 ]
-
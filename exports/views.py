@@ -1,38 +1,232 @@
 from django.shortcuts import render
 
-import csv
-from django.http import HttpResponse
-from django.contrib.auth.models import User
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
+from django.http import FileResponse
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
 
 from accounts.permissions import IsPractitioner
-from patients.models import PractitionerPatient, Patient
+from patients.models import PractitionerPatient
+from questionnaires.response_cache import parse_fhir_datetime
+
+from .jobs import DATASETS, WRITERS, cancel_job, job_path
+from .models import ExportJob
+from .serializers import ExportJobSerializer
+from .streaming import EXPORT_CHUNK_SIZE, stream_csv
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated, IsPractitioner])
 def export_assigned_patients_csv(request):
-    # IDs der Patienten, die dem Practitioner zugeordnet sind
-    patient_ids = PractitionerPatient.objects.filter(
-        practitioner=request.user
-    ).values_list("patient_id", flat=True)
+    # Ein Join PractitionerPatient -> User -> Patient (Pseudonym optional, LEFT JOIN),
+    # gestreamt über einen server-seitigen Cursor statt alles im Speicher zu halten.
+    rows = (
+        PractitionerPatient.objects.filter(practitioner_id=request.user.id)
+        .order_by("patient_id")
+        .values_list(
+            "patient_id",
+            "patient__patient_profile__pseudonym",
+            "patient__username",
+            "patient__email",
+        )
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+
+    return stream_csv(
+        ["patient_id", "pseudonym", "username", "email"],
+        ((user_id, pseudonym or "", username, email) for user_id, pseudonym, username, email in rows),
+        filename="patients.csv",
+    )
+
 
-    users = User.objects.filter(id__in=patient_ids).order_by("id")
+# ----------------------------
+# Asynchrone Export-Jobs (siehe exports.jobs, Worker: run_export_jobs)
+# ----------------------------
 
-    # Pseudonyme optional mappen (falls Patient-Profil existiert)
-    pseudonym_by_user_id = {
-        p.user_id: p.pseudonym
-        for p in Patient.objects.filter(user_id__in=patient_ids)
-    }
+def _own_job(request, job_id):
+    return ExportJob.objects.filter(id=job_id, requested_by_id=request.user.id).first()
 
-    response = HttpResponse(content_type="text/csv")
-    response["Content-Disposition"] = 'attachment; filename="patients.csv"'
 
-    writer = csv.writer(response)
-    writer.writerow(["patient_id", "pseudonym", "username", "email"])
+@api_view(["GET", "POST"])
+@permission_classes([IsAuthenticated, IsPractitioner])
+def export_jobs(request):
+    """
+    GET  /api/exports/jobs/  -> eigene Jobs
+    POST /api/exports/jobs/  {"dataset": "patient_scores", "format": "parquet"} -> 202 + Job
+    """
+    if request.method == "GET":
+        jobs = ExportJob.objects.filter(requested_by_id=request.user.id)[:100]
+        return Response(ExportJobSerializer(jobs, many=True, context={"request": request}).data)
 
-    for u in users:
-        writer.writerow([u.id, pseudonym_by_user_id.get(u.id, ""), u.username, u.email])
+    serializer = ExportJobSerializer(data=request.data, context={"request": request})
+    serializer.is_valid(raise_exception=True)
+    job = serializer.save(requested_by=request.user)
 
+    response = Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+    response["Location"] = request.build_absolute_uri(reverse("export-job-detail", args=[job.id]))
     return response
+
+
+@api_view(["GET", "DELETE"])
+@permission_classes([IsAuthenticated, IsPractitioner])
+def export_job_detail(request, job_id):
+    """
+    GET    /api/exports/jobs/<id>/ -> Status (download_url, sobald fertig)
+    DELETE /api/exports/jobs/<id>/ -> Job samt Datei löschen (204); ein laufender Job
+                                      wird abgebrochen und vom Worker gelöscht (202)
+    """
+    job = _own_job(request, job_id)
+    if job is None:
+        return Response({"detail": "Export job not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    if request.method == "DELETE":
+        if cancel_job(job):
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        return Response({"detail": "Export wird abgebrochen"}, status=status.HTTP_202_ACCEPTED)
+
+    return Response(ExportJobSerializer(job, context={"request": request}).data)
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def export_job_download(request, job_id):
+    # nur eigene Jobs; IsAuthenticated reicht, damit auch System-$export (Staff) ladbar ist
+    job = _own_job(request, job_id)
+    if job is None:
+        return Response({"detail": "Export job not found"}, status=status.HTTP_404_NOT_FOUND)
+    if job.status != ExportJob.STATUS_DONE:
+        return Response({"detail": f"Export ist noch nicht fertig ({job.status})."}, status=status.HTTP_409_CONFLICT)
+
+    path = job_path(job)
+    if not path.exists():
+        return Response({"detail": "Exportdatei nicht mehr vorhanden"}, status=status.HTTP_410_GONE)
+
+    return FileResponse(
+        open(path, "rb"),
+        as_attachment=True,
+        filename=f"{job.dataset}.{WRITERS[job.format].extension}",
+        content_type=DATASETS[job.dataset].content_type or WRITERS[job.format].content_type,
+    )
+
+
+# ----------------------------
+# FHIR Bulk Data $export (Kick-off -> Status-Polling -> Download als NDJSON)
+# ----------------------------
+
+BULK_RESOURCE_TYPE = "QuestionnaireResponse"
+BULK_OUTPUT_FORMATS = {"application/fhir+ndjson", "application/ndjson", "ndjson"}
+
+
+class FhirJsonRenderer(JSONRenderer):
+    media_type = "application/fhir+json"
+    format = "fhir"
+
+
+def _operation_outcome(message: str, status_code: int, code: str = "invalid") -> Response:
+    return Response(
+        {
+            "resourceType": "OperationOutcome",
+            "issue": [{"severity": "error", "code": code, "diagnostics": message}],
+        },
+        status=status_code,
+    )
+
+
+def _bulk_kickoff(request, scope: str) -> Response:
+    """
+    Legt einen Export-Job für alle (scope="all") bzw. die zugeordneten Patienten
+    (scope="patients") an. Antwort laut Spezifikation: 202 + Content-Location.
+    """
+    params = request.query_params
+    types = [t for t in params.get("_type", BULK_RESOURCE_TYPE).split(",") if t]
+    if any(t != BULK_RESOURCE_TYPE for t in types):
+        return _operation_outcome(f"Nur _type={BULK_RESOURCE_TYPE} wird unterstützt.", status.HTTP_400_BAD_REQUEST, "not-supported")
+
+    output_format = params.get("_outputFormat", "application/fhir+ndjson")
+    if output_format not in BULK_OUTPUT_FORMATS:
+        return _operation_outcome(f"_outputFormat {output_format!r} wird nicht unterstützt.", status.HTTP_400_BAD_REQUEST, "not-supported")
+
+    since = params.get("_since")
+    if since and parse_fhir_datetime(since) is None:
+        return _operation_outcome("_since muss ein FHIR instant sein.", status.HTTP_400_BAD_REQUEST)
+
+    job = ExportJob.objects.create(
+        requested_by_id=request.user.id,
+        dataset="questionnaire_responses",
+        format=ExportJob.FORMAT_NDJSON,
+        params={"scope": scope, "since": since, "request": request.build_absolute_uri()},
+    )
+
+    response = Response(status=status.HTTP_202_ACCEPTED)
+    response["Content-Location"] = request.build_absolute_uri(reverse("bulk-export-status", args=[job.id]))
+    return response
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated, IsAdminUser])
+@renderer_classes([FhirJsonRenderer, JSONRenderer])
+def bulk_export_system(request):
+    """
+    GET /api/exports/$export?_since=2025-01-01T00:00:00Z -> alle QuestionnaireResponses (nur Staff)
+    """
+    return _bulk_kickoff(request, "all")
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated, IsPractitioner])
+@renderer_classes([FhirJsonRenderer, JSONRenderer])
+def bulk_export_patients(request):
+    """
+    GET /api/exports/Patient/$export?_since=... -> QuestionnaireResponses der eigenen Patienten
+    """
+    return _bulk_kickoff(request, "patients")
+
+
+@api_view(["GET", "DELETE"])
+@permission_classes([IsAuthenticated])
+@renderer_classes([JSONRenderer, FhirJsonRenderer])
+def bulk_export_status(request, job_id):
+    """
+    GET    -> 202 (läuft, X-Progress), 200 + Manifest (fertig), 500 + OperationOutcome (fehlgeschlagen)
+    DELETE -> Export abbrechen bzw. Dateien löschen (ein laufender Job wird vom Worker
+              nach dem aktuellen Chunk gelöscht, siehe jobs.cancel_job)
+    """
+    job = _own_job(request, job_id)
+    if (
+        job is None
+        or job.dataset != "questionnaire_responses"
+        or job.status == ExportJob.STATUS_CANCELLED
+    ):
+        return _operation_outcome("Export nicht gefunden.", status.HTTP_404_NOT_FOUND, "not-found")
+
+    if request.method == "DELETE":
+        cancel_job(job)
+        return Response(status=status.HTTP_202_ACCEPTED)
+
+    if job.status == ExportJob.STATUS_FAILED:
+        return _operation_outcome(job.error or "Export fehlgeschlagen.", status.HTTP_500_INTERNAL_SERVER_ERROR, "exception")
+
+    if job.status != ExportJob.STATUS_DONE:
+        response = Response(status=status.HTTP_202_ACCEPTED)
+        response["X-Progress"] = job.status
+        response["Retry-After"] = "5"
+        return response
+
+    # transactionTime = Kick-off: als _since des nächsten Abrufs verwenden
+    output = []
+    if job.row_count:
+        output.append({
+            "type": BULK_RESOURCE_TYPE,
+            "url": request.build_absolute_uri(reverse("export-job-download", args=[job.id])),
+            "count": job.row_count,
+        })
+    return Response({
+        "transactionTime": job.created_at.isoformat(),
+        "request": job.params.get("request"),
+        "requiresAccessToken": True,
+        "output": output,
+        "error": [],
+    })
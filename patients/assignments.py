@@ -0,0 +1,165 @@
+"""
+Zuordnungen Practitioner -> Patienten: Massen-Zuordnung und ein gecachtes Set der
+zugeordneten Patienten-IDs pro Practitioner für Listen und Kohorten.
+
+Der Cache (Django-Cache, bei mehreren Prozessen einen gemeinsamen Backend wie Redis
+konfigurieren) wird über Signale (siehe PatientsConfig.ready) und von den Bulk-Funktionen
+hier nach dem Commit invalidiert. Zugriffsprüfungen (is_assigned) nutzen den Cache nur mit
+einem gemeinsamen Backend; mit einem prozesslokalen (LocMem, Dummy) fragen sie die DB,
+weil die Invalidierung dort andere Prozesse nicht erreicht und eine entzogene Zuordnung
+sonst bis zum Timeout weiter Zugriff gäbe.
+"""
+
+import base64
+import json
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache
+from django.db import transaction
+from django.db.models import Q
+
+from questionnaires.score_table import latest_scores
+
+from .models import PractitionerPatient
+
+# Sekunden; zusätzliche Absicherung, falls eine Invalidierung verloren geht
+DEFAULT_CACHE_TIMEOUT = 300
+
+# Cache-Backends, die nur im eigenen Prozess gelten
+PROCESS_LOCAL_CACHES = {
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+}
+
+
+def _key(practitioner_id) -> str:
+    return f"patients:assigned:{practitioner_id}"
+
+
+def assigned_patient_ids(practitioner_id) -> frozenset:
+    key = _key(practitioner_id)
+    ids = cache.get(key)
+    if ids is None:
+        ids = frozenset(
+            PractitionerPatient.objects.filter(practitioner_id=practitioner_id).values_list("patient_id", flat=True)
+        )
+        cache.set(key, ids, getattr(settings, "ASSIGNMENT_CACHE_TIMEOUT", DEFAULT_CACHE_TIMEOUT))
+    return ids
+
+
+def shared_cache() -> bool:
+    return settings.CACHES[DEFAULT_CACHE_ALIAS]["BACKEND"] not in PROCESS_LOCAL_CACHES
+
+
+def is_assigned(practitioner_id, patient_id) -> bool:
+    if shared_cache():
+        return int(patient_id) in assigned_patient_ids(practitioner_id)
+    return PractitionerPatient.objects.filter(practitioner_id=practitioner_id, patient_id=patient_id).exists()
+
+
+def invalidate(*practitioner_ids):
+    # erst nach dem Commit, sonst könnte ein paralleler Request den alten Stand neu cachen
+    keys = [_key(practitioner_id) for practitioner_id in practitioner_ids]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def assign_patients(practitioner_id, patient_ids) -> dict:
+    """
+    Ordnet alle existierenden Patienten (Gruppe "patients") aus patient_ids zu.
+    -> {"assigned": [...], "already_assigned": [...], "not_found": [...]}
+    """
+    requested = list(dict.fromkeys(patient_ids))
+    found = set(
+        User.objects.filter(id__in=requested, groups__name="patients").values_list("id", flat=True)
+    )
+    existing = set(
+        PractitionerPatient.objects.filter(practitioner_id=practitioner_id, patient_id__in=found)
+        .values_list("patient_id", flat=True)
+    )
+    new = [patient_id for patient_id in requested if patient_id in found and patient_id not in existing]
+
+    with transaction.atomic():
+        PractitionerPatient.objects.bulk_create(
+            [PractitionerPatient(practitioner_id=practitioner_id, patient_id=patient_id) for patient_id in new],
+            ignore_conflicts=True,
+        )
+        invalidate(practitioner_id)
+
+    return {
+        "assigned": new,
+        "already_assigned": [patient_id for patient_id in requested if patient_id in existing],
+        "not_found": [patient_id for patient_id in requested if patient_id not in found],
+    }
+
+
+def unassign_patients(practitioner_id, patient_ids) -> int:
+    """
+    Entfernt die Zuordnungen mit einem mengenbasierten Delete. -> Anzahl gelöschter Zuordnungen
+    """
+    with transaction.atomic():
+        deleted, _ = PractitionerPatient.objects.filter(
+            practitioner_id=practitioner_id, patient_id__in=list(patient_ids)
+        ).delete()
+        invalidate(practitioner_id)
+    return deleted
+
+
+# ----------------------------
+# Patientenliste eines Practitioners
+# ----------------------------
+
+LIST_FIELDS = {
+    "patient_id": "id",
+    "patient__username": "username",
+    "patient__email": "email",
+    "patient__patient_profile__pseudonym": "pseudonym",
+}
+
+
+def encode_cursor(patient_id: int) -> str:
+    raw = json.dumps([patient_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> int:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        (patient_id,) = json.loads(raw)
+        return int(patient_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError("Ungültiger Cursor.") from e
+
+
+def page_assigned_patients(
+    practitioner_id,
+    limit: int,
+    cursor: str | None = None,
+    search: str | None = None,
+    include_scores: bool = False,
+) -> dict:
+    """
+    Eine Seite der zugeordneten Patienten: ein Join PractitionerPatient -> User -> Patient,
+    Keyset über patient_id (Index practitioner/patient aus unique_together).
+    search: Präfix von Benutzername oder Pseudonym (nutzt deren Unique-Indizes).
+    Liefert {"patients": [...], "next_cursor": str | None}.
+    """
+    qs = PractitionerPatient.objects.filter(practitioner_id=practitioner_id)
+    if cursor:
+        qs = qs.filter(patient_id__gt=decode_cursor(cursor))
+    if search:
+        qs = qs.filter(
+            Q(patient__username__startswith=search)
+            | Q(patient__patient_profile__pseudonym__startswith=search.upper())
+        )
+
+    rows = list(qs.order_by("patient_id").values_list(*LIST_FIELDS)[:limit + 1])
+    next_cursor = encode_cursor(rows[limit - 1][0]) if len(rows) > limit else None
+    patients = [dict(zip(LIST_FIELDS.values(), row)) for row in rows[:limit]]
+
+    if include_scores:
+        scores = latest_scores([patient["id"] for patient in patients])
+        for patient in patients:
+            patient["latest_scores"] = scores.get(str(patient["id"]), [])
+
+    return {"patients": patients, "next_cursor": next_cursor}
@@ -0,0 +1,188 @@
+"""
+Kohorten-Auswertung über alle zugeordneten Patienten eines Practitioners.
+
+Grundlage sind nur die materialisierten Scores (QuestionnaireScore): ein Window-Query
+für die beiden jüngsten Scores je Patient und Questionnaire, ein Aggregat-Query für den
+MHI-5-Verlauf. Das Ergebnis wird pro Practitioner gecacht und bei neuen Scores
+(score_table.scores_written, siehe patients.signals) invalidiert.
+"""
+
+from datetime import timedelta
+from statistics import fmean, median
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Avg, Count, F, Window
+from django.db.models.functions import RowNumber, TruncMonth
+from django.utils import timezone
+
+from questionnaires.models import QuestionnaireScore
+from questionnaires.score_table import RLS6_DOMAIN_COLUMNS
+from questionnaires.scoring import get_scorer
+
+from .assignments import assigned_patient_ids
+from .models import PractitionerPatient
+
+DEFAULTS = {
+    "CACHE_TIMEOUT": 600,
+    "TREND_MONTHS": 6,
+    # Verschlechterung zwischen den letzten beiden Scores: direction 1 = höher ist schlechter
+    "WORSENING": {
+        "irls": {"direction": 1, "threshold": 5},
+        "mhi5": {"direction": -1, "threshold": 10},
+    },
+}
+
+IRLS, RLS6, MHI5 = "irls", "rls6", "mhi5"
+
+
+def get_cohort_settings() -> dict:
+    return {**DEFAULTS, **getattr(settings, "COHORT_ANALYTICS", {})}
+
+
+def _key(practitioner_id) -> str:
+    return f"patients:cohort:{practitioner_id}"
+
+
+def invalidate_for_patients(patient_ids):
+    """
+    Cache aller Practitioner verwerfen, denen einer der Patienten zugeordnet ist.
+    """
+    user_ids = [int(patient_id) for patient_id in patient_ids if str(patient_id).isdigit()]
+    if not user_ids:
+        return
+    practitioner_ids = set(
+        PractitionerPatient.objects.filter(patient_id__in=user_ids).values_list("practitioner_id", flat=True)
+    )
+    if practitioner_ids:
+        keys = [_key(practitioner_id) for practitioner_id in practitioner_ids]
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def _last_two_scores(patient_ids: list) -> dict:
+    """
+    -> {questionnaire_key: {patient_id: [jüngster, vorheriger?]}}
+    """
+    rows = (
+        QuestionnaireScore.objects.filter(patient_id__in=patient_ids, questionnaire_key__in=[IRLS, RLS6, MHI5])
+        .annotate(
+            rank=Window(
+                RowNumber(),
+                partition_by=[F("patient_id"), F("questionnaire_key")],
+                order_by=[F("authored").desc(nulls_last=True), F("response_id").desc()],
+            )
+        )
+        .filter(rank__lte=2)
+        .order_by("questionnaire_key", "patient_id", "rank")
+        .values("patient_id", "questionnaire_key", "authored", "total_score", *RLS6_DOMAIN_COLUMNS)
+    )
+    scores = {}
+    for row in rows:
+        scores.setdefault(row["questionnaire_key"], {}).setdefault(row["patient_id"], []).append(row)
+    return scores
+
+
+def _mean(values: list):
+    return round(fmean(values), 2) if values else None
+
+
+def _irls_summary(latest: dict) -> dict:
+    scorer = get_scorer("IRLS")
+    values = [row["total_score"] for row in latest.values() if row["total_score"] is not None]
+    bands = dict.fromkeys(scorer.band_labels, 0)
+    for value in values:
+        bands[scorer.interpret(value)] += 1
+    return {
+        "patients_with_score": len(values),
+        "mean": _mean(values),
+        "median": median(values) if values else None,
+        "bands": [{"label": label, "count": count} for label, count in bands.items()],
+    }
+
+
+def _rls6_summary(latest: dict) -> dict:
+    domain_means = {}
+    for column in RLS6_DOMAIN_COLUMNS:
+        domain_means[column] = _mean([row[column] for row in latest.values() if row[column] is not None])
+    return {"patients_with_score": len(latest), "domain_means": domain_means}
+
+
+def _mhi5_summary(patient_ids: list, latest: dict, months: int) -> dict:
+    scorer = get_scorer("MHI-5")
+    values = [row["total_score"] for row in latest.values() if row["total_score"] is not None]
+    since = timezone.now() - timedelta(days=31 * months)
+    trend = (
+        QuestionnaireScore.objects.filter(
+            patient_id__in=patient_ids, questionnaire_key=MHI5, authored__gte=since, total_score__isnull=False
+        )
+        .annotate(month=TruncMonth("authored"))
+        .values("month")
+        .annotate(mean=Avg("total_score"), responses=Count("response_id"), patients=Count("patient_id", distinct=True))
+        .order_by("month")
+    )
+    return {
+        "patients_with_score": len(values),
+        "mean": _mean(values),
+        # erstes Band = auffälliger Bereich (siehe SCORING_RULES["mhi5"])
+        "flagged": sum(1 for value in values if scorer.interpret(value) == scorer.band_labels[0]),
+        "trend": [
+            {
+                "month": row["month"].strftime("%Y-%m"),
+                "mean": round(row["mean"], 2),
+                "responses": row["responses"],
+                "patients": row["patients"],
+            }
+            for row in trend
+        ],
+    }
+
+
+def _worsened(scores: dict, rules: dict) -> list:
+    worsened = []
+    for key, rule in rules.items():
+        for patient_id, rows in scores.get(key, {}).items():
+            if len(rows) < 2 or rows[0]["total_score"] is None or rows[1]["total_score"] is None:
+                continue
+            change = rows[0]["total_score"] - rows[1]["total_score"]
+            if change * rule["direction"] >= rule["threshold"]:
+                worsened.append({
+                    "patient_id": patient_id,
+                    "questionnaire": key,
+                    "previous": rows[1]["total_score"],
+                    "latest": rows[0]["total_score"],
+                    "change": round(change, 2),
+                    "authored": rows[0]["authored"],
+                })
+    return sorted(worsened, key=lambda item: -abs(item["change"]))
+
+
+def compute_cohort_summary(patient_ids, conf: dict | None = None) -> dict:
+    conf = conf or get_cohort_settings()
+    patient_ids = sorted(str(patient_id) for patient_id in patient_ids)
+    scores = _last_two_scores(patient_ids)
+    latest = {key: {patient_id: rows[0] for patient_id, rows in by_patient.items()} for key, by_patient in scores.items()}
+
+    return {
+        "patients": len(patient_ids),
+        "generated_at": timezone.now(),
+        "irls": _irls_summary(latest.get(IRLS, {})),
+        "rls6": _rls6_summary(latest.get(RLS6, {})),
+        "mhi5": _mhi5_summary(patient_ids, latest.get(MHI5, {}), conf["TREND_MONTHS"]),
+        "worsened": _worsened(scores, conf["WORSENING"]),
+    }
+
+
+def cohort_summary(practitioner_id) -> dict:
+    """
+    Gecachte Kohorten-Auswertung; wird neu berechnet, wenn sich die Zuordnungen geändert haben.
+    """
+    conf = get_cohort_settings()
+    patient_ids = assigned_patient_ids(practitioner_id)
+    cached = cache.get(_key(practitioner_id))
+    if cached is not None and cached[0] == patient_ids:
+        return cached[1]
+
+    summary = compute_cohort_summary(patient_ids, conf)
+    cache.set(_key(practitioner_id), (patient_ids, summary), conf["CACHE_TIMEOUT"])
+    return summary
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:38
+
+from django.db import migrations, models
+
+from patients.pseudonyms import counter_name, pseudonyms_for
+
+
+def assign_missing_pseudonyms(apps, schema_editor):
+    # Patienten, die mit der alten Zufallsvergabe ohne Pseudonym gespeichert wurden
+    Patient = apps.get_model("patients", "Patient")
+    PseudonymCounter = apps.get_model("patients", "PseudonymCounter")
+
+    missing = list(Patient.objects.filter(pseudonym__isnull=True) | Patient.objects.filter(pseudonym=""))
+    if not missing:
+        return
+    counter, _ = PseudonymCounter.objects.get_or_create(name=counter_name())
+    for patient, pseudonym in zip(missing, pseudonyms_for(counter.next_value, len(missing))):
+        patient.pseudonym = pseudonym
+    Patient.objects.bulk_update(missing, ["pseudonym"])
+    counter.next_value += len(missing)
+    counter.save()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0002_practitionerpatient'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PseudonymCounter',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('next_value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(assign_missing_pseudonyms, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+import hashlib
+
+from django.conf import settings
+from django.db import migrations
+
+
+def _counter_names():
+    # eingefrorene Kopie von patients.pseudonyms.counter_name (alter und neuer Name)
+    conf = {"PREFIX": "SL", "WIDTH": 8, "KEY": None, "ROUNDS": 4, **getattr(settings, "PSEUDONYMS", {})}
+    key = conf["KEY"] or f"pseudonyms:{settings.SECRET_KEY}"
+    key = key.encode() if isinstance(key, str) else key
+    fingerprint = hashlib.blake2b(key, digest_size=4, person=b"pseudonym").hexdigest()
+    return f"{conf['PREFIX']}-{conf['WIDTH']}", f"{conf['PREFIX']}-{conf['WIDTH']}-{conf['ROUNDS']}-{fingerprint}"
+
+
+def rename_counter(apps, schema_editor):
+    # Der bisherige Zähler gehört zum aktuell konfigurierten Schlüssel: unter neuem Namen
+    # weiterzählen, statt alle vergebenen Positionen einzeln zu überspringen
+    PseudonymCounter = apps.get_model("patients", "PseudonymCounter")
+    old_name, new_name = _counter_names()
+    old = PseudonymCounter.objects.filter(name=old_name).first()
+    if old is None or PseudonymCounter.objects.filter(name=new_name).exists():
+        return
+    PseudonymCounter.objects.create(name=new_name, next_value=old.next_value)
+    old.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0003_pseudonymcounter'),
+    ]
+
+    operations = [
+        migrations.RunPython(rename_counter, migrations.RunPython.noop),
+    ]
@@ -1,14 +1,63 @@
 from django.db import models
 
 # Create your models here.
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
-import secrets
+
+from .pseudonyms import counter_name, get_permutation, pseudonyms_for
+
+
+class PseudonymSpaceExhausted(Exception):
+    pass
+
+
+class PseudonymCounter(models.Model):
+    """
+    Nächste freie Zählerposition je Pseudonym-Format (siehe patients.pseudonyms).
+    """
+
+    name = models.CharField(max_length=50, primary_key=True)
+    next_value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}: {self.next_value}"
+
+
+def allocate_pseudonyms(count: int) -> list:
+    """
+    Reserviert count Pseudonyme mit einem Zähler-Update (unabhängig von der Tabellengröße).
+    Schon vergebene Pseudonyme (z.B. unter einem früheren Schlüssel) werden übersprungen.
+    """
+    if count <= 0:
+        return []
+    size = get_permutation().size
+    pseudonyms = []
+    with transaction.atomic():
+        counter, _ = PseudonymCounter.objects.select_for_update().get_or_create(name=counter_name())
+        position = counter.next_value
+        while len(pseudonyms) < count:
+            needed = count - len(pseudonyms)
+            if position + needed > size:
+                raise PseudonymSpaceExhausted(
+                    f"Nur noch {size - position} Pseudonyme frei; PSEUDONYMS['WIDTH'] erhöhen."
+                )
+            candidates = pseudonyms_for(position, needed)
+            position += needed
+            taken = set(Patient.objects.filter(pseudonym__in=candidates).values_list("pseudonym", flat=True))
+            pseudonyms += [pseudonym for pseudonym in candidates if pseudonym not in taken]
+        counter.next_value = position
+        counter.save(update_fields=["next_value"])
+    return pseudonyms
 
 
-def generate_pseudonym(prefix: str = "SL") -> str:
-    # SL-00000 bis SL-99999
-    return f"{prefix}-{secrets.randbelow(100000):05d}"
+def assign_pseudonyms(patients: list) -> list:
+    """
+    Vergibt Pseudonyme an alle Patienten ohne Pseudonym (z. B. vor bulk_create).
+    """
+    missing = [patient for patient in patients if not patient.pseudonym]
+    for patient, pseudonym in zip(missing, allocate_pseudonyms(len(missing))):
+        patient.pseudonym = pseudonym
+    return patients
 
 
 class Patient(models.Model):
@@ -18,12 +67,7 @@ class Patient(models.Model):
 
     def save(self, *args, **kwargs):
         if not self.pseudonym:
-            # sehr seltene Kollisionen abfangen
-            for _ in range(10):
-                candidate = generate_pseudonym()
-                if not Patient.objects.filter(pseudonym=candidate).exists():
-                    self.pseudonym = candidate
-                    break
+            assign_pseudonyms([self])
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -0,0 +1,93 @@
+"""
+Pseudonyme ohne Kollisionen: ein fortlaufender Zähler wird durch eine geheime
+Permutation (Feistel-Netz mit Cycle-Walking) auf [0, 10**WIDTH) abgebildet.
+Aufeinanderfolgende Patienten bekommen so nicht erkennbar aufeinanderfolgende
+Pseudonyme, und jede Zählerposition ergibt ein anderes Pseudonym.
+
+Ein anderer KEY (bzw. ohne KEY ein neuer SECRET_KEY) ergibt eine andere Permutation und
+beginnt daher einen eigenen Zähler (Fingerprint im Zählernamen); Pseudonyme, die schon
+unter dem alten Schlüssel vergeben wurden, überspringt patients.models.allocate_pseudonyms.
+"""
+
+import hashlib
+from functools import lru_cache
+
+from django.conf import settings
+
+DEFAULTS = {
+    "PREFIX": "SL",
+    "WIDTH": 8,         # Ziffern -> 10**WIDTH mögliche Pseudonyme
+    "KEY": None,        # None = aus SECRET_KEY abgeleitet
+    "ROUNDS": 4,
+}
+
+
+def get_pseudonym_settings() -> dict:
+    return {**DEFAULTS, **getattr(settings, "PSEUDONYMS", {})}
+
+
+class FeistelPermutation:
+    """
+    Bijektion auf [0, size): balanciertes Feistel-Netz über 2*half_bits Bits,
+    Werte außerhalb des Bereichs werden erneut permutiert (Cycle-Walking).
+    """
+
+    def __init__(self, size: int, key: bytes, rounds: int = 4):
+        self.size = size
+        self.key = hashlib.blake2b(key, digest_size=32).digest()
+        self.rounds = rounds
+        self.half_bits = max(1, ((size - 1).bit_length() + 1) // 2)
+        self.mask = (1 << self.half_bits) - 1
+
+    def _round(self, index: int, value: int) -> int:
+        digest = hashlib.blake2b(
+            index.to_bytes(1, "big") + value.to_bytes(8, "big"), key=self.key, digest_size=8
+        ).digest()
+        return int.from_bytes(digest, "big") & self.mask
+
+    def _encrypt(self, value: int) -> int:
+        left, right = value >> self.half_bits, value & self.mask
+        for index in range(self.rounds):
+            left, right = right, left ^ self._round(index, right)
+        return (left << self.half_bits) | right
+
+    def __call__(self, value: int) -> int:
+        if not 0 <= value < self.size:
+            raise ValueError(f"{value} liegt außerhalb von [0, {self.size}).")
+        value = self._encrypt(value)
+        while value >= self.size:
+            value = self._encrypt(value)
+        return value
+
+
+@lru_cache(maxsize=8)
+def _permutation(key: bytes, width: int, rounds: int) -> FeistelPermutation:
+    return FeistelPermutation(10 ** width, key, rounds)
+
+
+def _key() -> bytes:
+    key = get_pseudonym_settings()["KEY"] or f"pseudonyms:{settings.SECRET_KEY}"
+    return key.encode() if isinstance(key, str) else key
+
+
+def get_permutation() -> FeistelPermutation:
+    conf = get_pseudonym_settings()
+    return _permutation(_key(), conf["WIDTH"], conf["ROUNDS"])
+
+
+def counter_name() -> str:
+    # eigener Zähler je Format und Permutation: ein Wechsel von PREFIX/WIDTH/KEY/ROUNDS
+    # beginnt in einem neuen Raum (der Fingerprint verrät den Schlüssel nicht)
+    conf = get_pseudonym_settings()
+    fingerprint = hashlib.blake2b(_key(), digest_size=4, person=b"pseudonym").hexdigest()
+    return f"{conf['PREFIX']}-{conf['WIDTH']}-{conf['ROUNDS']}-{fingerprint}"
+
+
+def pseudonyms_for(start: int, count: int) -> list:
+    """
+    Pseudonyme für die Zählerpositionen start .. start+count-1.
+    """
+    conf = get_pseudonym_settings()
+    permute = get_permutation()
+    prefix, width = conf["PREFIX"], conf["WIDTH"]
+    return [f"{prefix}-{permute(position):0{width}d}" for position in range(start, start + count)]
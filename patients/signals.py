@@ -0,0 +1,21 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from questionnaires.score_table import scores_written
+
+from .assignments import invalidate
+from .cohort import invalidate_for_patients as invalidate_cohort
+from .models import PractitionerPatient
+
+
+@receiver(post_save, sender=PractitionerPatient)
+@receiver(post_delete, sender=PractitionerPatient)
+def invalidate_assignment_cache(sender, instance, **kwargs):
+    # Einzel-Änderungen (Admin, get_or_create, Cascade beim Löschen eines Users);
+    # bulk_create löst keine Signale aus, dafür invalidiert assignments selbst
+    invalidate(instance.practitioner_id)
+
+
+@receiver(scores_written)
+def invalidate_cohort_cache(sender, patient_ids, **kwargs):
+    invalidate_cohort(patient_ids)
@@ -1,3 +1,118 @@
-from django.test import TestCase
+import tempfile
 
-# Create your tests here.
+from django.contrib.auth.models import Group, User
+from django.test import TestCase, override_settings
+
+from .assignments import assign_patients, is_assigned, unassign_patients
+from .models import Patient, PseudonymCounter, PseudonymSpaceExhausted, allocate_pseudonyms
+from .pseudonyms import FeistelPermutation, counter_name
+
+SMALL_SPACE = {"PREFIX": "T", "WIDTH": 2, "KEY": "test-key"}
+
+
+class FeistelPermutationTests(TestCase):
+    def test_is_a_bijection(self):
+        for size in (1, 10, 100, 1000):
+            permute = FeistelPermutation(size, b"key")
+            self.assertEqual(sorted(permute(value) for value in range(size)), list(range(size)))
+
+    def test_depends_on_key(self):
+        values = range(100)
+        first = [FeistelPermutation(100, b"key-a")(value) for value in values]
+        second = [FeistelPermutation(100, b"key-b")(value) for value in values]
+        self.assertNotEqual(first, second)
+
+    def test_rejects_values_outside_range(self):
+        with self.assertRaises(ValueError):
+            FeistelPermutation(100, b"key")(100)
+
+
+@override_settings(PSEUDONYMS=SMALL_SPACE)
+class PseudonymAllocationTests(TestCase):
+    def test_unique_until_space_is_exhausted(self):
+        pseudonyms = allocate_pseudonyms(60) + allocate_pseudonyms(40)
+
+        self.assertEqual(len(set(pseudonyms)), 100)
+        self.assertTrue(all(p.startswith("T-") and len(p) == 4 for p in pseudonyms))
+        self.assertEqual(PseudonymCounter.objects.get(name=counter_name()).next_value, 100)
+
+        with self.assertRaises(PseudonymSpaceExhausted):
+            allocate_pseudonyms(1)
+
+    def test_exhausted_allocation_reserves_nothing(self):
+        allocate_pseudonyms(90)
+
+        with self.assertRaises(PseudonymSpaceExhausted):
+            allocate_pseudonyms(11)
+
+        self.assertEqual(len(allocate_pseudonyms(10)), 10)
+
+    def test_not_sequential(self):
+        pseudonyms = allocate_pseudonyms(10)
+        self.assertNotEqual(pseudonyms, sorted(pseudonyms))
+
+    def test_patient_gets_pseudonym_on_save(self):
+        first = Patient.objects.create(user=User.objects.create(username="a"))
+        second = Patient.objects.create(user=User.objects.create(username="b"))
+
+        self.assertTrue(first.pseudonym)
+        self.assertNotEqual(first.pseudonym, second.pseudonym)
+
+    def test_format_change_uses_new_counter(self):
+        allocate_pseudonyms(100)
+
+        with override_settings(PSEUDONYMS={**SMALL_SPACE, "WIDTH": 3}):
+            pseudonyms = allocate_pseudonyms(5)
+
+        self.assertTrue(all(len(p) == 5 for p in pseudonyms))
+
+    def test_key_change_starts_new_sequence_without_collisions(self):
+        issued = {
+            Patient.objects.create(user=User.objects.create(username=f"p{i}")).pseudonym
+            for i in range(30)
+        }
+        old_counter = counter_name()
+
+        with override_settings(PSEUDONYMS={**SMALL_SPACE, "KEY": "rotated-key"}):
+            self.assertNotEqual(counter_name(), old_counter)
+            pseudonyms = allocate_pseudonyms(70)
+
+            self.assertEqual(len(set(pseudonyms) | issued), 100)
+            with self.assertRaises(PseudonymSpaceExhausted):
+                allocate_pseudonyms(1)
+
+
+class AssignmentAccessTests(TestCase):
+    def setUp(self):
+        self.practitioner = User.objects.create(username="doc")
+        self.patient = User.objects.create(username="pat")
+        self.patient.groups.add(Group.objects.get_or_create(name="patients")[0])
+        with self.captureOnCommitCallbacks(execute=True):
+            assign_patients(self.practitioner.id, [self.patient.id])
+
+    def revoke(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            unassign_patients(self.practitioner.id, [self.patient.id])
+
+    def test_process_local_cache_checks_database(self):
+        self.assertTrue(is_assigned(self.practitioner.id, self.patient.id))
+        with self.assertNumQueries(1):
+            self.assertTrue(is_assigned(self.practitioner.id, self.patient.id))
+
+        self.revoke()
+
+        self.assertFalse(is_assigned(self.practitioner.id, self.patient.id))
+
+    def test_shared_cache_is_used(self):
+        location = tempfile.TemporaryDirectory()
+        self.addCleanup(location.cleanup)
+        shared = {"default": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": location.name}}
+
+        with override_settings(CACHES=shared):
+            self.assertTrue(is_assigned(self.practitioner.id, str(self.patient.id)))
+            with self.assertNumQueries(0):
+                self.assertTrue(is_assigned(self.practitioner.id, self.patient.id))
+
+            self.revoke()
+
+            self.assertFalse(is_assigned(self.practitioner.id, self.patient.id))
@@ -6,11 +6,15 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from django.contrib.auth.models import User
 from accounts.permissions import IsPatient, IsPractitioner
-from .serializers import MeSerializer, PatientListSerializer
+from .serializers import MeSerializer
+from .assignments import is_assigned, page_assigned_patients
 from .models import PractitionerPatient
 from .serializers import PractitionerListSerializer
 from .serializers import PatientDetailSerializer
 
+PATIENTS_PAGE_SIZE = 100
+PATIENTS_MAX_PAGE_SIZE = 500
+
 @api_view(["GET"])
 @permission_classes([IsAuthenticated, IsPatient])
 def me(request):
@@ -20,23 +24,37 @@ def me(request):
 @api_view(["GET"])
 @permission_classes([IsAuthenticated, IsPractitioner])
 def list_patients(request):
-    patient_ids = PractitionerPatient.objects.filter(
-        practitioner=request.user
-    ).values_list("patient_id", flat=True)
+    """
+    GET /api/patients/?limit=100&cursor=...&q=SL-12&include=latest_scores
 
-    patients = User.objects.filter(id__in=patient_ids)
-    serializer = PatientListSerializer(patients, many=True)
-    return Response(serializer.data)
+    Seitenweise (next_cursor für die nächste Seite), optional mit Präfix-Suche
+    auf Benutzername/Pseudonym und den jüngsten Scores je Questionnaire.
+    """
+    params = request.query_params
+    try:
+        limit = int(params.get("limit", PATIENTS_PAGE_SIZE))
+    except ValueError:
+        return Response({"detail": "limit muss eine Zahl sein."}, status=400)
+    if not 1 <= limit <= PATIENTS_MAX_PAGE_SIZE:
+        return Response({"detail": f"limit muss zwischen 1 und {PATIENTS_MAX_PAGE_SIZE} liegen."}, status=400)
+
+    include = {part.strip() for part in params.get("include", "").split(",")}
+    try:
+        page = page_assigned_patients(
+            request.user.id,
+            limit,
+            cursor=params.get("cursor") or None,
+            search=params.get("q", "").strip() or None,
+            include_scores="latest_scores" in include,
+        )
+    except ValueError as e:
+        return Response({"detail": str(e)}, status=400)
+    return Response(page)
 @api_view(["GET"])
 @permission_classes([IsAuthenticated, IsPractitioner])
 def patient_detail(request, patient_id):
     # 1. prüfen: ist der Patient dem Practitioner zugeordnet?
-    is_assigned = PractitionerPatient.objects.filter(
-        practitioner=request.user,
-        patient_id=patient_id,
-    ).exists()
-
-    if not is_assigned:
+    if not is_assigned(request.user.id, patient_id):
         return Response(
             {"detail": "Not allowed to access this patient"},
             status=403,
@@ -58,7 +76,7 @@ def patient_detail(request, patient_id):
 @permission_classes([IsAuthenticated, IsPatient])
 def my_practitioners(request):
     practitioner_ids = PractitionerPatient.objects.filter(
-        patient=request.user
+        patient_id=request.user.id
     ).values_list("practitioner_id", flat=True)
 
     practitioners = User.objects.filter(id__in=practitioner_ids)
@@ -3,7 +3,10 @@ from . import views
 
 urlpatterns = [
     path("me/", views.me),
+    path("cohort/", views.cohort),
     path("assign-patient/", views.assign_patient),
     path("unassign-patient/", views.unassign_patient),
+    path("assign-patients/", views.assign_patients_bulk),
+    path("unassign-patients/", views.unassign_patients_bulk),
 ]
 
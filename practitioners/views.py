@@ -8,8 +8,13 @@ from django.contrib.auth.models import User
 from rest_framework import status
 
 from accounts.permissions import IsPractitioner
+from patients.assignments import assign_patients, unassign_patients
+from patients.cohort import cohort_summary
 from patients.models import PractitionerPatient
 
+# Maximale Anzahl Patienten-IDs pro Bulk-Request
+BULK_MAX_PATIENTS = 1000
+
 @api_view(["GET"])
 @permission_classes([IsAuthenticated, IsPractitioner])
 def me(request):
@@ -18,6 +23,18 @@ def me(request):
         "username": request.user.username,
         "email": request.user.email,
     })
+@api_view(["GET"])
+@permission_classes([IsAuthenticated, IsPractitioner])
+def cohort(request):
+    """
+    GET /api/practitioners/cohort/
+
+    Kennzahlen über alle zugeordneten Patienten (jüngster IRLS inkl. Schweregrad-Verteilung,
+    RLS-6-Domain-Mittelwerte, MHI-5-Verlauf, Patienten mit deutlicher Verschlechterung).
+    """
+    return Response(cohort_summary(request.user.id))
+
+
 @api_view(["POST"])
 @permission_classes([IsAuthenticated, IsPractitioner])
 def assign_patient(request):
@@ -78,3 +95,60 @@ def unassign_patient(request):
         status=status.HTTP_200_OK,
     )
 
+
+def _patient_id_list(data):
+    """
+    patient_ids aus dem Body -> (Liste von ints, None) oder (None, Fehler-Response)
+    """
+    patient_ids = data.get("patient_ids") if isinstance(data, dict) else None
+    if not isinstance(patient_ids, list) or not patient_ids:
+        return None, Response(
+            {"detail": "patient_ids (Liste) is required"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    if len(patient_ids) > BULK_MAX_PATIENTS:
+        return None, Response(
+            {"detail": f"Maximal {BULK_MAX_PATIENTS} patient_ids pro Request"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    try:
+        return [int(patient_id) for patient_id in patient_ids], None
+    except (TypeError, ValueError):
+        return None, Response(
+            {"detail": "patient_ids müssen Zahlen sein"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated, IsPractitioner])
+def assign_patients_bulk(request):
+    """
+    POST /api/practitioners/assign-patients/  {"patient_ids": [1, 2, 3]}
+    """
+    patient_ids, error = _patient_id_list(request.data)
+    if error is not None:
+        return error
+
+    result = assign_patients(request.user.id, patient_ids)
+    return Response(
+        {"practitioner_id": request.user.id, **result},
+        status=status.HTTP_201_CREATED if result["assigned"] else status.HTTP_200_OK,
+    )
+
+
+@api_view(["DELETE"])
+@permission_classes([IsAuthenticated, IsPractitioner])
+def unassign_patients_bulk(request):
+    """
+    DELETE /api/practitioners/unassign-patients/  {"patient_ids": [1, 2, 3]}
+    """
+    patient_ids, error = _patient_id_list(request.data)
+    if error is not None:
+        return error
+
+    deleted_count = unassign_patients(request.user.id, patient_ids)
+    return Response(
+        {"deleted": deleted_count, "patient_ids": patient_ids},
+        status=status.HTTP_200_OK,
+    )
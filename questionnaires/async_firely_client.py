@@ -0,0 +1,303 @@
+import asyncio
+import logging
+import time
+import weakref
+
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+from .firely_client import (
+    DEFAULTS,
+    FHIR_JSON_HEADERS,
+    STRATEGY_AUTO,
+    STRATEGY_FANOUT,
+    STRATEGY_SUBJECT,
+    FirelyError,
+    MultiPatientResponses,
+    bundle_resources,
+    get_firely_settings,
+    next_link,
+    packed_search_kwargs,
+    patient_response_params,
+    resolve_strategy,
+    search_params,
+    subject_chunks,
+    subject_search_rejected,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncFirelyClient:
+    """
+    Async-Gegenstück zu FirelyClient (httpx.AsyncClient) für ASGI-Deployments.
+
+    Ein Client hält einen Connection-Pool pro Event-Loop; viele gleichzeitige
+    Firely-Requests teilen sich die Keep-Alive-Verbindungen. Retries mit Backoff
+    gibt es wie im sync Client nur für idempotente Methoden.
+    """
+
+    RETRY_METHODS = frozenset({"GET", "HEAD", "PUT", "DELETE", "OPTIONS"})
+    RETRY_STATUS = (429, 502, 503, 504)
+
+    def __init__(
+        self,
+        base_url: str,
+        pool_maxsize: int = DEFAULTS["POOL_MAXSIZE"],
+        connect_timeout: float = DEFAULTS["CONNECT_TIMEOUT"],
+        read_timeout: float = DEFAULTS["READ_TIMEOUT"],
+        max_retries: int = DEFAULTS["MAX_RETRIES"],
+        backoff_factor: float = DEFAULTS["BACKOFF_FACTOR"],
+    ):
+        if httpx is None:
+            raise ImproperlyConfigured("httpx ist nicht installiert (pip install httpx).")
+
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.client = httpx.AsyncClient(
+            base_url=base_url.rstrip("/") + "/",
+            headers={"Accept": "application/fhir+json"},
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(
+                max_connections=pool_maxsize,
+                max_keepalive_connections=pool_maxsize,
+            ),
+            # Verbindungsaufbau darf immer wiederholt werden (Request wurde nie gesendet)
+            transport=httpx.AsyncHTTPTransport(retries=max_retries),
+        )
+
+    @classmethod
+    def from_settings(cls):
+        conf = get_firely_settings()
+        return cls(
+            base_url=conf["BASE_URL"],
+            pool_maxsize=conf["POOL_MAXSIZE"],
+            connect_timeout=conf["CONNECT_TIMEOUT"],
+            read_timeout=conf["READ_TIMEOUT"],
+            max_retries=conf["MAX_RETRIES"],
+            backoff_factor=conf["BACKOFF_FACTOR"],
+        )
+
+    async def request(self, method: str, path: str, **kwargs):
+        retries = self.max_retries if method in self.RETRY_METHODS else 0
+        attempt = 0
+
+        while True:
+            try:
+                response = await self.client.request(method, path.lstrip("/"), **kwargs)
+            except httpx.TransportError:
+                if attempt >= retries:
+                    raise
+            else:
+                if response.status_code not in self.RETRY_STATUS or attempt >= retries:
+                    return response
+
+            await asyncio.sleep(self.backoff_factor * (2 ** attempt))
+            attempt += 1
+
+    async def get(self, path: str, **kwargs):
+        return await self.request("GET", path, **kwargs)
+
+    async def post(self, path: str, **kwargs):
+        return await self.request("POST", path, **kwargs)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+# httpx-Clients sind an ihren Event-Loop gebunden -> ein Client pro Loop.
+_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_client() -> AsyncFirelyClient:
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = AsyncFirelyClient.from_settings()
+        _clients[loop] = client
+    return client
+
+
+async def upload_questionnaire(questionnaire_json: dict) -> dict:
+    """
+    Lädt ein Questionnaire JSON in den Firely Server hoch (async).
+    """
+    response = await get_async_client().post("Questionnaire", json=questionnaire_json, headers=FHIR_JSON_HEADERS)
+
+    if response.status_code not in (200, 201):
+        logger.error("Fehler beim Hochladen des Questionnaires: %s", response.text)
+        raise FirelyError(
+            f"Upload fehlgeschlagen: {response.status_code} – {response.text}",
+            status_code=response.status_code,
+        )
+
+    return response.json()
+
+
+async def upload_questionnaire_response(response_json: dict) -> dict:
+    """
+    Lädt eine QuestionnaireResponse an Firely (async).
+    """
+    response = await get_async_client().post("QuestionnaireResponse", json=response_json, headers=FHIR_JSON_HEADERS)
+
+    if response.status_code not in (200, 201):
+        logger.error("Fehler beim Hochladen der QuestionnaireResponse: %s", response.text)
+        raise FirelyError(
+            f"Upload fehlgeschlagen: {response.status_code} – {response.text}",
+            status_code=response.status_code,
+        )
+
+    return response.json()
+
+
+async def get_resource(resource_type: str, resource_id: str) -> dict:
+    """
+    Holt eine Ressource vom Firely Server (async).
+    """
+    response = await get_async_client().get(f"{resource_type}/{resource_id}")
+
+    if response.status_code != 200:
+        logger.error("Fehler beim Abrufen der Ressource: %s", response.text)
+        raise FirelyError(
+            f"Abrufen fehlgeschlagen: {response.status_code} – {response.text}",
+            status_code=response.status_code,
+        )
+
+    return response.json()
+
+
+async def iter_search(resource_type: str, params=None, page_size: int | None = None):
+    """
+    Async-Gegenstück zu firely_client.iter_search (folgt link[rel=next], eine Seite im Speicher).
+    """
+    client = get_async_client()
+    response = await client.get(resource_type, params=search_params(params, page_size))
+
+    while True:
+        response.raise_for_status()
+        bundle = response.json()
+        for resource in bundle_resources(bundle):
+            yield resource
+
+        url = next_link(bundle)
+        if not url:
+            return
+        response = await client.get(url)
+
+
+def iter_patient_responses(
+    patient_id: str,
+    page_size: int | None = None,
+    elements=None,
+    sort: str | None = "-authored",
+    authored_from: str | None = None,
+    authored_to: str | None = None,
+):
+    params = patient_response_params(
+        patient_id,
+        elements=elements,
+        sort=sort,
+        authored_from=authored_from,
+        authored_to=authored_to,
+    )
+    return iter_search("QuestionnaireResponse", params, page_size=page_size)
+
+
+async def get_patient_responses(patient_id: str, **kwargs):
+    """
+    Holt alle QuestionnaireResponses aus Firely für einen Patienten (async, alle Seiten).
+    """
+    entries = [{"resource": res} async for res in iter_patient_responses(patient_id, **kwargs)]
+    return {
+        "resourceType": "Bundle",
+        "type": "searchset",
+        "total": len(entries),
+        "entry": entries,
+    }
+
+
+async def _fetch_responses(patient_ids: list, page_size: int | None, kwargs: dict) -> list:
+    params = patient_response_params(patient_ids, **kwargs)
+    return [res async for res in iter_search("QuestionnaireResponse", params, page_size=page_size)]
+
+
+async def _run_bounded(tasks: dict, semaphore: asyncio.Semaphore, timeout: float) -> tuple:
+    """
+    Async-Gegenstück zu firely_client._run_bounded: {key: coroutine} unter einer Semaphore,
+    nach `timeout` Sekunden werden offene Aufgaben abgebrochen (TimeoutError).
+    """
+    if not tasks:
+        return {}, {}
+
+    async def bounded(coro):
+        async with semaphore:
+            return await coro
+
+    futures = {asyncio.ensure_future(bounded(coro)): key for key, coro in tasks.items()}
+    done, not_done = await asyncio.wait(futures, timeout=timeout)
+    for future in not_done:
+        future.cancel()
+    if not_done:
+        await asyncio.wait(not_done)
+
+    results, errors = {}, {}
+    for future in done:
+        try:
+            results[futures[future]] = future.result()
+        except Exception as e:
+            errors[futures[future]] = e
+    for future in not_done:
+        errors[futures[future]] = TimeoutError("Zeitüberschreitung beim Abruf aus Firely")
+    return results, errors
+
+
+async def get_many_patient_responses(
+    patient_ids,
+    strategy: str | None = None,
+    page_size: int | None = None,
+    **kwargs,
+) -> MultiPatientResponses:
+    """
+    Async-Gegenstück zu firely_client.get_many_patient_responses
+    (höchstens FANOUT_WORKERS gleichzeitige Suchen über eine Semaphore).
+    """
+    conf = get_firely_settings()
+    requested = strategy or conf["MULTI_PATIENT_STRATEGY"]
+    strategy = resolve_strategy(strategy, conf)
+    patient_ids = list(dict.fromkeys(str(pid) for pid in patient_ids))
+    deadline = time.monotonic() + conf["MULTI_FETCH_TIMEOUT"]
+    semaphore = asyncio.Semaphore(conf["FANOUT_WORKERS"])
+
+    result = MultiPatientResponses(strategy=strategy)
+    pending = patient_ids
+    if strategy in (STRATEGY_SUBJECT, STRATEGY_AUTO):
+        packed = packed_search_kwargs(kwargs)
+        tasks = {
+            tuple(chunk): _fetch_responses(chunk, page_size, packed)
+            for chunk in subject_chunks(patient_ids, conf["SUBJECTS_PER_SEARCH"])
+        }
+        results, errors = await _run_bounded(tasks, semaphore, conf["MULTI_FETCH_TIMEOUT"])
+        for chunk, resources in results.items():
+            result.add(chunk, resources)
+
+        pending = []
+        for chunk, error in errors.items():
+            status_code = getattr(getattr(error, "response", None), "status_code", None)
+            if requested == STRATEGY_AUTO and subject_search_rejected(conf, status_code):
+                pending.extend(chunk)
+            else:
+                result.fail(chunk, error)
+        if pending:
+            result.strategy = STRATEGY_FANOUT
+
+    tasks = {patient_id: _fetch_responses([patient_id], page_size, kwargs) for patient_id in pending}
+    results, errors = await _run_bounded(tasks, semaphore, max(deadline - time.monotonic(), 0))
+    for patient_id, resources in results.items():
+        result.add([patient_id], resources)
+    for patient_id, error in errors.items():
+        result.fail([patient_id], error)
+    return result
@@ -0,0 +1,229 @@
+"""
+Vektorisierte Auswertung vieler QuestionnaireResponses (Kohorten, Forschungs-Extrakte, Rescore).
+
+Pro Questionnaire werden die Antworten einmal in eine Matrix (eine Zeile pro Response,
+eine Spalte pro linkId) plus Missing-Maske übertragen; Umpolung, Summen, Domains,
+Transformation und Interpretations-Bänder laufen danach als NumPy-Array-Operationen.
+Die Ergebnisse entsprechen denen von scoring.score_response().
+"""
+
+from dataclasses import dataclass
+
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .scoring import CompiledScorer, answer_to_int, get_scorer
+
+
+def _require_numpy():
+    if np is None:
+        raise ImproperlyConfigured("numpy ist nicht installiert (pip install numpy).")
+
+
+def _answer_value(answer):
+    # Schnellpfad für valueInteger, sonst wie scoring.answer_to_int
+    value = answer.get("valueInteger")
+    if type(value) is int:
+        return value
+    return answer_to_int(answer)
+
+
+def _fill(items, slots: dict, flat: list, base: int) -> int:
+    """
+    Trägt die Antworten (rekursiv inkl. item.item/answer.item) in flat ab base ein.
+    Liefert die Summe der Antworten dieser Ebene.
+    """
+    level_sum = 0
+    for item in items:
+        answers = item.get("answer")
+        if answers:
+            v = _answer_value(answers[0])
+            if v is not None:
+                level_sum += v
+                slot = slots.get(item.get("linkId"))
+                if slot is None and not isinstance(item.get("linkId"), str):
+                    slot = slots.get(str(item.get("linkId")))
+                if slot is not None and flat[base + slot] != flat[base + slot]:  # NaN = noch leer
+                    flat[base + slot] = v
+        if "item" in item:
+            _fill(item["item"] or (), slots, flat, base)
+        for answer in answers or ():
+            if "item" in answer:
+                _fill(answer["item"] or (), slots, flat, base)
+    return level_sum
+
+
+def answer_matrix(scorer: CompiledScorer, responses: list) -> tuple:
+    """
+    Antworten als Matrix (float64, n x Anzahl linkIds), Maske "beantwortet" (bool)
+    und Summe aller Antworten der obersten Ebene je Response (für Regeln ohne items).
+    Werte sind noch nicht umgepolt.
+    """
+    _require_numpy()
+
+    n, k = len(responses), len(scorer.link_ids)
+    flat = [float("nan")] * (n * k)     # erst als Liste füllen, dann ein einziger Array-Konstruktor
+    slots = scorer.slots
+    top_level = [_fill(qr.get("item") or (), slots, flat, row * k) for row, qr in enumerate(responses)]
+
+    values = np.array(flat, dtype=np.float64).reshape(n, k)
+    answered = ~np.isnan(values)
+    values[~answered] = 0.0
+    return values, answered, np.array(top_level, dtype=np.float64)
+
+
+@dataclass
+class BatchScores:
+    """
+    Spaltenweise Scores einer Gruppe von Responses desselben Questionnaires.
+    NaN = kein Wert (z.B. fehlende Items); band = Index in scorer.band_labels bzw. -1.
+    """
+
+    scorer: CompiledScorer
+    values: "np.ndarray"
+    answered: "np.ndarray"
+    total: "np.ndarray"
+    raw_sum: "np.ndarray"
+    domains: dict
+    band: "np.ndarray"
+
+    def __len__(self):
+        return len(self.total)
+
+    def results(self) -> list:
+        """
+        Ergebnisse pro Response im Format von scoring.score_response().
+        """
+        rule = self.scorer.rule
+        integral = rule.transform is None and rule.decimals is None
+        link_ids = self.scorer.link_ids
+        labels = self.scorer.band_labels
+
+        # einmal nach Python-Listen konvertieren statt elementweise auf Arrays zuzugreifen
+        totals = self.total.tolist()
+        raw_sums = self.raw_sum.tolist()
+        bands = self.band.tolist()
+        domain_columns = [(name, column.tolist()) for name, column in self.domains.items()]
+        items = [
+            {link_ids[slot]: int(value) for slot, (value, ok) in enumerate(zip(values, mask)) if ok}
+            for values, mask in zip(self.values.tolist(), self.answered.tolist())
+        ]
+
+        out = []
+        for row, total in enumerate(totals):
+            if total != total:  # NaN
+                total = None
+            elif integral:
+                total = int(total)
+            domains = {
+                name: (None if column[row] != column[row] else int(column[row]))
+                for name, column in domain_columns
+            }
+
+            computed = {"type": rule.type, "total_score": total}
+            if rule.transform is not None:
+                raw_sum = raw_sums[row]
+                computed["raw_sum"] = None if raw_sum != raw_sum else int(raw_sum)
+            if domains:
+                computed["domains"] = domains
+            computed["items"] = items[row]
+
+            if labels:
+                interpretation = labels[bands[row]] if bands[row] >= 0 else rule.interpretation
+            else:
+                interpretation = rule.interpretation.format(**domains)
+
+            out.append({"total_score": total, "interpretation": interpretation, "computed": computed})
+        return out
+
+
+def score_matrix(scorer: CompiledScorer, responses: list) -> BatchScores:
+    """
+    Wertet Responses eines Questionnaires spaltenweise aus (siehe CompiledScorer.score).
+    """
+    rule = scorer.rule
+    values, answered, top_level = answer_matrix(scorer, responses)
+    n = len(responses)
+
+    # Umpolung: k - x für Spalten mit reverse-Konstante
+    reverse = np.array([np.nan if k is None else k for k in scorer.reverse], dtype=np.float64)
+    has_reverse = ~np.isnan(reverse)
+    if has_reverse.any():
+        values[:, has_reverse] = np.where(
+            answered[:, has_reverse],
+            reverse[has_reverse] - values[:, has_reverse],
+            0.0,
+        )
+
+    raw_sum = np.full(n, np.nan)
+    if rule.total:
+        if scorer.total_slots is None:
+            raw_sum = top_level.copy()
+        else:
+            cols = list(scorer.total_slots)
+            count = answered[:, cols].sum(axis=1)
+            ok = count == len(cols) if rule.require_all else count > 0
+            raw_sum = np.where(ok, values[:, cols].sum(axis=1), np.nan)
+
+    total = raw_sum.copy()
+    if rule.transform is not None:
+        low, high, scale = rule.transform
+        total = (total - low) / (high - low) * scale
+    if rule.decimals is not None:
+        # round() statt np.round: np.round skaliert vor dem Runden und weicht bei
+        # Werten wie 0.05 (-> 0.1) von CompiledScorer.score ab
+        total = np.array([round(value, rule.decimals) for value in total.tolist()], dtype=np.float64)
+
+    domains = {}
+    for name, slots in scorer.domains:
+        cols = list(slots)
+        complete = answered[:, cols].all(axis=1)
+        domains[name] = np.where(complete, values[:, cols].sum(axis=1), np.nan)
+
+    band = np.full(n, -1, dtype=np.int64)
+    if scorer.band_labels:
+        limits = np.array(scorer.band_limits, dtype=np.float64)
+        scored = ~np.isnan(total)
+        band[scored] = np.searchsorted(limits, total[scored], side="left")
+
+    return BatchScores(
+        scorer=scorer,
+        values=values,
+        answered=answered,
+        total=total,
+        raw_sum=raw_sum,
+        domains=domains,
+        band=band,
+    )
+
+
+def _questionnaire_slug(res: dict) -> str:
+    return (res.get("questionnaire") or "").split("/")[-1]
+
+
+def score_responses(responses: list, slug: str | None = None) -> list:
+    """
+    Batch-Gegenstück zu scoring.score_response() für viele Responses.
+    Ohne slug wird nach res["questionnaire"] gruppiert; Reihenfolge bleibt erhalten.
+    """
+    groups = {}
+    for position, res in enumerate(responses):
+        scorer = get_scorer(slug if slug is not None else _questionnaire_slug(res))
+        positions, members = groups.setdefault(id(scorer), (scorer, [], []))[1:]
+        positions.append(position)
+        members.append(res)
+
+    out = [None] * len(responses)
+    for scorer, positions, members in groups.values():
+        if isinstance(scorer, CompiledScorer):
+            results = score_matrix(scorer, members).results()
+        else:
+            # eigene Scorer (register_scorer, z.B. Schlaftagebuch): Response für Response
+            results = [scorer.score(res) for res in members]
+        for position, result in zip(positions, results):
+            out[position] = result
+    return out
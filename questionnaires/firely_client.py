@@ -1,23 +1,169 @@
-import requests
 import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from functools import partial
+from itertools import islice
 
-FHIR_BASE_URL = "http://localhost:4080"   # URL von Firely Server
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 logger = logging.getLogger(__name__)
 
+# Defaults, überschreibbar über settings.FIRELY
+DEFAULTS = {
+    "BASE_URL": "http://localhost:4080",   # URL von Firely Server
+    "POOL_CONNECTIONS": 4,
+    "POOL_MAXSIZE": 20,
+    "CONNECT_TIMEOUT": 3.05,
+    "READ_TIMEOUT": 30,
+    "MAX_RETRIES": 3,
+    "BACKOFF_FACTOR": 0.5,
+    "PAGE_SIZE": 200,          # _count für Searchsets
+    # Abruf für viele Patienten (get_many_patient_responses)
+    "MULTI_PATIENT_STRATEGY": "auto",   # "subject" | "fanout" | "auto" (subject, bei Ablehnung fanout)
+    "SUBJECTS_PER_SEARCH": 50,          # Patienten pro gepackter Suche (URL-Länge)
+    "FANOUT_WORKERS": 8,                # gleichzeitige Suchen, höchstens POOL_MAXSIZE
+    "MULTI_FETCH_TIMEOUT": 120,         # Sekunden für den gesamten Abruf
+}
+
+
+def get_firely_settings() -> dict:
+    return {**DEFAULTS, **getattr(settings, "FIRELY", {})}
+
+
+class FirelyError(Exception):
+    """
+    Firely hat mit einem unerwarteten Status geantwortet.
+    """
+
+    def __init__(self, message: str, status_code: int | None = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class FirelyClient:
+    """
+    Client für den Firely Server mit einer gepoolten Keep-Alive-Session.
+
+    - Verbindungen werden pro Host wiederverwendet (kein TCP/TLS-Handshake pro Request)
+    - Connect-/Read-Timeout für jeden Request
+    - Retries mit Backoff nur für idempotente Methoden (POST wird nicht wiederholt)
+    """
+
+    RETRY_METHODS = frozenset({"GET", "HEAD", "PUT", "DELETE", "OPTIONS"})
+    RETRY_STATUS = (429, 502, 503, 504)
+
+    def __init__(
+        self,
+        base_url: str,
+        pool_connections: int = DEFAULTS["POOL_CONNECTIONS"],
+        pool_maxsize: int = DEFAULTS["POOL_MAXSIZE"],
+        connect_timeout: float = DEFAULTS["CONNECT_TIMEOUT"],
+        read_timeout: float = DEFAULTS["READ_TIMEOUT"],
+        max_retries: int = DEFAULTS["MAX_RETRIES"],
+        backoff_factor: float = DEFAULTS["BACKOFF_FACTOR"],
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=self.RETRY_STATUS,
+            allowed_methods=self.RETRY_METHODS,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            max_retries=retry,
+        )
+
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Accept": "application/fhir+json"})
+
+    @classmethod
+    def from_settings(cls):
+        conf = get_firely_settings()
+        return cls(
+            base_url=conf["BASE_URL"],
+            pool_connections=conf["POOL_CONNECTIONS"],
+            pool_maxsize=conf["POOL_MAXSIZE"],
+            connect_timeout=conf["CONNECT_TIMEOUT"],
+            read_timeout=conf["READ_TIMEOUT"],
+            max_retries=conf["MAX_RETRIES"],
+            backoff_factor=conf["BACKOFF_FACTOR"],
+        )
+
+    def url(self, path: str) -> str:
+        # link[rel=next] aus Searchset-Bundles ist bereits eine absolute URL
+        if path.startswith(("http://", "https://")):
+            return path
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def request(self, method: str, path: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.request(method, self.url(path), **kwargs)
+
+    def get(self, path: str, **kwargs) -> requests.Response:
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path: str, **kwargs) -> requests.Response:
+        return self.request("POST", path, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> FirelyClient:
+    """
+    Prozessweiter, gemeinsam genutzter Client (lazy aus den Settings gebaut).
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = FirelyClient.from_settings()
+    return _client
+
+
+def reset_client():
+    """
+    Schließt den gemeinsamen Client, z.B. nach Änderung von settings.FIRELY.
+    """
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = None
+
+
+FHIR_JSON_HEADERS = {"Content-Type": "application/fhir+json"}
+
 
 def upload_questionnaire(questionnaire_json: dict) -> dict:
     """
     Lädt ein Questionnaire JSON in den Firely Server hoch.
     """
-    url = f"{FHIR_BASE_URL}/Questionnaire"
-    headers = {"Content-Type": "application/fhir+json"}
-
-    response = requests.post(url, json=questionnaire_json, headers=headers)
+    response = get_client().post("Questionnaire", json=questionnaire_json, headers=FHIR_JSON_HEADERS)
 
     if response.status_code not in (200, 201):
         logger.error("Fehler beim Hochladen des Questionnaires: %s", response.text)
-        raise Exception(f"Upload fehlgeschlagen: {response.status_code} – {response.text}")
+        raise FirelyError(
+            f"Upload fehlgeschlagen: {response.status_code} – {response.text}",
+            status_code=response.status_code,
+        )
 
     return response.json()
 
@@ -26,41 +172,371 @@ def upload_questionnaire_response(response_json: dict) -> dict:
     """
     Lädt eine QuestionnaireResponse an Firely.
     """
-    url = f"{FHIR_BASE_URL}/QuestionnaireResponse"
-    headers = {"Content-Type": "application/fhir+json"}
-
-    response = requests.post(url, json=response_json, headers=headers)
+    response = get_client().post("QuestionnaireResponse", json=response_json, headers=FHIR_JSON_HEADERS)
 
     if response.status_code not in (200, 201):
         logger.error("Fehler beim Hochladen der QuestionnaireResponse: %s", response.text)
-        raise Exception(f"Upload fehlgeschlagen: {response.status_code} – {response.text}")
+        raise FirelyError(
+            f"Upload fehlgeschlagen: {response.status_code} – {response.text}",
+            status_code=response.status_code,
+        )
+
+    return response.json()
+
+
+def make_bundle(resources: list, bundle_type: str = "batch", if_none_exist: list | None = None) -> dict:
+    """
+    Baut ein batch/transaction Bundle, das jede Ressource per POST anlegt.
+    Firely antwortet mit den Einträgen in derselben Reihenfolge.
+    if_none_exist: Suchquery je Ressource (gleiche Reihenfolge) für ein Conditional Create;
+    existiert schon ein Treffer, legt Firely nichts an und antwortet mit 200 statt 201.
+    """
+    entries = []
+    for position, resource in enumerate(resources):
+        request = {"method": "POST", "url": resource["resourceType"]}
+        if if_none_exist is not None and if_none_exist[position]:
+            request["ifNoneExist"] = if_none_exist[position]
+        entries.append({
+            "fullUrl": f"urn:uuid:{uuid.uuid4()}",
+            "resource": resource,
+            "request": request,
+        })
+    return {"resourceType": "Bundle", "type": bundle_type, "entry": entries}
+
+
+def post_bundle(bundle: dict) -> dict:
+    """
+    Schickt ein batch/transaction Bundle in einem einzigen Request an Firely.
+    """
+    response = get_client().post("", json=bundle, headers=FHIR_JSON_HEADERS)
+
+    if response.status_code != 200:
+        logger.error("Fehler beim Senden des Bundles: %s", response.text)
+        raise FirelyError(
+            f"Bundle fehlgeschlagen: {response.status_code} – {response.text}",
+            status_code=response.status_code,
+        )
 
     return response.json()
 
 
+def bundle_entry_status(entry: dict) -> int | None:
+    """
+    "201 Created" -> 201 (aus entry.response.status eines batch-/transaction-response Bundles).
+    """
+    raw = ((entry or {}).get("response") or {}).get("status") or ""
+    try:
+        return int(raw.split()[0])
+    except (IndexError, ValueError):
+        return None
+
+
+def bundle_entry_id(entry: dict) -> str:
+    """
+    ID der angelegten Ressource aus einem batch-/transaction-response Eintrag.
+    """
+    resource = (entry or {}).get("resource") or {}
+    if resource.get("id"):
+        return resource["id"]
+    # "QuestionnaireResponse/<id>/_history/1"
+    location = ((entry or {}).get("response") or {}).get("location") or ""
+    parts = location.split("/")
+    return parts[1] if len(parts) > 1 else ""
+
+
 def get_resource(resource_type: str, resource_id: str) -> dict:
     """
     Holt eine Ressource vom Firely Server.
     z.B. get_resource("Questionnaire", "12345")
     """
-    url = f"{FHIR_BASE_URL}/{resource_type}/{resource_id}"
-    response = requests.get(url)
+    response = get_client().get(f"{resource_type}/{resource_id}")
 
     if response.status_code != 200:
         logger.error("Fehler beim Abrufen der Ressource: %s", response.text)
-        raise Exception(f"Abrufen fehlgeschlagen: {response.status_code} – {response.text}")
+        raise FirelyError(
+            f"Abrufen fehlgeschlagen: {response.status_code} – {response.text}",
+            status_code=response.status_code,
+        )
 
     return response.json()
 
 
-def get_patient_responses(patient_id: str):
+def next_link(bundle: dict) -> str | None:
+    for link in bundle.get("link") or []:
+        if link.get("relation") == "next" and link.get("url"):
+            return link["url"]
+    return None
+
+
+def bundle_resources(bundle: dict):
+    """
+    Ressourcen eines Searchset-Bundles (nur search.mode "match", keine _include/OperationOutcome).
+    """
+    for entry in bundle.get("entry") or []:
+        resource = entry.get("resource")
+        if not resource:
+            continue
+        if (entry.get("search") or {}).get("mode", "match") != "match":
+            continue
+        yield resource
+
+
+def search_params(params=None, page_size: int | None = None) -> list:
+    params = list(params.items()) if isinstance(params, dict) else list(params or [])
+    if not any(key == "_count" for key, _ in params):
+        params.append(("_count", page_size or get_firely_settings()["PAGE_SIZE"]))
+    return params
+
+
+def patient_response_params(
+    patient_id: str | list,
+    elements=None,
+    sort: str | None = "-authored",
+    authored_from: str | None = None,
+    authored_to: str | None = None,
+) -> list:
+    """
+    Suchparameter für QuestionnaireResponses eines Patienten
+    (Liste von IDs: ein subject-Parameter mit Komma-ODER über alle).
+    authored_from/authored_to: FHIR-Datum bzw. dateTime (inklusive Grenzen).
+    """
+    subjects = patient_id if isinstance(patient_id, (list, tuple)) else [patient_id]
+    params = [("subject", ",".join(f"Patient/{pid}" for pid in subjects))]
+    if sort:
+        params.append(("_sort", sort))
+    if elements:
+        params.append(("_elements", ",".join(elements) if not isinstance(elements, str) else elements))
+    if authored_from:
+        params.append(("authored", f"ge{authored_from}"))
+    if authored_to:
+        params.append(("authored", f"le{authored_to}"))
+    return params
+
+
+def iter_search(resource_type: str, params=None, page_size: int | None = None):
+    """
+    Durchsucht Firely und folgt allen link[rel=next]-Seiten.
+    Ressourcen werden lazy geliefert, es liegt immer nur eine Seite im Speicher.
+    """
+    client = get_client()
+    response = client.get(resource_type, params=search_params(params, page_size))
+
+    while True:
+        response.raise_for_status()
+        bundle = response.json()
+        yield from bundle_resources(bundle)
+
+        url = next_link(bundle)
+        if not url:
+            return
+        response = client.get(url)
+
+
+def iter_patient_responses(
+    patient_id: str,
+    page_size: int | None = None,
+    elements=None,
+    sort: str | None = "-authored",
+    authored_from: str | None = None,
+    authored_to: str | None = None,
+):
+    """
+    Alle QuestionnaireResponses eines Patienten, seitenweise (siehe iter_search).
+    """
+    params = patient_response_params(
+        patient_id,
+        elements=elements,
+        sort=sort,
+        authored_from=authored_from,
+        authored_to=authored_to,
+    )
+    return iter_search("QuestionnaireResponse", params, page_size=page_size)
+
+
+def get_patient_responses(patient_id: str, **kwargs):
     """
-    Holt alle QuestionnaireResponses aus Firely für einen Patienten.
+    Holt alle QuestionnaireResponses aus Firely für einen Patienten (alle Seiten).
+    kwargs wie bei iter_patient_responses.
     """
-    url = f"{FHIR_BASE_URL}/QuestionnaireResponse"
-    params = {"subject": f"Patient/{patient_id}"}
-    headers = {"Accept": "application/fhir+json"}
+    entries = [{"resource": res} for res in iter_patient_responses(patient_id, **kwargs)]
+    return {
+        "resourceType": "Bundle",
+        "type": "searchset",
+        "total": len(entries),
+        "entry": entries,
+    }
+
+
+def patient_id_from_resource(res: dict) -> str:
+    # subject.reference "Patient/<id>" -> "<id>"
+    reference = (res.get("subject") or {}).get("reference") or ""
+    return reference.split("/")[-1]
+
+
+# ----------------------------
+# Viele Patienten
+# ----------------------------
+
+STRATEGY_SUBJECT = "subject"    # mehrere Patienten pro Suche (subject=Patient/a,Patient/b,...)
+STRATEGY_FANOUT = "fanout"      # eine Suche pro Patient, parallel
+STRATEGY_AUTO = "auto"
+STRATEGIES = (STRATEGY_SUBJECT, STRATEGY_FANOUT, STRATEGY_AUTO)
+
+# Status, mit denen ein Server die Komma-Suche über subject ablehnt
+SUBJECT_SEARCH_REJECTED = (400, 501)
+
+# Server (BASE_URL), die die gepackte Suche abgelehnt haben; "auto" nutzt dort direkt fanout
+_subject_search_unsupported = set()
+
+
+@dataclass
+class MultiPatientResponses:
+    """
+    Ergebnis von get_many_patient_responses.
+    responses: Patient-ID -> QuestionnaireResponses (Reihenfolge wie sort), jeder erfolgreiche
+    Patient ist enthalten, auch ohne Responses. errors: Patient-ID -> Fehlermeldung.
+    """
+
+    strategy: str
+    responses: dict = field(default_factory=dict)
+    errors: dict = field(default_factory=dict)
+
+    def add(self, patient_ids, resources):
+        for patient_id in patient_ids:
+            self.responses.setdefault(patient_id, [])
+        for res in resources:
+            patient_id = patient_id_from_resource(res)
+            if patient_id in self.responses:
+                self.responses[patient_id].append(res)
+
+    def fail(self, patient_ids, error):
+        message = str(error) or type(error).__name__
+        for patient_id in patient_ids:
+            self.errors[patient_id] = message
+
+
+def resolve_strategy(strategy: str | None = None, conf: dict | None = None) -> str:
+    conf = conf or get_firely_settings()
+    strategy = strategy or conf["MULTI_PATIENT_STRATEGY"]
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unbekannte Strategie {strategy!r} (erlaubt: {', '.join(STRATEGIES)}).")
+    if strategy == STRATEGY_AUTO and conf["BASE_URL"] in _subject_search_unsupported:
+        return STRATEGY_FANOUT
+    return strategy
+
+
+def subject_search_rejected(conf: dict, status_code: int | None) -> bool:
+    """
+    Merkt sich, dass der Server die gepackte subject-Suche nicht unterstützt.
+    """
+    if status_code not in SUBJECT_SEARCH_REJECTED:
+        return False
+    logger.warning("Firely lehnt subject-Suche über mehrere Patienten ab (%s), nutze fanout.", status_code)
+    _subject_search_unsupported.add(conf["BASE_URL"])
+    return True
+
+
+def subject_chunks(patient_ids: list, size: int):
+    iterator = iter(patient_ids)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def packed_search_kwargs(kwargs: dict) -> dict:
+    # Ohne subject ließen sich die Treffer nicht mehr den Patienten zuordnen
+    elements = kwargs.get("elements")
+    if not elements:
+        return kwargs
+    elements = elements.split(",") if isinstance(elements, str) else list(elements)
+    if "subject" not in elements:
+        elements.append("subject")
+    return {**kwargs, "elements": elements}
+
+
+def _fetch_responses(patient_ids: list, page_size: int | None, kwargs: dict) -> list:
+    params = patient_response_params(patient_ids, **kwargs)
+    return list(iter_search("QuestionnaireResponse", params, page_size=page_size))
+
+
+def _run_bounded(tasks: dict, workers: int, timeout: float) -> tuple:
+    """
+    Führt {key: callable} mit höchstens `workers` Threads aus.
+    Liefert ({key: ergebnis}, {key: exception}); nach `timeout` Sekunden nicht fertige
+    Aufgaben zählen als TimeoutError (einzelne HTTP-Requests begrenzt der Client-Timeout).
+    """
+    if not tasks:
+        return {}, {}
+
+    # kein with-Block: der würde bei Zeitüberschreitung auf die laufenden Threads warten
+    pool = ThreadPoolExecutor(max_workers=min(workers, len(tasks)), thread_name_prefix="firely-fetch")
+    futures = {pool.submit(task): key for key, task in tasks.items()}
+    results, errors = {}, {}
+    try:
+        done, not_done = wait(futures, timeout=timeout)
+        for future in done:
+            try:
+                results[futures[future]] = future.result()
+            except Exception as e:
+                errors[futures[future]] = e
+        for future in not_done:
+            errors[futures[future]] = TimeoutError("Zeitüberschreitung beim Abruf aus Firely")
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    return results, errors
+
+
+def get_many_patient_responses(
+    patient_ids,
+    strategy: str | None = None,
+    page_size: int | None = None,
+    **kwargs,
+) -> MultiPatientResponses:
+    """
+    QuestionnaireResponses vieler Patienten, nach Patient gruppiert.
+
+    strategy "subject": je SUBJECTS_PER_SEARCH Patienten eine Suche mit Komma-ODER in subject,
+    "fanout": eine Suche pro Patient. Beide laufen mit höchstens FANOUT_WORKERS
+    gleichzeitigen Requests, die Laufzeit entspricht damit etwa der langsamsten Suche statt
+    der Summe. "auto" (Default) fällt auf fanout zurück, wenn Firely die gepackte Suche
+    ablehnt. Fehler und Zeitüberschreitungen landen pro Patient in .errors.
+    kwargs wie bei iter_patient_responses.
+    """
+    conf = get_firely_settings()
+    requested = strategy or conf["MULTI_PATIENT_STRATEGY"]
+    strategy = resolve_strategy(strategy, conf)
+    patient_ids = list(dict.fromkeys(str(pid) for pid in patient_ids))
+    deadline = time.monotonic() + conf["MULTI_FETCH_TIMEOUT"]
+    workers = conf["FANOUT_WORKERS"]
+
+    result = MultiPatientResponses(strategy=strategy)
+    pending = patient_ids
+    if strategy in (STRATEGY_SUBJECT, STRATEGY_AUTO):
+        packed = packed_search_kwargs(kwargs)
+        tasks = {
+            tuple(chunk): partial(_fetch_responses, chunk, page_size, packed)
+            for chunk in subject_chunks(patient_ids, conf["SUBJECTS_PER_SEARCH"])
+        }
+        results, errors = _run_bounded(tasks, workers, conf["MULTI_FETCH_TIMEOUT"])
+        for chunk, resources in results.items():
+            result.add(chunk, resources)
+
+        pending = []
+        for chunk, error in errors.items():
+            status_code = getattr(getattr(error, "response", None), "status_code", None)
+            if requested == STRATEGY_AUTO and subject_search_rejected(conf, status_code):
+                pending.extend(chunk)
+            else:
+                result.fail(chunk, error)
+        if pending:
+            result.strategy = STRATEGY_FANOUT
 
-    response = requests.get(url, params=params, headers=headers)
-    response.raise_for_status()
-    return response.json()
\ No newline at end of file
+    tasks = {
+        patient_id: partial(_fetch_responses, [patient_id], page_size, kwargs)
+        for patient_id in pending
+    }
+    results, errors = _run_bounded(tasks, workers, max(deadline - time.monotonic(), 0))
+    for patient_id, resources in results.items():
+        result.add([patient_id], resources)
+    for patient_id, error in errors.items():
+        result.fail([patient_id], error)
+    return result
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from questionnaires.outbox import drain, get_outbox_settings
+
+
+class Command(BaseCommand):
+    help = "Überträgt ausstehende QuestionnaireResponses aus der Outbox gebündelt an Firely."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=None, help="Einträge pro Bundle")
+        parser.add_argument("--loop", action="store_true", help="Dauerhaft laufen (Worker-Modus)")
+        parser.add_argument("--interval", type=float, default=2.0, help="Pause (s), wenn nichts fällig ist")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"] or get_outbox_settings()["BATCH_SIZE"]
+
+        while True:
+            stats = drain(batch_size=batch_size)
+            if stats["claimed"]:
+                self.stdout.write(
+                    f"delivered={stats['delivered']} retry={stats['retry']} failed={stats['failed']}"
+                )
+
+            if not options["loop"]:
+                # Einmal-Modus: so lange leeren, bis nichts mehr fällig ist
+                if stats["claimed"] < batch_size:
+                    break
+                continue
+
+            if stats["claimed"] < batch_size:
+                time.sleep(options["interval"])
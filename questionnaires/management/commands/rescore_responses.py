@@ -0,0 +1,156 @@
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+
+from questionnaires import rescore
+
+
+class Command(BaseCommand):
+    help = (
+        "Wertet gespeicherte QuestionnaireResponses (lokal oder aus Firely) mit den aktuellen "
+        "Scoring-Regeln neu aus und aktualisiert die gespeicherten Scores."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--source", choices=["local", "firely"], default="local")
+        parser.add_argument("--questionnaire", help="Nur diesen Questionnaire (Slug) neu auswerten")
+        parser.add_argument("--chunk-size", type=int, default=500, help="Responses pro Chunk/Worker-Task")
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Worker-Prozesse (0 = im Hauptprozess auswerten)",
+        )
+        parser.add_argument("--checkpoint", help="JSON-Datei für den Fortschritt; vorhandene wird fortgesetzt")
+        parser.add_argument("--restart", action="store_true", help="Vorhandenen Checkpoint ignorieren")
+        parser.add_argument("--dry-run", action="store_true", help="Nur Unterschiede anzeigen, nichts schreiben")
+        parser.add_argument("--show", type=int, default=20, help="So viele Unterschiede im Dry-Run ausgeben")
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.dry_run = options["dry_run"]
+        self.checkpoint_path = Path(options["checkpoint"]) if options["checkpoint"] else None
+        self.state = self.load_checkpoint()
+        self.shown = 0
+        self.started = time.monotonic()
+        self.processed_now = 0
+
+        if self.state.get("source", options["source"]) != options["source"]:
+            raise CommandError(f"Checkpoint gehört zu --source={self.state['source']}.")
+        # last_id/last_updated gelten nur für denselben Filter: mit einem anderen
+        # --questionnaire würden Responses übersprungen oder doppelt gezählt
+        if self.state.get("questionnaire", options["questionnaire"]) != options["questionnaire"]:
+            raise CommandError(
+                f"Checkpoint gehört zu --questionnaire={self.state['questionnaire'] or '(alle)'}; "
+                "--restart startet neu."
+            )
+        self.state["source"] = options["source"]
+        self.state["questionnaire"] = options["questionnaire"]
+        self.state.setdefault("processed", 0)
+        self.state.setdefault("changed", 0)
+
+        if options["source"] == "local":
+            remaining = rescore.local_queryset(options["questionnaire"]).filter(
+                id__gt=self.state.get("last_id", 0)
+            ).count()
+            self.total = self.state["processed"] + remaining
+            chunks = (
+                (rows, rescore.local_items(rows))
+                for rows in rescore.iter_local_chunks(
+                    options["chunk_size"],
+                    after_id=self.state.get("last_id", 0),
+                    questionnaire=options["questionnaire"],
+                )
+            )
+        else:
+            self.total = None
+            chunks = (
+                (chunk, rescore.firely_items(chunk))
+                for chunk in rescore.iter_firely_chunks(
+                    options["chunk_size"],
+                    since=self.state.get("last_updated"),
+                    questionnaire=options["questionnaire"],
+                )
+            )
+
+        self.run(chunks)
+
+        verb = "würden geändert" if self.dry_run else "geändert"
+        self.stdout.write(self.style.SUCCESS(
+            f"Fertig: {self.state['processed']} Responses ausgewertet, {self.state['changed']} {verb}."
+        ))
+
+    def run(self, chunks):
+        workers = self.options["workers"]
+        if workers <= 0:
+            for payload, items in chunks:
+                self.finish_chunk(payload, rescore.score_chunk(items))
+            return
+
+        # Chunks werden in Reihenfolge abgeschlossen (für den Checkpoint), höchstens
+        # 2 pro Worker sind gleichzeitig unterwegs, damit nicht alles im Speicher landet.
+        with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+            pending = deque()
+            for payload, items in chunks:
+                pending.append((payload, pool.submit(rescore.score_chunk, items)))
+                if len(pending) >= workers * 2:
+                    payload, future = pending.popleft()
+                    self.finish_chunk(payload, future.result())
+            while pending:
+                payload, future = pending.popleft()
+                self.finish_chunk(payload, future.result())
+
+    def finish_chunk(self, payload, results):
+        if self.options["source"] == "local":
+            changes = rescore.apply_local(payload, results, dry_run=self.dry_run)
+            self.state["last_id"] = payload[-1].id
+        else:
+            changes = rescore.apply_firely(payload, results, dry_run=self.dry_run)
+            self.state["last_updated"] = rescore.last_updated(payload) or self.state.get("last_updated")
+
+        self.state["processed"] += len(payload)
+        self.processed_now += len(payload)
+        self.state["changed"] += len(changes)
+        if self.dry_run:
+            self.show_changes(changes)
+        else:
+            self.save_checkpoint()
+        self.report()
+
+    def show_changes(self, changes):
+        for row, changed in changes:
+            if self.shown >= self.options["show"]:
+                return
+            self.shown += 1
+            label = f"#{row.id} {row.questionnaire_slug}" if row is not None else "(neu)"
+            for field, (old, new) in changed.items():
+                self.stdout.write(f"  {label} {field}: {old!r} -> {new!r}")
+
+    def report(self):
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        processed = self.state["processed"]
+        done = f"{processed}/{self.total}" if self.total is not None else str(processed)
+        self.stderr.write(
+            f"{done} ausgewertet, {self.state['changed']} geändert ({self.processed_now / elapsed:,.0f}/s)",
+            ending="\r" if self.stderr.isatty() else "\n",
+        )
+
+    def load_checkpoint(self) -> dict:
+        if self.checkpoint_path is None or self.options["restart"] or not self.checkpoint_path.exists():
+            return {}
+        state = json.loads(self.checkpoint_path.read_text(encoding="utf-8"))
+        self.stdout.write(f"Setze Checkpoint {self.checkpoint_path} fort: {state}")
+        return state
+
+    def save_checkpoint(self):
+        if self.checkpoint_path is None:
+            return
+        tmp = self.checkpoint_path.with_suffix(self.checkpoint_path.suffix + ".tmp")
+        tmp.write_text(json.dumps(self.state), encoding="utf-8")
+        tmp.replace(self.checkpoint_path)
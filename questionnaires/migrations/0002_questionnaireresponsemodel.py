@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:16
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questionnaires', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionnaireResponseModel',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('questionnaire_slug', models.CharField(max_length=100)),
+                ('patient_id', models.CharField(max_length=100)),
+                ('fhir_response', models.JSONField()),
+                ('total_score', models.FloatField(blank=True, null=True)),
+                ('computed', models.JSONField(blank=True, null=True)),
+                ('interpretation', models.TextField(blank=True)),
+                ('delivery_status', models.CharField(choices=[('pending', 'Ausstehend'), ('sending', 'Wird gesendet'), ('delivered', 'An Firely übertragen'), ('failed', 'Fehlgeschlagen')], default='pending', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True)),
+                ('fhir_id', models.CharField(blank=True, max_length=64)),
+                ('delivered_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('questionnaire', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='responses', to='questionnaires.fhirquestionnairemodel')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['delivery_status', 'next_attempt_at'], name='qr_outbox_due_idx')],
+            },
+        ),
+    ]
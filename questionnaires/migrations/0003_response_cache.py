@@ -0,0 +1,58 @@
+import uuid
+
+from django.db import migrations, models
+
+
+def gen_local_ids(apps, schema_editor):
+    QuestionnaireResponseModel = apps.get_model("questionnaires", "QuestionnaireResponseModel")
+    for row in QuestionnaireResponseModel.objects.filter(local_id__isnull=True).only("id"):
+        row.local_id = uuid.uuid4()
+        row.save(update_fields=["local_id"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questionnaires', '0002_questionnaireresponsemodel'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatientResponseSync',
+            fields=[
+                ('patient_id', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('cursor', models.DateTimeField(blank=True, null=True)),
+                ('synced_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='questionnaireresponsemodel',
+            name='authored',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='questionnaireresponsemodel',
+            name='last_updated',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        # unique UUID für bestehende Zeilen: erst nullable anlegen, befüllen, dann unique machen
+        migrations.AddField(
+            model_name='questionnaireresponsemodel',
+            name='local_id',
+            field=models.UUIDField(editable=False, null=True),
+        ),
+        migrations.RunPython(gen_local_ids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='questionnaireresponsemodel',
+            name='local_id',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='questionnaireresponsemodel',
+            index=models.Index(fields=['patient_id', 'authored'], name='qr_patient_authored_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='questionnaireresponsemodel',
+            constraint=models.UniqueConstraint(condition=models.Q(('fhir_id', ''), _negated=True), fields=('fhir_id',), name='qr_unique_fhir_id'),
+        ),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:23
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Eingefrorene Logik (Stand dieser Migration): die Migration importiert nichts aus
+# questionnaires.scoring, damit spätere Änderungen an slug_key oder den Scoring-Regeln
+# den Backfill nicht verändern. Scores werden nicht neu berechnet, sondern aus den
+# gespeicherten Werten übernommen.
+RLS6_DOMAIN_COLUMNS = {
+    "sleep_quality_items_1_6": "sleep_quality",
+    "nighttime_items_2_3": "nighttime",
+    "daytime_relaxation_item_4": "daytime_relaxation",
+    "control_activity_item_5": "control_activity",
+}
+
+
+def questionnaire_key(slug):
+    # Kopie von scoring.slug_key: "RLS_6" / "rls-6" -> "rls6"
+    return re.sub(r"[^a-z0-9]", "", (slug or "").lower())
+
+
+def domain_values(computed):
+    if not isinstance(computed, dict):
+        return {column: None for column in RLS6_DOMAIN_COLUMNS.values()}
+    return {column: computed.get(key) for key, column in RLS6_DOMAIN_COLUMNS.items()}
+
+
+def backfill_scores(apps, schema_editor):
+    QuestionnaireResponseModel = apps.get_model("questionnaires", "QuestionnaireResponseModel")
+    QuestionnaireScore = apps.get_model("questionnaires", "QuestionnaireScore")
+
+    batch = []
+    for row in QuestionnaireResponseModel.objects.iterator(chunk_size=1000):
+        batch.append(QuestionnaireScore(
+            response_id=row.id,
+            patient_id=row.patient_id,
+            questionnaire_slug=row.questionnaire_slug,
+            questionnaire_key=questionnaire_key(row.questionnaire_slug),
+            authored=row.authored,
+            total_score=row.total_score,
+            interpretation=(row.interpretation or "")[:255],
+            **domain_values(row.computed),
+        ))
+        if len(batch) >= 1000:
+            QuestionnaireScore.objects.bulk_create(batch)
+            batch = []
+    QuestionnaireScore.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questionnaires', '0003_response_cache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionnaireScore',
+            fields=[
+                ('response', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='score', serialize=False, to='questionnaires.questionnaireresponsemodel')),
+                ('patient_id', models.CharField(max_length=100)),
+                ('questionnaire_slug', models.CharField(max_length=100)),
+                ('questionnaire_key', models.CharField(max_length=100)),
+                ('authored', models.DateTimeField(blank=True, null=True)),
+                ('total_score', models.FloatField(blank=True, null=True)),
+                ('interpretation', models.CharField(blank=True, max_length=255)),
+                ('sleep_quality', models.IntegerField(blank=True, null=True)),
+                ('nighttime', models.IntegerField(blank=True, null=True)),
+                ('daytime_relaxation', models.IntegerField(blank=True, null=True)),
+                ('control_activity', models.IntegerField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['patient_id', 'questionnaire_key', 'authored'], name='score_patient_q_authored_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_scores, migrations.RunPython.noop),
+    ]
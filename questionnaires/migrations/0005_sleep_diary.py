@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questionnaires', '0004_questionnairescore'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='questionnairescore',
+            name='awakenings',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='questionnairescore',
+            name='sleep_efficiency',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='questionnairescore',
+            name='sleep_onset_latency',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='questionnairescore',
+            name='sleep_rating',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='questionnairescore',
+            name='time_in_bed',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='questionnairescore',
+            name='total_sleep_time',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='questionnairescore',
+            name='wake_after_sleep_onset',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='SleepDiaryAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('patient_id', models.CharField(max_length=100)),
+                ('window_days', models.PositiveSmallIntegerField()),
+                ('window_start', models.DateField()),
+                ('window_end', models.DateField()),
+                ('nights', models.PositiveIntegerField(default=0)),
+                ('time_in_bed', models.FloatField(blank=True, null=True)),
+                ('total_sleep_time', models.FloatField(blank=True, null=True)),
+                ('sleep_onset_latency', models.FloatField(blank=True, null=True)),
+                ('awakenings', models.FloatField(blank=True, null=True)),
+                ('wake_after_sleep_onset', models.FloatField(blank=True, null=True)),
+                ('sleep_efficiency', models.FloatField(blank=True, null=True)),
+                ('sleep_rating', models.FloatField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('patient_id', 'window_days'), name='diary_patient_window_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,236 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:30
+
+import re
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.utils import timezone
+
+# Eingefrorene Kopie der Auswertung aus questionnaires.sleep_diary (Stand dieser Migration)
+# mit den damaligen Standardwerten von SLEEP_DIARY: spätere Änderungen am Modul oder an den
+# Settings dürfen das Ergebnis der Migration nicht verändern. Neu auswerten mit
+# "manage.py rescore_responses".
+DURATION_UNIT = "min"
+WINDOWS = (7, 30)
+MAX_SPAN_HOURS = 16
+
+MINUTES_PER_DAY = 24 * 60
+SLEEP_DURATION, TIME_IN_BED, BEDTIME, SLEEP_ONSET = "1", "2", "3", "4"
+AWAKENINGS, WAKE_DURATION, FINAL_WAKE, RISE_TIME, SLEEP_RATING = "5a", "5b", "6", "7", "8"
+TIME_ITEMS = frozenset({BEDTIME, SLEEP_ONSET, FINAL_WAKE, RISE_TIME})
+METRICS = (
+    "time_in_bed",
+    "total_sleep_time",
+    "sleep_onset_latency",
+    "awakenings",
+    "wake_after_sleep_onset",
+    "sleep_efficiency",
+    "sleep_rating",
+)
+
+_TIME = re.compile(r"^([01][0-9]|2[0-3]):([0-5][0-9])(?::([0-5][0-9]|60)(?:\.[0-9]+)?)?$")
+
+
+def parse_time(value):
+    if not isinstance(value, str):
+        return None
+    match = _TIME.match(value.strip())
+    if match is None:
+        return None
+    return int(match.group(1)) * 60 + int(match.group(2))
+
+
+def plausible_span(start, end, max_minutes):
+    if start is None or end is None:
+        return None
+    minutes = (end - start) % MINUTES_PER_DAY
+    return minutes if minutes <= max_minutes else None
+
+
+def answer_value(item, link_id):
+    answers = item.get("answer") or []
+    if not answers or not isinstance(answers[0], dict):
+        return None
+    answer = answers[0]
+    if link_id in TIME_ITEMS:
+        return parse_time(answer.get("valueTime"))
+    value = answer.get("valueInteger")
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return int(value)
+
+
+def collect_answers(qr):
+    values = {}
+    stack = list(reversed(qr.get("item") or []))
+    while stack:
+        item = stack.pop()
+        if not isinstance(item, dict):
+            continue
+        link_id = str(item.get("linkId"))
+        if link_id not in values:
+            value = answer_value(item, link_id)
+            if value is not None:
+                values[link_id] = value
+
+        children = list(item.get("item") or [])
+        for answer in item.get("answer") or []:
+            if isinstance(answer, dict):
+                children += answer.get("item") or []
+        stack.extend(reversed(children))
+    return values
+
+
+def night_metrics(values):
+    factor = 60 if DURATION_UNIT == "h" else 1
+    max_span = MAX_SPAN_HOURS * 60
+
+    awakenings = values.get(AWAKENINGS)
+    wake_duration = values.get(WAKE_DURATION)
+    if awakenings == 0:
+        waso = 0
+    elif awakenings is not None and wake_duration is not None:
+        waso = awakenings * wake_duration
+    else:
+        waso = None
+
+    time_in_bed = plausible_span(values.get(BEDTIME), values.get(RISE_TIME), max_span)
+    if time_in_bed is None and values.get(TIME_IN_BED) is not None:
+        time_in_bed = values[TIME_IN_BED] * factor
+
+    latency = plausible_span(values.get(BEDTIME), values.get(SLEEP_ONSET), max_span)
+    if latency is not None and time_in_bed is not None and latency > time_in_bed:
+        latency = None
+
+    asleep = plausible_span(values.get(SLEEP_ONSET), values.get(FINAL_WAKE), max_span)
+    if asleep is not None:
+        total_sleep_time = max(asleep - (waso or 0), 0)
+    elif values.get(SLEEP_DURATION) is not None:
+        total_sleep_time = values[SLEEP_DURATION] * factor
+    else:
+        total_sleep_time = None
+
+    if time_in_bed is not None and total_sleep_time is not None and total_sleep_time > time_in_bed:
+        time_in_bed = None
+
+    efficiency = None
+    if time_in_bed and total_sleep_time is not None:
+        efficiency = round(total_sleep_time / time_in_bed * 100, 1)
+
+    return {
+        "time_in_bed": time_in_bed,
+        "total_sleep_time": total_sleep_time,
+        "sleep_onset_latency": latency,
+        "awakenings": awakenings,
+        "wake_after_sleep_onset": waso,
+        "sleep_efficiency": efficiency,
+        "sleep_rating": values.get(SLEEP_RATING),
+    }
+
+
+def interpret_metrics(metrics):
+    parts = []
+    if metrics["sleep_efficiency"] is not None:
+        parts.append(f"Schlafeffizienz {metrics['sleep_efficiency']:g} %")
+    if metrics["total_sleep_time"] is not None:
+        minutes = metrics["total_sleep_time"]
+        parts.append(f"Schlafdauer {minutes // 60}:{minutes % 60:02d} h")
+    if metrics["sleep_onset_latency"] is not None:
+        parts.append(f"Einschlafdauer {metrics['sleep_onset_latency']} min")
+    if metrics["awakenings"] is not None:
+        parts.append(f"{metrics['awakenings']}x aufgewacht")
+    return ", ".join(parts) or "Schlaftagebuch ohne auswertbare Angaben"
+
+
+def score_diary(qr):
+    values = collect_answers(qr)
+    metrics = night_metrics(values)
+    items = {
+        link_id: f"{value // 60:02d}:{value % 60:02d}" if link_id in TIME_ITEMS else value
+        for link_id, value in values.items()
+    }
+    computed = {"type": "sleep_diary", "total_score": None, "metrics": metrics, "items": items}
+    return {"total_score": None, "interpretation": interpret_metrics(metrics), "computed": computed}
+
+
+def rolling_windows(entries):
+    nights, counts = {}, {}
+    for day, metrics in entries:
+        nights[day] = metrics
+        counts[day] = counts.get(day, 0) + 1
+    if not nights:
+        return []
+
+    end = max(nights)
+    out = []
+    for days in WINDOWS:
+        start = end - timedelta(days=days - 1)
+        members = [metrics for day, metrics in nights.items() if day >= start]
+        row = {
+            "window_days": days,
+            "window_start": start,
+            "window_end": end,
+            "nights": len(members),
+            "entries": sum(count for day, count in counts.items() if day >= start),
+        }
+        for metric in METRICS:
+            values = [metrics[metric] for metrics in members if metrics.get(metric) is not None]
+            row[metric] = round(sum(values) / len(values), 1) if values else None
+        out.append(row)
+    return out
+
+
+def backfill_diary(apps, schema_editor):
+    # Tagebuch-Einträge neu auswerten (bisher als Summe bzw. ohne Plausibilitätsprüfung)
+    # und die Fenster komplett neu aufbauen
+    QuestionnaireResponseModel = apps.get_model("questionnaires", "QuestionnaireResponseModel")
+    QuestionnaireScore = apps.get_model("questionnaires", "QuestionnaireScore")
+    SleepDiaryAggregate = apps.get_model("questionnaires", "SleepDiaryAggregate")
+
+    entries = {}
+    responses, scores = [], []
+    rows = QuestionnaireScore.objects.filter(questionnaire_key="tagebuch").select_related("response").order_by("authored", "response_id")
+    for score in rows.iterator(chunk_size=1000):
+        response = score.response
+        result = score_diary(response.fhir_response or {})
+        response.total_score = score.total_score = result["total_score"]
+        response.interpretation = result["interpretation"]
+        score.interpretation = result["interpretation"][:255]
+        response.computed = result["computed"]
+        metrics = result["computed"]["metrics"]
+        for column in METRICS:
+            setattr(score, column, metrics[column])
+        responses.append(response)
+        scores.append(score)
+        if score.authored is not None:
+            entries.setdefault(score.patient_id, []).append((timezone.localdate(score.authored), metrics))
+
+        if len(scores) >= 1000:
+            QuestionnaireResponseModel.objects.bulk_update(responses, ["total_score", "interpretation", "computed"])
+            QuestionnaireScore.objects.bulk_update(scores, ["total_score", "interpretation", *METRICS])
+            responses, scores = [], []
+    QuestionnaireResponseModel.objects.bulk_update(responses, ["total_score", "interpretation", "computed"])
+    QuestionnaireScore.objects.bulk_update(scores, ["total_score", "interpretation", *METRICS])
+
+    SleepDiaryAggregate.objects.all().delete()
+    SleepDiaryAggregate.objects.bulk_create([
+        SleepDiaryAggregate(patient_id=patient_id, **window)
+        for patient_id, patient_entries in entries.items()
+        for window in rolling_windows(patient_entries)
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questionnaires', '0005_sleep_diary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sleepdiaryaggregate',
+            name='entries',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_diary, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,5 @@
+import uuid
+
 from django.db import models
 
 # Create your models here.
@@ -5,6 +7,7 @@ from django.db import models
 
 
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 
 try:
     from fhir.resources.questionnaire import Questionnaire as FHIRQuestionnaire
@@ -54,16 +57,40 @@ class QuestionnaireResponseModel(models.Model):
     """
     Speichert Antworten eines Patienten auf einen FHIR-Questionnaire.
     Vereinfachtes FHIR QuestionnaireResponse + Gesamt-Score.
+
+    Dient gleichzeitig als Outbox für Firely: Submits werden hier gespeichert
+    und vom Drain-Worker (manage.py drain_firely_outbox) gebündelt hochgeladen.
+    Außerdem lokaler Cache aller Responses eines Patienten aus Firely
+    (siehe response_cache, PatientResponseSync).
     """
 
+    STATUS_PENDING = "pending"
+    STATUS_SENDING = "sending"
+    STATUS_DELIVERED = "delivered"
+    STATUS_FAILED = "failed"
+
+    DELIVERY_STATUS_CHOICES = [
+        (STATUS_PENDING, "Ausstehend"),
+        (STATUS_SENDING, "Wird gesendet"),
+        (STATUS_DELIVERED, "An Firely übertragen"),
+        (STATUS_FAILED, "Fehlgeschlagen"),
+    ]
+
     id = models.AutoField(primary_key=True)
 
-    # Welcher Fragebogen?
+    # Wird als identifier in die QuestionnaireResponse geschrieben, damit aus Firely
+    # synchronisierte Kopien eigener Submits wiedererkannt werden.
+    local_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+
+    # Welcher Fragebogen? (optional, die Fragebögen kommen i.d.R. aus questionnaires_json/)
     questionnaire = models.ForeignKey(
         FHIRQuestionnaireModel,
         on_delete=models.CASCADE,
         related_name="responses",
+        null=True,
+        blank=True,
     )
+    questionnaire_slug = models.CharField(max_length=100)
 
     # Patient – für den Anfang einfach eine ID als String
     patient_id = models.CharField(max_length=100)
@@ -77,12 +104,139 @@ class QuestionnaireResponseModel(models.Model):
     #   ]
     # }
     fhir_response = models.JSONField()
-
-    # Berechneter Gesamt-Score (z.B. 0–40 oder 0–30)
-    total_score = models.IntegerField()
-    
+    authored = models.DateTimeField(null=True, blank=True)
+    # meta.lastUpdated in Firely (Cursor für den inkrementellen Sync)
+    last_updated = models.DateTimeField(null=True, blank=True)
+
+    # Berechneter Gesamt-Score (z.B. 0–40 oder 0–30), None bei domain-basierten Fragebögen
+    total_score = models.FloatField(null=True, blank=True)
+    computed = models.JSONField(null=True, blank=True)
+    interpretation = models.TextField(blank=True)
+
+    # Outbox / Zustellung an Firely
+    delivery_status = models.CharField(
+        max_length=20,
+        choices=DELIVERY_STATUS_CHOICES,
+        default=STATUS_PENDING,
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    fhir_id = models.CharField(max_length=64, blank=True)
+    delivered_at = models.DateTimeField(null=True, blank=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["delivery_status", "next_attempt_at"], name="qr_outbox_due_idx"),
+            models.Index(fields=["patient_id", "authored"], name="qr_patient_authored_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["fhir_id"],
+                condition=~models.Q(fhir_id=""),
+                name="qr_unique_fhir_id",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.questionnaire_slug} – {self.patient_id} – Score {self.total_score}"
+
+
+class PatientResponseSync(models.Model):
+    """
+    Stand des inkrementellen Syncs der QuestionnaireResponses eines Patienten aus Firely.
+    """
+
+    patient_id = models.CharField(max_length=100, primary_key=True)
+
+    # Größtes bisher gesehenes meta.lastUpdated -> nächster Sync fragt _lastUpdated=ge<cursor>
+    cursor = models.DateTimeField(null=True, blank=True)
+    synced_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.patient_id} – {self.cursor}"
+
+
+class QuestionnaireScore(models.Model):
+    """
+    Materialisierte Scores: eine Zeile pro QuestionnaireResponse, ohne FHIR-Payload.
+    Grundlage für Verlaufskurven und Auswertungen über viele Responses.
+    """
+
+    response = models.OneToOneField(
+        QuestionnaireResponseModel,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="score",
+    )
+    patient_id = models.CharField(max_length=100)
+    questionnaire_slug = models.CharField(max_length=100)
+    # normalisierter Slug ("RLS-6" -> "rls6"), siehe scoring.slug_key
+    questionnaire_key = models.CharField(max_length=100)
+    authored = models.DateTimeField(null=True, blank=True)
+
+    total_score = models.FloatField(null=True, blank=True)
+    interpretation = models.CharField(max_length=255, blank=True)
+
+    # RLS-6 Domains
+    sleep_quality = models.IntegerField(null=True, blank=True)
+    nighttime = models.IntegerField(null=True, blank=True)
+    daytime_relaxation = models.IntegerField(null=True, blank=True)
+    control_activity = models.IntegerField(null=True, blank=True)
+
+    # Schlaftagebuch (siehe sleep_diary.METRICS), Dauern in Minuten
+    time_in_bed = models.IntegerField(null=True, blank=True)
+    total_sleep_time = models.IntegerField(null=True, blank=True)
+    sleep_onset_latency = models.IntegerField(null=True, blank=True)
+    awakenings = models.IntegerField(null=True, blank=True)
+    wake_after_sleep_onset = models.IntegerField(null=True, blank=True)
+    sleep_efficiency = models.FloatField(null=True, blank=True)
+    sleep_rating = models.IntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["patient_id", "questionnaire_key", "authored"],
+                name="score_patient_q_authored_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.questionnaire_slug} – {self.patient_id} – {self.authored} – {self.total_score}"
+
+
+class SleepDiaryAggregate(models.Model):
+    """
+    Rollierende Mittelwerte des Schlaftagebuchs je Patient und Fenster (z.B. 7 und 30 Tage,
+    endend mit dem jüngsten Eintrag). Wird nach jedem Schreiben von Scores für die
+    betroffenen Patienten nachgeführt, Dashboards lesen nur diese Zeilen.
+    """
+
+    patient_id = models.CharField(max_length=100)
+    window_days = models.PositiveSmallIntegerField()
+    window_start = models.DateField()
+    window_end = models.DateField()
+    # Nächte mit Eintrag im Fenster (mehrere Einträge pro Tag zählen einmal, der jüngste gilt)
+    nights = models.PositiveIntegerField(default=0)
+    # alle Einträge im Fenster; mehr als nights = am selben Tag ersetzte Einträge
+    entries = models.PositiveIntegerField(default=0)
+
+    time_in_bed = models.FloatField(null=True, blank=True)
+    total_sleep_time = models.FloatField(null=True, blank=True)
+    sleep_onset_latency = models.FloatField(null=True, blank=True)
+    awakenings = models.FloatField(null=True, blank=True)
+    wake_after_sleep_onset = models.FloatField(null=True, blank=True)
+    sleep_efficiency = models.FloatField(null=True, blank=True)
+    sleep_rating = models.FloatField(null=True, blank=True)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["patient_id", "window_days"], name="diary_patient_window_unique"),
+        ]
+
     def __str__(self):
-        return f"{self.questionnaire.slug} – {self.patient_id} – Score {self.total_score}"
+        return f"{self.patient_id} – {self.window_days} Tage bis {self.window_end}"
@@ -0,0 +1,161 @@
+"""
+Write-behind Outbox für QuestionnaireResponses.
+
+Submits landen zuerst in QuestionnaireResponseModel (ein lokaler DB-Write) und
+werden anschließend von drain() gebündelt als batch Bundle an Firely übertragen.
+Jeder Eintrag ist ein Conditional Create über den lokalen identifier: Wird ein Batch
+erneut gesendet (Timeout, Worker nach dem Commit in Firely abgestürzt), legt Firely
+keine Duplikate an, sondern meldet die vorhandene Ressource.
+"""
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .firely_client import bundle_entry_id, bundle_entry_status, make_bundle, post_bundle
+from .models import QuestionnaireResponseModel
+from .response_cache import build_row, local_identifier_query
+from .score_table import write_scores
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "ENABLED": False,           # opt-in: ohne laufenden Drain-Worker erreicht nichts Firely
+    "BATCH_SIZE": 100,
+    "MAX_ATTEMPTS": 10,
+    "RETRY_BACKOFF": 30,        # Sekunden, verdoppelt sich pro Versuch
+    "RETRY_BACKOFF_MAX": 3600,
+    "LEASE": 300,               # so lange gilt ein "sending"-Eintrag als vom Worker belegt
+}
+
+# 4xx ohne diese Codes sind endgültig (Firely lehnt die Ressource ab)
+RETRYABLE_STATUS = {408, 409, 429}
+
+
+def get_outbox_settings() -> dict:
+    return {**DEFAULTS, **getattr(settings, "FIRELY_OUTBOX", {})}
+
+
+def is_enabled() -> bool:
+    return bool(get_outbox_settings()["ENABLED"])
+
+
+def enqueue(result: dict) -> QuestionnaireResponseModel:
+    """
+    Speichert eine ausgewertete Submission (siehe views.prepare_submission) in der Outbox.
+    """
+    obj = build_row(result)
+    with transaction.atomic():
+        obj.save()
+        write_scores([obj])
+    return obj
+
+
+def enqueue_many(results: list) -> list:
+    """
+    Wie enqueue(), aber für viele Submissions in einem bulk_create.
+    """
+    with transaction.atomic():
+        objs = QuestionnaireResponseModel.objects.bulk_create([build_row(r) for r in results])
+        write_scores(objs)
+    return objs
+
+
+def _claim(batch_size: int, lease: int) -> list:
+    now = timezone.now()
+    with transaction.atomic():
+        qs = QuestionnaireResponseModel.objects.filter(
+            delivery_status__in=[
+                QuestionnaireResponseModel.STATUS_PENDING,
+                QuestionnaireResponseModel.STATUS_SENDING,  # Lease abgelaufen (Worker abgestürzt)
+            ],
+            next_attempt_at__lte=now,
+        ).order_by("next_attempt_at", "id")
+
+        if connection.features.has_select_for_update_skip_locked:
+            qs = qs.select_for_update(skip_locked=True)
+
+        rows = list(qs[:batch_size])
+        if rows:
+            QuestionnaireResponseModel.objects.filter(id__in=[r.id for r in rows]).update(
+                delivery_status=QuestionnaireResponseModel.STATUS_SENDING,
+                next_attempt_at=now + timedelta(seconds=lease),
+            )
+    return rows
+
+
+def _schedule_retry(row, error: str, conf: dict, permanent: bool = False):
+    row.attempts += 1
+    row.last_error = error
+    if permanent or row.attempts >= conf["MAX_ATTEMPTS"]:
+        row.delivery_status = QuestionnaireResponseModel.STATUS_FAILED
+    else:
+        delay = min(conf["RETRY_BACKOFF"] * (2 ** (row.attempts - 1)), conf["RETRY_BACKOFF_MAX"])
+        row.delivery_status = QuestionnaireResponseModel.STATUS_PENDING
+        row.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+
+
+def drain(batch_size: int | None = None) -> dict:
+    """
+    Überträgt einen Batch fälliger Outbox-Einträge als ein Bundle an Firely.
+    Liefert Zähler {"claimed", "delivered", "retry", "failed"}.
+    """
+    conf = get_outbox_settings()
+    rows = _claim(batch_size or conf["BATCH_SIZE"], conf["LEASE"])
+    stats = {"claimed": len(rows), "delivered": 0, "retry": 0, "failed": 0}
+    if not rows:
+        return stats
+
+    bundle = make_bundle(
+        [row.fhir_response for row in rows],
+        bundle_type="batch",
+        if_none_exist=[local_identifier_query(row.local_id) for row in rows],
+    )
+
+    try:
+        response_bundle = post_bundle(bundle)
+    except Exception as e:
+        logger.warning("Outbox: Bundle an Firely fehlgeschlagen: %s", e)
+        status_code = getattr(e, "status_code", None)
+        permanent = status_code is not None and 400 <= status_code < 500 and status_code not in RETRYABLE_STATUS
+        for row in rows:
+            _schedule_retry(row, str(e), conf, permanent=permanent)
+        response_entries = None
+    else:
+        response_entries = response_bundle.get("entry") or []
+
+    if response_entries is not None:
+        now = timezone.now()
+        for position, row in enumerate(rows):
+            entry = response_entries[position] if position < len(response_entries) else {}
+            code = bundle_entry_status(entry)
+
+            if code is not None and 200 <= code < 300:
+                row.delivery_status = QuestionnaireResponseModel.STATUS_DELIVERED
+                row.fhir_id = bundle_entry_id(entry)
+                row.delivered_at = now
+                row.last_error = ""
+                row.attempts += 1
+                continue
+
+            response = entry.get("response") or {}
+            outcome = response.get("outcome") or response.get("status")
+            permanent = code is not None and 400 <= code < 500 and code not in RETRYABLE_STATUS
+            _schedule_retry(row, f"{code}: {outcome}", conf, permanent=permanent)
+
+    for row in rows:
+        if row.delivery_status == QuestionnaireResponseModel.STATUS_DELIVERED:
+            stats["delivered"] += 1
+        elif row.delivery_status == QuestionnaireResponseModel.STATUS_FAILED:
+            stats["failed"] += 1
+        else:
+            stats["retry"] += 1
+
+    QuestionnaireResponseModel.objects.bulk_update(
+        rows,
+        ["delivery_status", "attempts", "next_attempt_at", "last_error", "fhir_id", "delivered_at"],
+    )
+    return stats
@@ -1,13 +1,49 @@
+import hashlib
 import json
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
 from pathlib import Path
+from types import MappingProxyType
 
 BASE = Path(__file__).resolve().parent / "questionnaires_json"
 
-def load_questionnaire(slug: str):
-    file_path = BASE / f"{slug}.json"
-    if not file_path.exists():
-        raise FileNotFoundError(f"{slug}.json nicht gefunden.")
+# Höchstens so oft (Sekunden) wird das Verzeichnis per stat() auf Änderungen geprüft.
+CHECK_INTERVAL = 2.0
+
+
+def freeze(value):
+    """
+    Macht geparstes JSON rekursiv read-only (dict -> MappingProxyType, list -> tuple).
+    """
+    if isinstance(value, dict):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+def thaw(value):
+    """
+    Gegenstück zu freeze(): liefert eine veränderbare Kopie (z.B. für requests/json.dumps).
+    """
+    if isinstance(value, MappingProxyType):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(v) for v in value]
+    return value
+
 
+def content_hash(value) -> str:
+    """
+    Stabiler Hash über den JSON-Inhalt (unabhängig von Formatierung/Key-Reihenfolge in der Datei).
+    """
+    canonical = json.dumps(thaw(value), sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _parse_file(file_path: Path):
     # Read as text first so we can produce better errors (and tolerate UTF-8 BOM).
     text = file_path.read_text(encoding="utf-8-sig")
     if not text.strip():
@@ -20,23 +56,191 @@ def load_questionnaire(slug: str):
             f"Ungültiges JSON in {file_path.name}: {e.msg} (line {e.lineno} col {e.colno})"
         ) from e
 
+
+@dataclass(frozen=True)
+class QuestionnaireEntry:
+    """
+    Ein geparster Questionnaire inkl. Datei-Signatur (mtime/size), aus der er stammt.
+    """
+
+    slug: str
+    path: Path
+    mtime_ns: int
+    size: int
+    data: MappingProxyType
+    summary: MappingProxyType
+    etag: str
+
+    @property
+    def signature(self):
+        return (self.path, self.mtime_ns, self.size)
+
+    @property
+    def last_modified(self) -> datetime:
+        return datetime.fromtimestamp(self.mtime_ns / 1e9, tz=timezone.utc)
+
+
+@dataclass(frozen=True)
+class QuestionnaireListing:
+    """
+    Kurzinfos aller Questionnaires plus ETag/Last-Modified für die Liste.
+    """
+
+    summaries: tuple
+    etag: str
+    last_modified: datetime | None
+
+
+class QuestionnaireRegistry:
+    """
+    Prozessweiter Cache der Questionnaire-JSONs.
+
+    Jede Datei wird genau einmal geparst und nur neu geladen, wenn sich mtime oder
+    Größe ändern. Die Prüfung per stat() passiert höchstens alle `check_interval`
+    Sekunden, dazwischen sind Lookups reine Dict-Zugriffe ohne Disk-I/O.
+    """
+
+    def __init__(self, base: Path = BASE, check_interval: float = CHECK_INTERVAL):
+        self.base = Path(base)
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._stats = {}      # slug -> (path, mtime_ns, size)
+        self._entries = {}    # slug -> QuestionnaireEntry (copy-on-write)
+        self._listing = None
+        self._next_check = 0.0
+
+    def _refresh(self):
+        if time.monotonic() < self._next_check:
+            return
+
+        with self._lock:
+            if time.monotonic() < self._next_check:
+                return
+
+            stats = {}
+            for path in sorted(self.base.glob("*.json")):
+                try:
+                    st = path.stat()
+                except FileNotFoundError:
+                    continue
+                stats[path.stem] = (path, st.st_mtime_ns, st.st_size)
+
+            if stats != self._stats:
+                self._stats = stats
+                self._entries = {
+                    slug: entry
+                    for slug, entry in self._entries.items()
+                    if stats.get(slug) == entry.signature
+                }
+
+            self._next_check = time.monotonic() + self.check_interval
+
+    def _load(self, slug: str) -> QuestionnaireEntry:
+        stat = self._stats.get(slug)
+        if stat is None:
+            raise FileNotFoundError(f"{slug}.json nicht gefunden.")
+
+        path = stat[0]
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            raise FileNotFoundError(f"{slug}.json nicht gefunden.") from None
+
+        data = _parse_file(path)
+        frozen = freeze(data)
+        return QuestionnaireEntry(
+            slug=slug,
+            path=path,
+            mtime_ns=st.st_mtime_ns,
+            size=st.st_size,
+            data=frozen,
+            summary=MappingProxyType({
+                "slug": slug,
+                "title": data.get("title"),
+                "description": data.get("description"),
+                "status": data.get("status", "unknown"),
+            }),
+            etag=content_hash(frozen),
+        )
+
+    def get(self, slug: str) -> QuestionnaireEntry:
+        self._refresh()
+
+        entry = self._entries.get(slug)
+        if entry is not None:
+            return entry
+
+        with self._lock:
+            entry = self._entries.get(slug)
+            if entry is None:
+                entry = self._load(slug)
+                self._entries = {**self._entries, slug: entry}
+            return entry
+
+    def exists(self, slug: str) -> bool:
+        self._refresh()
+        return slug in self._stats
+
+    def slugs(self) -> tuple:
+        self._refresh()
+        return tuple(self._stats)
+
+    def listing(self) -> QuestionnaireListing:
+        """
+        Kurzinfos (slug, title, description, status) aller Questionnaires inkl. ETag.
+        """
+        self._refresh()
+
+        stats = self._stats
+        cached = self._listing
+        if cached is not None and cached[0] is stats:
+            return cached[1]
+
+        entries = [self.get(slug) for slug in stats]
+        summaries = tuple(entry.summary for entry in entries)
+        listing = QuestionnaireListing(
+            summaries=summaries,
+            etag=content_hash(summaries),
+            last_modified=max((entry.last_modified for entry in entries), default=None),
+        )
+        self._listing = (stats, listing)
+        return listing
+
+    def summaries(self) -> tuple:
+        return self.listing().summaries
+
+    def clear(self):
+        with self._lock:
+            self._stats = {}
+            self._entries = {}
+            self._listing = None
+            self._next_check = 0.0
+
+
+registry = QuestionnaireRegistry()
+
+
+def get_questionnaire(slug: str):
+    """
+    Read-only Sicht auf den Questionnaire (aus dem Cache, ohne Kopie).
+    """
+    return registry.get(slug).data
+
+
+def questionnaire_exists(slug: str) -> bool:
+    return registry.exists(slug)
+
+
+def load_questionnaire(slug: str):
+    """
+    Veränderbare Kopie des Questionnaires (dict/list), z.B. zum Weiterschicken an Firely.
+    """
+    return thaw(registry.get(slug).data)
+
+
 def list_questionnaire_slugs():
-    return [
-        p.stem
-        for p in BASE.glob("*.json")
-    ]
+    return list(registry.slugs())
 
 
 def load_all_questionnaires():
-    questionnaires = []
-
-    for slug in list_questionnaire_slugs():
-        data = load_questionnaire(slug)
-        questionnaires.append({
-            "slug": slug,
-            "title": data.get("title"),
-            "description": data.get("description"),
-            "status": data.get("status", "unknown"),
-        })
-
-    return questionnaires
\ No newline at end of file
+    return list(registry.summaries())
@@ -0,0 +1,166 @@
+"""
+Neu-Auswertung gespeicherter QuestionnaireResponses nach Änderungen an den Scoring-Regeln.
+
+Die Responses werden in Chunks gelesen (lokal per Keyset über die id, aus Firely
+sortiert nach _lastUpdated), in Worker-Prozessen ausgewertet und per bulk_update
+zurückgeschrieben. Siehe `python manage.py rescore_responses`.
+"""
+
+from . import batch_scoring
+from .models import QuestionnaireResponseModel
+from .firely_client import iter_search
+from .response_cache import _chunks, match_rows, parse_fhir_datetime, upsert_resources
+from .score_table import write_scores
+from .scoring import score_response, slug_key, summarize_response
+
+RESCORE_FIELDS = ["total_score", "computed", "interpretation"]
+
+
+def score_chunk(items: list) -> list:
+    """
+    Worker-Funktion: [(slug, resource), ...] -> score_response()-Ergebnisse (gleiche Reihenfolge).
+    Mit numpy vektorisiert pro Questionnaire, sonst Response für Response.
+    """
+    if batch_scoring.np is None:
+        return [score_response(slug, res) for slug, res in items]
+
+    groups = {}
+    for position, (slug, res) in enumerate(items):
+        positions, resources = groups.setdefault(slug, ([], []))
+        positions.append(position)
+        resources.append(res)
+
+    out = [None] * len(items)
+    for slug, (positions, resources) in groups.items():
+        for position, result in zip(positions, batch_scoring.score_responses(resources, slug=slug)):
+            out[position] = result
+    return out
+
+
+def _questionnaire_slug(res: dict) -> str:
+    return (res.get("questionnaire") or "").split("/")[-1]
+
+
+def diff(row: QuestionnaireResponseModel | None, summary: dict) -> dict:
+    """
+    Geänderte Felder {feld: (alt, neu)}; row=None (noch nicht gespeichert) zählt als alles neu.
+    """
+    new = {
+        "total_score": summary["score"],
+        "interpretation": summary["interpretation"] or "",
+        "computed": summary["computed"],
+    }
+    if row is None:
+        return {field: (None, value) for field, value in new.items()}
+
+    old = {
+        "total_score": row.total_score,
+        "interpretation": row.interpretation,
+        "computed": row.computed,
+    }
+    return {field: (old[field], value) for field, value in new.items() if old[field] != value}
+
+
+# ----------------------------
+# Lokaler Cache (QuestionnaireResponseModel)
+# ----------------------------
+
+def local_queryset(questionnaire: str | None = None):
+    qs = QuestionnaireResponseModel.objects.all()
+    if questionnaire:
+        qs = qs.filter(score__questionnaire_key=slug_key(questionnaire))
+    return qs
+
+
+def iter_local_chunks(chunk_size: int, after_id: int = 0, questionnaire: str | None = None):
+    """
+    Gespeicherte Responses in Chunks (Keyset über id, kein OFFSET).
+    """
+    qs = local_queryset(questionnaire).order_by("id")
+    while True:
+        rows = list(qs.filter(id__gt=after_id)[:chunk_size])
+        if not rows:
+            return
+        yield rows
+        after_id = rows[-1].id
+
+
+def local_items(rows: list) -> list:
+    return [(row.questionnaire_slug or _questionnaire_slug(row.fhir_response), row.fhir_response) for row in rows]
+
+
+def apply_local(rows: list, results: list, dry_run: bool = False) -> list:
+    """
+    Übernimmt neue Scores für lokal gespeicherte Zeilen. Liefert [(row, diff), ...] der geänderten.
+    """
+    changes = []
+    for row, result in zip(rows, results):
+        summary = summarize_response(row.fhir_response, result)
+        changed = diff(row, summary)
+        if not changed:
+            continue
+        changes.append((row, changed))
+        row.total_score = summary["score"]
+        row.interpretation = summary["interpretation"] or ""
+        row.computed = summary["computed"]
+
+    if changes and not dry_run:
+        changed_rows = [row for row, _ in changes]
+        QuestionnaireResponseModel.objects.bulk_update(changed_rows, RESCORE_FIELDS)
+        write_scores(changed_rows)
+    return changes
+
+
+# ----------------------------
+# Firely
+# ----------------------------
+
+def firely_params(since=None, questionnaire: str | None = None) -> list:
+    params = [("_sort", "_lastUpdated")]
+    if since:
+        # ge statt gt: Ressourcen mit identischem Zeitstempel werden erneut (idempotent) verarbeitet
+        params.append(("_lastUpdated", f"ge{since}"))
+    if questionnaire:
+        params.append(("questionnaire", f"Questionnaire/{questionnaire}"))
+    return params
+
+
+def iter_firely_chunks(chunk_size: int, since=None, questionnaire: str | None = None):
+    """
+    Alle QuestionnaireResponses aus Firely (nach _lastUpdated sortiert) in Chunks.
+    """
+    return _chunks(iter_search("QuestionnaireResponse", firely_params(since, questionnaire)), chunk_size)
+
+
+def firely_items(resources: list) -> list:
+    return [(_questionnaire_slug(res), res) for res in resources]
+
+
+def apply_firely(resources: list, results: list, dry_run: bool = False) -> list:
+    """
+    Übernimmt Firely-Ressourcen samt neuer Scores in den lokalen Cache.
+    Liefert [(row_or_None, diff), ...] der geänderten bzw. neuen Einträge.
+    """
+    rows = match_rows(resources)
+    changes = []
+    for res, row, result in zip(resources, rows, results):
+        changed = diff(row, summarize_response(res, result))
+        if changed:
+            changes.append((row, changed))
+
+    if not dry_run:
+        upsert_resources(None, resources, results)
+    return changes
+
+
+def last_updated(resources: list) -> str | None:
+    """
+    Größtes meta.lastUpdated (Original-String) eines Chunks, für den Checkpoint.
+    """
+    best, best_raw = None, None
+    for res in resources:
+        raw = (res.get("meta") or {}).get("lastUpdated")
+        parsed = parse_fhir_datetime(raw)
+        if parsed is not None and (best is None or parsed > best):
+            best, best_raw = parsed, raw
+    return best_raw
@@ -0,0 +1,382 @@
+"""
+Lokaler Read-Through-Cache der QuestionnaireResponses eines Patienten.
+
+QuestionnaireResponseModel enthält eigene Submits (Outbox) und alle aus Firely
+synchronisierten Responses inkl. berechneter Scores. Nach dem ersten Befüllen wird
+pro Patient nur noch inkrementell per `_lastUpdated=ge<cursor>` nachgeladen.
+"""
+
+import base64
+import json
+import uuid
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.db.models.fields.json import KT
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from . import async_firely_client
+from .firely_client import iter_search, patient_id_from_resource
+from .models import PatientResponseSync, QuestionnaireResponseModel
+from .score_table import write_scores
+from .scoring import slug_key, summarize_response
+
+# identifier.system für lokal erzeugte QuestionnaireResponses
+LOCAL_IDENTIFIER_SYSTEM = "urn:rls-backend:questionnaire-response"
+
+# Anzahl Ressourcen pro Upsert (bulk_create/bulk_update)
+UPSERT_CHUNK_SIZE = 200
+
+
+def local_identifier(local_id: uuid.UUID) -> list:
+    return [{"system": LOCAL_IDENTIFIER_SYSTEM, "value": f"urn:uuid:{local_id}"}]
+
+
+def local_identifier_query(local_id: uuid.UUID) -> str:
+    # Suche nach dem lokalen identifier (z.B. für ifNoneExist)
+    return f"identifier={LOCAL_IDENTIFIER_SYSTEM}|urn:uuid:{local_id}"
+
+
+def local_id_from_resource(res: dict) -> uuid.UUID | None:
+    identifiers = res.get("identifier") or []
+    if isinstance(identifiers, dict):  # R4: identifier 0..1
+        identifiers = [identifiers]
+
+    for ident in identifiers:
+        if ident.get("system") != LOCAL_IDENTIFIER_SYSTEM:
+            continue
+        try:
+            return uuid.UUID(str(ident.get("value", "")).removeprefix("urn:uuid:"))
+        except ValueError:
+            return None
+    return None
+
+
+def parse_fhir_datetime(value) -> datetime | None:
+    """
+    FHIR dateTime/date/instant -> aware datetime (reine Daten: 00:00 UTC).
+    """
+    if not value:
+        return None
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            day = parse_date(value)
+            parsed = datetime.combine(day, time.min) if day else None
+    except ValueError:
+        return None
+    if parsed is not None and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, dt_timezone.utc)
+    return parsed
+
+
+def fhir_date_end(value) -> datetime | None:
+    """
+    Reines FHIR-Datum -> Beginn des Folgetags (00:00 UTC), als exklusive Obergrenze für
+    "bis einschließlich dieses Tages". None für dateTime-Werte.
+    """
+    try:
+        day = parse_date(value) if value else None
+    except ValueError:
+        return None
+    if day is None:
+        return None
+    return datetime.combine(day + timedelta(days=1), time.min, tzinfo=dt_timezone.utc)
+
+
+def build_row(result: dict) -> QuestionnaireResponseModel:
+    """
+    Ungespeicherte Zeile für eine ausgewertete Submission (siehe views.prepare_submission).
+    """
+    qr = result["fhir_response"]
+    return QuestionnaireResponseModel(
+        local_id=local_id_from_resource(qr) or uuid.uuid4(),
+        questionnaire_slug=result["questionnaire_slug"],
+        patient_id=result["patient_id"],
+        fhir_response=qr,
+        authored=parse_fhir_datetime(qr.get("authored")),
+        total_score=result["total_score"],
+        computed=result["computed"],
+        interpretation=result["interpretation"] or "",
+    )
+
+
+def store_delivered(items: list) -> list:
+    """
+    Speichert direkt (ohne Outbox) an Firely übertragene Submits im Cache.
+    items: [(result, fhir_id, created_resource_or_None), ...]
+    """
+    now = timezone.now()
+    rows = []
+    for result, fhir_id, created in items:
+        row = build_row(result)
+        row.delivery_status = QuestionnaireResponseModel.STATUS_DELIVERED
+        row.fhir_id = fhir_id or ""
+        row.delivered_at = now
+        row.attempts = 1
+        row.last_updated = parse_fhir_datetime(((created or {}).get("meta") or {}).get("lastUpdated"))
+        rows.append(row)
+    with transaction.atomic():
+        rows = QuestionnaireResponseModel.objects.bulk_create(rows, ignore_conflicts=True)
+        write_scores(rows)
+    return rows
+
+
+def _apply(row: QuestionnaireResponseModel, res: dict, result: dict | None = None):
+    summary = summarize_response(res, result)
+    row.fhir_response = res
+    row.fhir_id = res.get("id") or row.fhir_id
+    row.questionnaire_slug = summary["questionnaire"] or ""
+    row.authored = parse_fhir_datetime(res.get("authored"))
+    row.last_updated = parse_fhir_datetime((res.get("meta") or {}).get("lastUpdated"))
+    row.total_score = summary["score"]
+    row.computed = summary["computed"]
+    row.interpretation = summary["interpretation"] or ""
+    row.delivery_status = QuestionnaireResponseModel.STATUS_DELIVERED
+    row.delivered_at = row.delivered_at or timezone.now()
+
+
+UPSERT_FIELDS = [
+    "fhir_response",
+    "fhir_id",
+    "questionnaire_slug",
+    "authored",
+    "last_updated",
+    "total_score",
+    "computed",
+    "interpretation",
+    "delivery_status",
+    "delivered_at",
+]
+
+
+def match_rows(resources: list) -> list:
+    """
+    Bereits gespeicherte Zeilen zu Firely-Ressourcen (per fhir_id bzw. lokalem identifier),
+    gleiche Reihenfolge wie resources, None = noch nicht im Cache.
+    """
+    fhir_ids = [res["id"] for res in resources if res.get("id")]
+    local_ids = [lid for lid in map(local_id_from_resource, resources) if lid]
+
+    by_fhir_id, by_local_id = {}, {}
+    for row in QuestionnaireResponseModel.objects.filter(Q(fhir_id__in=fhir_ids) | Q(local_id__in=local_ids)):
+        if row.fhir_id:
+            by_fhir_id[row.fhir_id] = row
+        by_local_id[row.local_id] = row
+
+    return [
+        by_fhir_id.get(res.get("id")) or by_local_id.get(local_id_from_resource(res))
+        for res in resources
+    ]
+
+
+def upsert_resources(patient_id: str | None, resources: list, results: list | None = None) -> datetime | None:
+    """
+    Übernimmt QuestionnaireResponses aus Firely in den Cache (per fhir_id bzw.
+    lokalem identifier wiedererkannt). Liefert das größte meta.lastUpdated.
+    patient_id=None: Patient je Ressource aus subject.reference.
+    results: optional bereits berechnete score_response()-Ergebnisse (gleiche Reihenfolge).
+    """
+    to_create, to_update = [], []
+    for position, (res, row) in enumerate(zip(resources, match_rows(resources))):
+        if row is None:
+            row = QuestionnaireResponseModel(
+                patient_id=patient_id or patient_id_from_resource(res),
+                local_id=local_id_from_resource(res) or uuid.uuid4(),
+            )
+            to_create.append(row)
+        else:
+            to_update.append(row)
+        _apply(row, res, results[position] if results is not None else None)
+
+    with transaction.atomic():
+        QuestionnaireResponseModel.objects.bulk_create(to_create, ignore_conflicts=True)
+        QuestionnaireResponseModel.objects.bulk_update(to_update, UPSERT_FIELDS)
+        write_scores(to_create + to_update)
+
+    return max((row.last_updated for row in to_create + to_update if row.last_updated), default=None)
+
+
+def _delta_params(patient_id: str, cursor: datetime | None) -> list:
+    params = [("subject", f"Patient/{patient_id}"), ("_sort", "_lastUpdated")]
+    if cursor is not None:
+        # ge statt gt: Ressourcen mit demselben Zeitstempel wie der Cursor gehen sonst
+        # verloren; die erneut gelieferten werden idempotent übernommen
+        params.append(("_lastUpdated", f"ge{cursor.isoformat()}"))
+    return params
+
+
+def _sync_due(state: PatientResponseSync, force: bool) -> bool:
+    if force or state.synced_at is None:
+        return True
+    interval = timedelta(seconds=settings.RESPONSE_CACHE_SYNC_INTERVAL)
+    return timezone.now() - state.synced_at >= interval
+
+
+def _chunks(iterable, size: int):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _finish(state: PatientResponseSync, cursor: datetime | None):
+    if cursor is not None and (state.cursor is None or cursor > state.cursor):
+        state.cursor = cursor
+    state.synced_at = timezone.now()
+    state.save(update_fields=["cursor", "synced_at"])
+
+
+def is_synced(patient_id: str) -> bool:
+    return PatientResponseSync.objects.filter(patient_id=patient_id, synced_at__isnull=False).exists()
+
+
+def sync_patient(patient_id: str, force: bool = False) -> int:
+    """
+    Lädt neue/geänderte Responses des Patienten aus Firely nach (erster Aufruf: alle).
+    Höchstens alle RESPONSE_CACHE_SYNC_INTERVAL Sekunden, außer force=True.
+    """
+    state, _ = PatientResponseSync.objects.get_or_create(patient_id=patient_id)
+    if not _sync_due(state, force):
+        return 0
+
+    count = 0
+    cursor = None
+    resources = iter_search("QuestionnaireResponse", _delta_params(patient_id, state.cursor))
+    for chunk in _chunks(resources, UPSERT_CHUNK_SIZE):
+        chunk_cursor = upsert_resources(patient_id, chunk)
+        if chunk_cursor is not None and (cursor is None or chunk_cursor > cursor):
+            cursor = chunk_cursor
+        count += len(chunk)
+
+    _finish(state, cursor)
+    return count
+
+
+def _store_delta(state: PatientResponseSync, resources: list) -> int:
+    cursor = None
+    for chunk in _chunks(resources, UPSERT_CHUNK_SIZE):
+        chunk_cursor = upsert_resources(state.patient_id, chunk)
+        if chunk_cursor is not None and (cursor is None or chunk_cursor > cursor):
+            cursor = chunk_cursor
+    _finish(state, cursor)
+    return len(resources)
+
+
+async def async_sync_patient(patient_id: str, force: bool = False) -> int:
+    """
+    Wie sync_patient, aber Firely-I/O über den async Client (DB-Zugriffe via sync_to_async).
+    """
+    state, _ = await sync_to_async(PatientResponseSync.objects.get_or_create)(patient_id=patient_id)
+    if not _sync_due(state, force):
+        return 0
+
+    params = _delta_params(patient_id, state.cursor)
+    resources = [res async for res in async_firely_client.iter_search("QuestionnaireResponse", params)]
+    return await sync_to_async(_store_delta)(state, resources)
+
+
+# Felder der Response-Zusammenfassung (für ?fields=)
+RESPONSE_FIELDS = ("questionnaire", "score", "computed", "interpretation", "authored", "delivery_status", "raw")
+
+
+def encode_cursor(row: QuestionnaireResponseModel) -> str:
+    """
+    Opaker Keyset-Cursor (authored, id) der letzten Zeile einer Seite.
+    """
+    authored = row.authored.isoformat() if row.authored else None
+    raw = json.dumps([authored, row.id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        authored, row_id = json.loads(raw)
+        return (parse_datetime(authored) if authored else None), int(row_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError("Ungültiger Cursor.") from e
+
+
+def _after_cursor(qs, cursor: tuple):
+    # Sortierung: authored ASC (NULL zuerst), id ASC
+    authored, row_id = cursor
+    if authored is None:
+        return qs.filter(Q(authored__isnull=True, id__gt=row_id) | Q(authored__isnull=False))
+    return qs.filter(Q(authored__gt=authored) | Q(authored=authored, id__gt=row_id))
+
+
+def patient_responses_queryset(
+    patient_id: str,
+    questionnaire: str | None = None,
+    authored_from: datetime | None = None,
+    authored_to: datetime | None = None,
+    authored_before: datetime | None = None,
+    include_raw: bool = True,
+):
+    qs = QuestionnaireResponseModel.objects.filter(patient_id=patient_id)
+    if questionnaire:
+        qs = qs.filter(score__questionnaire_key=slug_key(questionnaire))
+    if authored_from is not None:
+        qs = qs.filter(authored__gte=authored_from)
+    if authored_to is not None:
+        qs = qs.filter(authored__lte=authored_to)
+    if authored_before is not None:
+        qs = qs.filter(authored__lt=authored_before)
+    if not include_raw:
+        # authored als Original-String aus dem JSON, der Rest des FHIR-Bodys bleibt in der DB
+        qs = qs.defer("fhir_response").annotate(fhir_authored=KT("fhir_response__authored"))
+    return qs.order_by(F("authored").asc(nulls_first=True), "id")
+
+
+def row_summary(row: QuestionnaireResponseModel, fields=None) -> dict:
+    if "fhir_authored" in row.__dict__:
+        authored = row.fhir_authored
+    else:
+        authored = row.fhir_response.get("authored")
+
+    summary = {
+        "questionnaire": row.questionnaire_slug or None,
+        "score": (row.computed or {}).get("total_score"),
+        "computed": row.computed,
+        "interpretation": row.interpretation or None,
+        "authored": authored,
+        "delivery_status": row.delivery_status,
+    }
+    if fields is None or "raw" in fields:
+        summary["raw"] = row.fhir_response
+    if fields is not None:
+        summary = {key: summary[key] for key in fields}
+    return summary
+
+
+def page_patient_responses(
+    patient_id: str,
+    limit: int,
+    cursor: str | None = None,
+    fields=None,
+    **filters,
+) -> dict:
+    """
+    Eine Seite (Keyset-Pagination über authored, id) der gecachten Responses.
+    Liefert {"responses": [...], "next_cursor": str | None}.
+    """
+    include_raw = fields is None or "raw" in fields
+    qs = patient_responses_queryset(patient_id, include_raw=include_raw, **filters)
+    if cursor:
+        qs = _after_cursor(qs, decode_cursor(cursor))
+
+    rows = list(qs[:limit + 1])
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return {
+        "responses": [row_summary(row, fields) for row in rows[:limit]],
+        "next_cursor": next_cursor,
+    }
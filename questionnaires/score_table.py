@@ -0,0 +1,210 @@
+"""
+Schreibt die materialisierten Scores (QuestionnaireScore) zu gespeicherten Responses.
+"""
+
+from datetime import timedelta
+from functools import reduce
+from operator import or_
+
+from django.db.models import F, Max, Q, Window
+from django.db.models.functions import RowNumber
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import QuestionnaireResponseModel, QuestionnaireScore, SleepDiaryAggregate
+from .scoring import slug_key
+from .sleep_diary import METRICS as DIARY_COLUMNS, diary_day, get_diary_settings, rolling_windows
+
+SCORE_FIELDS = [
+    "patient_id",
+    "questionnaire_slug",
+    "questionnaire_key",
+    "authored",
+    "total_score",
+    "interpretation",
+    "sleep_quality",
+    "nighttime",
+    "daytime_relaxation",
+    "control_activity",
+    *DIARY_COLUMNS,
+]
+
+# RLS-6 Domains (computed["domains"], siehe scoring.SCORING_RULES) als eigene Spalten
+RLS6_DOMAIN_COLUMNS = ("sleep_quality", "nighttime", "daytime_relaxation", "control_activity")
+
+DIARY_KEY = slug_key("Tagebuch")
+
+# Nach write_scores(): patient_ids = betroffene Patienten (z.B. für Cache-Invalidierung)
+scores_written = Signal()
+
+
+def score_values(row: QuestionnaireResponseModel) -> dict:
+    computed = row.computed or {}
+    values = {
+        "patient_id": row.patient_id,
+        "questionnaire_slug": row.questionnaire_slug,
+        "questionnaire_key": slug_key(row.questionnaire_slug),
+        "authored": row.authored,
+        "total_score": row.total_score,
+        "interpretation": (row.interpretation or "")[:255],
+    }
+    domains = computed.get("domains") or {}
+    for column in RLS6_DOMAIN_COLUMNS:
+        values[column] = domains.get(column)
+    metrics = computed.get("metrics") or {}
+    for column in DIARY_COLUMNS:
+        values[column] = metrics.get(column)
+    return values
+
+
+def write_scores(rows: list):
+    """
+    Legt die Score-Zeilen für die übergebenen Responses an bzw. aktualisiert sie.
+    Zeilen ohne PK (z.B. aus bulk_create mit ignore_conflicts) werden per local_id aufgelöst.
+    """
+    rows = list(rows)
+    if not rows:
+        return
+
+    missing = [row.local_id for row in rows if row.pk is None]
+    if missing:
+        ids = dict(
+            QuestionnaireResponseModel.objects.filter(local_id__in=missing).values_list("local_id", "id")
+        )
+        for row in rows:
+            if row.pk is None:
+                row.pk = ids.get(row.local_id)
+
+    scores = [
+        QuestionnaireScore(response_id=row.pk, **score_values(row))
+        for row in rows
+        if row.pk is not None
+    ]
+    QuestionnaireScore.objects.bulk_create(
+        scores,
+        update_conflicts=True,
+        unique_fields=["response"],
+        update_fields=SCORE_FIELDS,
+    )
+    diary_patients = {score.patient_id for score in scores if score.questionnaire_key == DIARY_KEY}
+    if diary_patients:
+        update_diary_aggregates(diary_patients)
+    scores_written.send(sender=QuestionnaireScore, patient_ids={score.patient_id for score in scores})
+
+
+SERIES_FIELDS = ["questionnaire_slug", "authored", "total_score", "interpretation", *RLS6_DOMAIN_COLUMNS]
+
+
+def read_score_series(
+    patient_id: str,
+    questionnaire: str | None = None,
+    authored_from=None,
+    authored_to=None,
+    authored_before=None,
+) -> list:
+    """
+    Score-Verlauf eines Patienten, sortiert nach authored (nur Score-Spalten, kein FHIR-JSON).
+    authored_from/authored_to inklusive, authored_before exklusiv (z.B. Folgetag eines
+    reinen Datums, damit der ganze letzte Tag enthalten ist).
+    """
+    qs = QuestionnaireScore.objects.filter(patient_id=patient_id)
+    if questionnaire:
+        qs = qs.filter(questionnaire_key=slug_key(questionnaire))
+    if authored_from is not None:
+        qs = qs.filter(authored__gte=authored_from)
+    if authored_to is not None:
+        qs = qs.filter(authored__lte=authored_to)
+    if authored_before is not None:
+        qs = qs.filter(authored__lt=authored_before)
+    return list(qs.order_by("authored", "response_id").values(*SERIES_FIELDS))
+
+
+def latest_scores(patient_ids) -> dict:
+    """
+    Jüngster Score je Patient und Questionnaire für mehrere Patienten (ein Query,
+    ROW_NUMBER über den Index patient_id/questionnaire_key/authored).
+    -> {patient_id: [{SERIES_FIELDS...}, ...]}
+    """
+    rows = (
+        QuestionnaireScore.objects.filter(patient_id__in=[str(patient_id) for patient_id in patient_ids])
+        .annotate(
+            rank=Window(
+                RowNumber(),
+                partition_by=[F("patient_id"), F("questionnaire_key")],
+                order_by=[F("authored").desc(nulls_last=True), F("response_id").desc()],
+            )
+        )
+        .filter(rank=1)
+        .order_by("patient_id", "questionnaire_key")
+        .values("patient_id", *SERIES_FIELDS)
+    )
+    scores = {}
+    for row in rows:
+        scores.setdefault(row.pop("patient_id"), []).append(row)
+    return scores
+
+
+# ----------------------------
+# Schlaftagebuch: rollierende Fenster
+# ----------------------------
+
+DIARY_AGGREGATE_FIELDS = ["window_start", "window_end", "nights", "entries", *DIARY_COLUMNS, "updated_at"]
+
+
+def update_diary_aggregates(patient_ids):
+    """
+    Führt SleepDiaryAggregate für die Patienten nach. Gelesen werden pro Patient nur die
+    Einträge im längsten Fenster vor seinem jüngsten Eintrag, nicht der ganze Verlauf.
+    """
+    windows = tuple(get_diary_settings()["WINDOWS"])
+    diary = QuestionnaireScore.objects.filter(
+        patient_id__in=[str(patient_id) for patient_id in patient_ids],
+        questionnaire_key=DIARY_KEY,
+        authored__isnull=False,
+    )
+    newest = dict(
+        diary.order_by().values("patient_id").annotate(newest=Max("authored")).values_list("patient_id", "newest")
+    )
+    if not newest:
+        return
+
+    # +1 Tag Puffer: Fenstergrenzen sind Kalendertage in der lokalen Zeitzone
+    lookback = timedelta(days=max(windows) + 1)
+    recent = reduce(or_, (Q(patient_id=patient_id, authored__gte=last - lookback) for patient_id, last in newest.items()))
+    rows = (
+        diary.filter(recent)
+        .order_by("patient_id", "authored", "response_id")
+        .values_list("patient_id", "authored", *DIARY_COLUMNS)
+    )
+
+    entries = {}
+    for patient_id, authored, *values in rows:
+        entries.setdefault(patient_id, []).append((diary_day(authored), dict(zip(DIARY_COLUMNS, values))))
+
+    aggregates = [
+        SleepDiaryAggregate(patient_id=patient_id, **window)
+        for patient_id, patient_entries in entries.items()
+        for window in rolling_windows(patient_entries, windows)
+    ]
+    SleepDiaryAggregate.objects.bulk_create(
+        aggregates,
+        update_conflicts=True,
+        unique_fields=["patient_id", "window_days"],
+        update_fields=DIARY_AGGREGATE_FIELDS,
+    )
+
+
+def read_diary_aggregates(patient_id: str) -> list:
+    """
+    Vorberechnete Tagebuch-Fenster eines Patienten (z.B. 7 und 30 Tage), kürzestes zuerst.
+    Die Fenster enden mit dem jüngsten Eintrag; days_since_last_entry zeigt, wie alt sie sind.
+    """
+    today = timezone.localdate()
+    windows = list(
+        SleepDiaryAggregate.objects.filter(patient_id=patient_id)
+        .order_by("window_days")
+        .values("window_days", *DIARY_AGGREGATE_FIELDS)
+    )
+    for window in windows:
+        window["days_since_last_entry"] = (today - window["window_end"]).days
+    return windows
@@ -0,0 +1,324 @@
+"""
+Auswertung (Scores/Interpretation) von FHIR QuestionnaireResponses.
+"""
+
+import re
+from bisect import bisect_left
+from dataclasses import dataclass, field
+
+
+def normalize_slug(slug: str) -> str:
+    """
+    Normalisiert Slugs robust:
+    - strip / lower
+    - "_" -> "-"
+    - CR/LF entfernen
+    - führende/abschließende "/" entfernen
+    - Sonderzeichen entfernen (nur [a-z0-9-] bleibt)
+    """
+    s = (slug or "").strip().lower()
+    s = s.replace("_", "-")
+    s = s.replace("\n", "").replace("\r", "")
+    s = s.strip("/")
+    s = re.sub(r"[^a-z0-9\-]", "", s)
+    return s
+
+
+def slug_key(slug: str) -> str:
+    """
+    Für stabile Erkennung unabhängig von Bindestrichen:
+    "rls-6" -> "rls6"
+    """
+    return normalize_slug(slug).replace("-", "")
+
+
+def answer_to_int(answer_obj: dict):
+    """
+    Unterstützt:
+    - {"valueInteger": 3}
+    - {"valueCoding": {"code": "3"}}
+    """
+    if not isinstance(answer_obj, dict):
+        return None
+
+    if "valueInteger" in answer_obj:
+        try:
+            return int(answer_obj["valueInteger"])
+        except (TypeError, ValueError):
+            return None
+
+    coding = answer_obj.get("valueCoding")
+    if isinstance(coding, dict) and "code" in coding:
+        try:
+            return int(coding["code"])
+        except (TypeError, ValueError):
+            return None
+
+    return None
+
+
+@dataclass(frozen=True)
+class ScoringRule:
+    """
+    Deklarative Auswertungsregel eines Questionnaires.
+
+    - items: linkIds, die in den Gesamtscore eingehen (None = alle Antworten der obersten Ebene)
+    - reverse: linkId -> Konstante k, gewertet wird k - Antwort (umgepolte Items)
+    - domains: Domain-Name -> linkIds (Summe; None, wenn ein Item fehlt)
+    - total: False = kein Gesamtscore (nur Domains)
+    - require_all: Gesamtscore nur, wenn alle items beantwortet sind
+    - transform: (min, max, scale) -> (Summe - min) / (max - min) * scale
+    - bands: ((obere Grenze inkl., Text), ...), letzte Grenze None = offen
+    - interpretation: fester Text (format() mit den Domain-Werten), wenn es keine bands gibt
+    """
+
+    type: str
+    items: tuple | None = None
+    reverse: dict = field(default_factory=dict)
+    domains: dict = field(default_factory=dict)
+    total: bool = True
+    require_all: bool = False
+    transform: tuple | None = None
+    decimals: int | None = None
+    bands: tuple = ()
+    interpretation: str = "keine Interpretation verfügbar"
+
+
+class CompiledScorer:
+    """
+    Aus einer ScoringRule kompilierter Scorer.
+
+    linkIds werden einmalig auf Slots abgebildet, Umpolung/Domains/Bänder liegen als
+    Tupel vor. score() läuft genau einmal über die Items der Response.
+    """
+
+    def __init__(self, rule: ScoringRule):
+        self.rule = rule
+
+        link_ids = list(rule.items or ())
+        for members in rule.domains.values():
+            link_ids += [link_id for link_id in members if link_id not in link_ids]
+        self.link_ids = tuple(link_ids)
+        self.slots = {link_id: slot for slot, link_id in enumerate(self.link_ids)}
+        self.reverse = tuple(rule.reverse.get(link_id) for link_id in self.link_ids)
+
+        self.total_slots = tuple(self.slots[link_id] for link_id in rule.items) if rule.items is not None else None
+        self.domains = tuple(
+            (name, tuple(self.slots[link_id] for link_id in members))
+            for name, members in rule.domains.items()
+        )
+        self.band_limits = tuple(limit for limit, _ in rule.bands if limit is not None)
+        self.band_labels = tuple(label for _, label in rule.bands)
+
+    def collect(self, qr: dict) -> tuple:
+        """
+        Antworten (umgepolt) je Slot, plus Summe aller Antworten der obersten Ebene,
+        falls die Regel keine items festlegt.
+        """
+        values = [None] * len(self.link_ids)
+        top_level_sum = 0
+        slots, reverse = self.slots, self.reverse
+
+        stack = [(item, True) for item in reversed(qr.get("item") or [])]
+        while stack:
+            item, top_level = stack.pop()
+            answers = item.get("answer") or []
+            v = answer_to_int(answers[0]) if answers else None
+
+            if v is not None:
+                if top_level:
+                    top_level_sum += v
+                slot = slots.get(str(item.get("linkId")))
+                if slot is not None and values[slot] is None:
+                    k = reverse[slot]
+                    values[slot] = v if k is None else k - v
+
+            # verschachtelte Items: item.item bzw. answer.item
+            children = list(item.get("item") or [])
+            for answer in answers:
+                children += answer.get("item") or []
+            stack.extend((child, False) for child in reversed(children))
+
+        return values, top_level_sum
+
+    def interpret(self, total_score) -> str:
+        if total_score is None or not self.band_labels:
+            return self.rule.interpretation
+        return self.band_labels[bisect_left(self.band_limits, total_score)]
+
+    def score(self, qr: dict) -> dict:
+        """
+        Liefert {"total_score", "interpretation", "computed"}.
+        """
+        rule = self.rule
+        values, top_level_sum = self.collect(qr)
+
+        total_score = raw_sum = None
+        if rule.total:
+            if self.total_slots is None:
+                raw_sum = top_level_sum
+            else:
+                answered = [values[slot] for slot in self.total_slots if values[slot] is not None]
+                if answered and (not rule.require_all or len(answered) == len(self.total_slots)):
+                    raw_sum = sum(answered)
+
+            total_score = raw_sum
+            if raw_sum is not None and rule.transform is not None:
+                low, high, scale = rule.transform
+                total_score = (raw_sum - low) / (high - low) * scale
+            if total_score is not None and rule.decimals is not None:
+                total_score = round(total_score, rule.decimals)
+
+        domains = {}
+        for name, slots in self.domains:
+            parts = [values[slot] for slot in slots]
+            domains[name] = None if None in parts else sum(parts)
+
+        computed = {"type": rule.type, "total_score": total_score}
+        if rule.transform is not None:
+            computed["raw_sum"] = raw_sum
+        if domains:
+            computed["domains"] = domains
+        computed["items"] = {
+            link_id: value for link_id, value in zip(self.link_ids, values) if value is not None
+        }
+
+        if self.band_labels:
+            interpretation = self.interpret(total_score)
+        else:
+            interpretation = rule.interpretation.format(**domains)
+
+        return {"total_score": total_score, "interpretation": interpretation, "computed": computed}
+
+
+SCORING_RULES = {
+    # IRLS: 10 Items à 0–4, Gesamtscore 0–40
+    "irls": ScoringRule(
+        type="total_score",
+        items=tuple(str(i) for i in range(1, 11)),
+        bands=(
+            (0, "kein RLS"),
+            (10, "mildes RLS"),
+            (20, "mittelgradiges RLS"),
+            (30, "schweres RLS"),
+            (None, "sehr schweres RLS"),
+        ),
+    ),
+    # RLS-6: domain-basiert, kein Gesamtscore (linkIds siehe RLS-6.json)
+    "rls6": ScoringRule(
+        type="rls6_domains",
+        domains={
+            "sleep_quality": ("1", "3"),
+            "nighttime": ("2.1", "2.2"),
+            "daytime_relaxation": ("2.3",),
+            "control_activity": ("2.4",),
+        },
+        total=False,
+        interpretation=(
+            "RLS-6 wird domain-basiert ausgewertet (kein Gesamtscore). "
+            "Sleep(1+3)={sleep_quality}, Night(2.1+2.2)={nighttime}, "
+            "DayRelax(2.3)={daytime_relaxation}, Control(2.4)={control_activity}"
+        ),
+    ),
+    # MHI-5: Items a–e (1–6), c und e umgepolt, Summe 5–30 -> 0–100
+    "mhi5": ScoringRule(
+        type="mhi5",
+        items=("a", "b", "c", "d", "e"),
+        reverse={"c": 7, "e": 7},
+        require_all=True,
+        transform=(5, 30, 100),
+        decimals=1,
+        bands=(
+            (52, "Hinweis auf psychische Belastung"),
+            (None, "unauffällig"),
+        ),
+    ),
+}
+
+# Questionnaires ohne eigene Regel: Summe aller Antworten der obersten Ebene
+DEFAULT_RULE = ScoringRule(type="total_score")
+
+
+_scorers = {}      # slug_key -> CompiledScorer
+_by_slug = {}      # Slug wie übergeben -> CompiledScorer (spart die Normalisierung)
+_default_scorer = CompiledScorer(DEFAULT_RULE)
+
+
+def register_rule(slug: str, rule: ScoringRule):
+    """
+    Kompiliert die Regel und registriert sie für den Slug (z.B. "MHI-5" -> "mhi5").
+    """
+    register_scorer(slug, CompiledScorer(rule))
+
+
+def register_scorer(slug: str, scorer):
+    """
+    Registriert einen eigenen Scorer (score(qr) / interpret(total_score) wie CompiledScorer),
+    für Questionnaires, die sich nicht als Summenregel beschreiben lassen.
+    """
+    _scorers[slug_key(slug)] = scorer
+    _by_slug.clear()
+
+
+for _slug, _rule in SCORING_RULES.items():
+    register_rule(_slug, _rule)
+
+# Schlaftagebuch: Uhrzeiten und Dauern statt Summenscore
+from .sleep_diary import SleepDiaryScorer  # noqa: E402
+
+register_scorer("Tagebuch", SleepDiaryScorer())
+
+
+def get_scorer(slug: str) -> CompiledScorer:
+    scorer = _by_slug.get(slug)
+    if scorer is None:
+        scorer = _scorers.get(slug_key(slug), _default_scorer)
+        if len(_by_slug) < 1024:
+            _by_slug[slug] = scorer
+    return scorer
+
+
+def score_response(slug: str, qr: dict) -> dict:
+    """
+    Wertet eine QuestionnaireResponse nach der Regel des Questionnaires aus.
+    Liefert {"total_score", "interpretation", "computed"}.
+    """
+    return get_scorer(slug).score(qr)
+
+
+def interpret_score(questionnaire_slug: str, total_score) -> str:
+    """
+    Interpretation nur für Scores, die einen Gesamtscore haben (z.B. IRLS).
+    """
+    return get_scorer(questionnaire_slug).interpret(total_score)
+
+
+def summarize_response(res: dict, result: dict | None = None) -> dict:
+    """
+    Wertet eine QuestionnaireResponse aus Firely für die Patientenansicht aus.
+    result: bereits berechnetes score_response()-Ergebnis (z.B. aus einem Worker-Prozess).
+    """
+    questionnaire_ref = res.get("questionnaire")  # "Questionnaire/RLS-6"
+    authored = res.get("authored")
+
+    qslug = None
+    score = None
+    interpretation = None
+    computed = None
+
+    if questionnaire_ref:
+        qslug = questionnaire_ref.split("/")[-1]
+        if result is None:
+            result = score_response(qslug, res)
+        score = result["total_score"]
+        interpretation = result["interpretation"]
+        computed = result["computed"]
+
+    return {
+        "questionnaire": qslug,
+        "score": score,
+        "computed": computed,
+        "interpretation": interpretation,
+        "authored": authored,
+        "raw": res,
+    }
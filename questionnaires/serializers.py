@@ -19,13 +19,6 @@ class FHIRQuestionnaireSerializer(serializers.ModelSerializer):
         read_only_fields = ["created_at", "updated_at"]
 
 class QuestionnaireResponseSerializer(serializers.ModelSerializer):
-    questionnaire_slug = serializers.SlugRelatedField(
-        source="questionnaire",
-        slug_field="slug",
-        queryset=FHIRQuestionnaireModel.objects.all(),
-        write_only=True,
-    )
-
     class Meta:
         model = QuestionnaireResponseModel
         fields = [
@@ -34,6 +27,24 @@ class QuestionnaireResponseSerializer(serializers.ModelSerializer):
             "patient_id",
             "fhir_response",
             "total_score",
+            "computed",
+            "interpretation",
+            "delivery_status",
+            "attempts",
+            "last_error",
+            "fhir_id",
+            "delivered_at",
             "created_at",
         ]
-        read_only_fields = ["id", "total_score", "created_at"]
\ No newline at end of file
+        read_only_fields = [
+            "id",
+            "total_score",
+            "computed",
+            "interpretation",
+            "delivery_status",
+            "attempts",
+            "last_error",
+            "fhir_id",
+            "delivered_at",
+            "created_at",
+        ]
\ No newline at end of file
@@ -0,0 +1,264 @@
+"""
+Auswertung des Schlaftagebuchs (Questionnaire "Tagebuch").
+
+Ein Eintrag beschreibt eine Nacht: Uhrzeiten (time-Items) für Zubettgehen, Einschlafen,
+Aufwachen und Aufstehen, Dauern (integer) und die nächtlichen Wachphasen in der Gruppe 5.
+Daraus werden pro Nacht Bettzeit, Schlafdauer, Einschlaflatenz, Wachzeit nach dem
+Einschlafen und Schlafeffizienz berechnet. Ohne Django-Modelle, damit Worker-Prozesse
+und Skripte es wie scoring.py nutzen können.
+"""
+
+import re
+from datetime import date, datetime, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+DEFAULTS = {
+    "DURATION_UNIT": "min",     # Einheit der Dauer-Items 1/2 ("min" oder "h"); 5b ist immer in Minuten
+    "WINDOWS": (7, 30),         # rollierende Fenster (Tage) in SleepDiaryAggregate
+    # Längere Spannen zwischen zwei Uhrzeiten gelten als Eingabefehler (z.B. Einschlafen
+    # vor dem Zubettgehen eingetragen -> fast 24 h) und ergeben None
+    "MAX_SPAN_HOURS": 16,
+}
+
+MINUTES_PER_DAY = 24 * 60
+
+# linkIds aus Tagebuch.json
+SLEEP_DURATION = "1"        # Typische Schlafdauer
+TIME_IN_BED = "2"           # Typische Dauer im Bett
+BEDTIME = "3"               # Zubettgehzeit
+SLEEP_ONSET = "4"           # Zeitpunkt des Einschlafens
+AWAKENINGS = "5a"           # Wie oft wachen Sie nachts auf? (Gruppe 5)
+WAKE_DURATION = "5b"        # Dauer bis zum Wiedereinschlafen, je Wachphase (Gruppe 5)
+FINAL_WAKE = "6"            # Zeitpunkt des Aufwachens
+RISE_TIME = "7"             # Zeitpunkt des Aufstehens
+SLEEP_RATING = "8"          # Schlafqualität 1–9
+
+TIME_ITEMS = frozenset({BEDTIME, SLEEP_ONSET, FINAL_WAKE, RISE_TIME})
+
+# Kennzahlen pro Nacht (computed["metrics"], Spalten in QuestionnaireScore)
+METRICS = (
+    "time_in_bed",              # Minuten
+    "total_sleep_time",         # Minuten
+    "sleep_onset_latency",      # Minuten
+    "awakenings",
+    "wake_after_sleep_onset",   # Minuten
+    "sleep_efficiency",         # Prozent
+    "sleep_rating",             # 1–9
+)
+
+_TIME = re.compile(r"^([01][0-9]|2[0-3]):([0-5][0-9])(?::([0-5][0-9]|60)(?:\.[0-9]+)?)?$")
+
+
+def get_diary_settings() -> dict:
+    return {**DEFAULTS, **getattr(settings, "SLEEP_DIARY", {})}
+
+
+def parse_time(value) -> int | None:
+    """
+    FHIR time "22:30:00" (Sekunden optional) -> Minuten seit Mitternacht.
+    """
+    if not isinstance(value, str):
+        return None
+    match = _TIME.match(value.strip())
+    if match is None:
+        return None
+    return int(match.group(1)) * 60 + int(match.group(2))
+
+
+def span(start: int | None, end: int | None) -> int | None:
+    """
+    Minuten von start bis end; liegt end vor start, ist Mitternacht dazwischen.
+    """
+    if start is None or end is None:
+        return None
+    return (end - start) % MINUTES_PER_DAY
+
+
+def _answer_value(item: dict, link_id: str):
+    answers = item.get("answer") or []
+    if not answers or not isinstance(answers[0], dict):
+        return None
+    answer = answers[0]
+    if link_id in TIME_ITEMS:
+        return parse_time(answer.get("valueTime"))
+    value = answer.get("valueInteger")
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return int(value)
+
+
+def collect_answers(qr: dict) -> dict:
+    """
+    Antworten {linkId: Wert} über alle Ebenen (Gruppe 5 liegt in item.item, Unterfragen
+    ggf. in answer.item). Uhrzeiten als Minuten seit Mitternacht, sonst int.
+    Der erste Wert je linkId gilt.
+    """
+    values = {}
+    stack = list(reversed(qr.get("item") or []))
+    while stack:
+        item = stack.pop()
+        if not isinstance(item, dict):
+            continue
+        link_id = str(item.get("linkId"))
+        if link_id not in values:
+            value = _answer_value(item, link_id)
+            if value is not None:
+                values[link_id] = value
+
+        children = list(item.get("item") or [])
+        for answer in item.get("answer") or []:
+            if isinstance(answer, dict):
+                children += answer.get("item") or []
+        stack.extend(reversed(children))
+    return values
+
+
+def plausible_span(start: int | None, end: int | None, max_minutes: int) -> int | None:
+    minutes = span(start, end)
+    return minutes if minutes is not None and minutes <= max_minutes else None
+
+
+def night_metrics(values: dict, duration_unit: str = "min", max_span_hours: int = 16) -> dict:
+    """
+    Kennzahlen einer Nacht aus collect_answers().
+
+    Bettzeit und Schlafdauer werden aus den Uhrzeiten berechnet (Zubettgehen bis
+    Aufstehen bzw. Einschlafen bis Aufwachen abzüglich der nächtlichen Wachzeit) und nur
+    ohne Uhrzeiten aus den Dauer-Items 1/2 genommen. Fehlende oder unplausible Angaben
+    (Spanne über max_span_hours, Einschlafdauer bzw. Schlafdauer länger als die Bettzeit)
+    ergeben None.
+    """
+    factor = 60 if duration_unit == "h" else 1
+    max_span = max_span_hours * 60
+
+    awakenings = values.get(AWAKENINGS)
+    wake_duration = values.get(WAKE_DURATION)
+    if awakenings == 0:
+        waso = 0
+    elif awakenings is not None and wake_duration is not None:
+        waso = awakenings * wake_duration
+    else:
+        waso = None
+
+    time_in_bed = plausible_span(values.get(BEDTIME), values.get(RISE_TIME), max_span)
+    if time_in_bed is None and values.get(TIME_IN_BED) is not None:
+        time_in_bed = values[TIME_IN_BED] * factor
+
+    latency = plausible_span(values.get(BEDTIME), values.get(SLEEP_ONSET), max_span)
+    if latency is not None and time_in_bed is not None and latency > time_in_bed:
+        latency = None
+
+    asleep = plausible_span(values.get(SLEEP_ONSET), values.get(FINAL_WAKE), max_span)
+    if asleep is not None:
+        total_sleep_time = max(asleep - (waso or 0), 0)
+    elif values.get(SLEEP_DURATION) is not None:
+        total_sleep_time = values[SLEEP_DURATION] * factor
+    else:
+        total_sleep_time = None
+
+    # mehr Schlaf als Bettzeit: die Angaben widersprechen sich, keine Bettzeit/Effizienz
+    if time_in_bed is not None and total_sleep_time is not None and total_sleep_time > time_in_bed:
+        time_in_bed = None
+
+    efficiency = None
+    if time_in_bed and total_sleep_time is not None:
+        efficiency = round(total_sleep_time / time_in_bed * 100, 1)
+
+    return {
+        "time_in_bed": time_in_bed,
+        "total_sleep_time": total_sleep_time,
+        "sleep_onset_latency": latency,
+        "awakenings": awakenings,
+        "wake_after_sleep_onset": waso,
+        "sleep_efficiency": efficiency,
+        "sleep_rating": values.get(SLEEP_RATING),
+    }
+
+
+def format_minutes(minutes: int) -> str:
+    return f"{minutes // 60}:{minutes % 60:02d}"
+
+
+def format_time(minutes: int) -> str:
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def interpret_metrics(metrics: dict) -> str:
+    parts = []
+    if metrics["sleep_efficiency"] is not None:
+        parts.append(f"Schlafeffizienz {metrics['sleep_efficiency']:g} %")
+    if metrics["total_sleep_time"] is not None:
+        parts.append(f"Schlafdauer {format_minutes(metrics['total_sleep_time'])} h")
+    if metrics["sleep_onset_latency"] is not None:
+        parts.append(f"Einschlafdauer {metrics['sleep_onset_latency']} min")
+    if metrics["awakenings"] is not None:
+        parts.append(f"{metrics['awakenings']}x aufgewacht")
+    return ", ".join(parts) or "Schlaftagebuch ohne auswertbare Angaben"
+
+
+class SleepDiaryScorer:
+    """
+    Scorer für das Schlaftagebuch (gleiche Schnittstelle wie scoring.CompiledScorer).
+    Kein Gesamtscore; die Kennzahlen stehen in computed["metrics"].
+    """
+
+    type = "sleep_diary"
+
+    def interpret(self, total_score) -> str:
+        return "Schlaftagebuch (kein Gesamtscore)"
+
+    def score(self, qr: dict) -> dict:
+        conf = get_diary_settings()
+        values = collect_answers(qr)
+        metrics = night_metrics(values, conf["DURATION_UNIT"], conf["MAX_SPAN_HOURS"])
+        items = {
+            link_id: format_time(value) if link_id in TIME_ITEMS else value
+            for link_id, value in values.items()
+        }
+        computed = {"type": self.type, "total_score": None, "metrics": metrics, "items": items}
+        return {"total_score": None, "interpretation": interpret_metrics(metrics), "computed": computed}
+
+
+# ----------------------------
+# Rollierende Fenster
+# ----------------------------
+
+def diary_day(authored: datetime) -> date:
+    # Kalendertag des Eintrags (Zeitzone der Installation)
+    return timezone.localdate(authored)
+
+
+def rolling_windows(entries, windows) -> list:
+    """
+    Mittelwerte je Fenster aus [(Tag, metrics), ...] in der Reihenfolge von authored.
+    Pro Tag zählt eine Nacht (der jüngste Eintrag, z.B. eine Korrektur); "entries" zählt
+    alle Einträge im Fenster, die Differenz zu "nights" sind ersetzte Einträge.
+    Jedes Fenster endet mit der jüngsten Nacht und umfasst `days` Kalendertage.
+    -> [{"window_days", "window_start", "window_end", "nights", "entries", <METRICS>...}, ...]
+    """
+    nights, counts = {}, {}
+    for day, metrics in entries:
+        nights[day] = metrics
+        counts[day] = counts.get(day, 0) + 1
+    if not nights:
+        return []
+
+    end = max(nights)
+    out = []
+    for days in windows:
+        start = end - timedelta(days=days - 1)
+        members = [metrics for day, metrics in nights.items() if day >= start]
+        row = {
+            "window_days": days,
+            "window_start": start,
+            "window_end": end,
+            "nights": len(members),
+            "entries": sum(count for day, count in counts.items() if day >= start),
+        }
+        for metric in METRICS:
+            values = [metrics[metric] for metrics in members if metrics.get(metric) is not None]
+            row[metric] = round(sum(values) / len(values), 1) if values else None
+        out.append(row)
+    return out
@@ -1,3 +1,624 @@
-from django.test import TestCase
+import random
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from unittest import mock, skipIf
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from . import batch_scoring, outbox
+from . import response_cache
+from .firely_client import FirelyError
+from .models import QuestionnaireResponseModel
+from .response_cache import LOCAL_IDENTIFIER_SYSTEM
+from .scoring import CompiledScorer, ScoringRule, get_scorer, score_response
+from .sleep_diary import METRICS, diary_day, rolling_windows
+from .validation import validate_response_items
+from .views import parse_date_params
+
+OUTBOX_SETTINGS = {"MAX_ATTEMPTS": 3, "RETRY_BACKOFF": 30, "RETRY_BACKOFF_MAX": 60}
+
+
+def make_response(**fields) -> QuestionnaireResponseModel:
+    fields.setdefault("patient_id", "1")
+    fields.setdefault("questionnaire_slug", "IRLS")
+    fields.setdefault("fhir_response", {"resourceType": "QuestionnaireResponse", "status": "completed"})
+    return QuestionnaireResponseModel.objects.create(**fields)
+
+
+def response_bundle(*statuses) -> dict:
+    entries = []
+    for position, status_text in enumerate(statuses):
+        entry = {"response": {"status": status_text}}
+        if status_text.startswith("2"):
+            entry["resource"] = {"resourceType": "QuestionnaireResponse", "id": f"qr-{position}"}
+        entries.append(entry)
+    return {"resourceType": "Bundle", "type": "batch-response", "entry": entries}
+
+
+@override_settings(FIRELY_OUTBOX=OUTBOX_SETTINGS)
+class OutboxDrainTests(TestCase):
+    """
+    Zustandsübergänge der Outbox (pending -> sending -> delivered / pending / failed).
+    """
+
+    def drain(self, result):
+        with mock.patch.object(outbox, "post_bundle") as post_bundle:
+            if isinstance(result, Exception):
+                post_bundle.side_effect = result
+                with self.assertLogs(outbox.logger, "WARNING"):
+                    stats = outbox.drain()
+            else:
+                post_bundle.return_value = result
+                stats = outbox.drain()
+        return stats, post_bundle
+
+    def test_delivered_as_conditional_create(self):
+        row = make_response()
+
+        stats, post_bundle = self.drain(response_bundle("201 Created"))
+
+        row.refresh_from_db()
+        self.assertEqual(stats, {"claimed": 1, "delivered": 1, "retry": 0, "failed": 0})
+        self.assertEqual(row.delivery_status, QuestionnaireResponseModel.STATUS_DELIVERED)
+        self.assertEqual(row.fhir_id, "qr-0")
+        self.assertEqual(row.attempts, 1)
+        self.assertIsNotNone(row.delivered_at)
+
+        (bundle,), _ = post_bundle.call_args
+        request = bundle["entry"][0]["request"]
+        self.assertEqual(request["ifNoneExist"], f"identifier={LOCAL_IDENTIFIER_SYSTEM}|urn:uuid:{row.local_id}")
+
+    def test_existing_resource_counts_as_delivered(self):
+        # erneut gesendeter Batch: Firely meldet die vorhandene Ressource mit 200
+        row = make_response()
+
+        stats, _ = self.drain(response_bundle("200 OK"))
+
+        row.refresh_from_db()
+        self.assertEqual(stats["delivered"], 1)
+        self.assertEqual(row.delivery_status, QuestionnaireResponseModel.STATUS_DELIVERED)
+
+    def test_bundle_error_schedules_retry_with_backoff(self):
+        row = make_response()
+        before = timezone.now()
+
+        stats, _ = self.drain(FirelyError("Bundle fehlgeschlagen: 503", status_code=503))
+
+        row.refresh_from_db()
+        self.assertEqual(stats, {"claimed": 1, "delivered": 0, "retry": 1, "failed": 0})
+        self.assertEqual(row.delivery_status, QuestionnaireResponseModel.STATUS_PENDING)
+        self.assertEqual(row.attempts, 1)
+        self.assertIn("503", row.last_error)
+        self.assertGreaterEqual(row.next_attempt_at, before + timedelta(seconds=30))
+
+    def test_connection_error_is_retried(self):
+        row = make_response()
+
+        stats, _ = self.drain(ConnectionError("refused"))
+
+        row.refresh_from_db()
+        self.assertEqual(stats["retry"], 1)
+        self.assertEqual(row.delivery_status, QuestionnaireResponseModel.STATUS_PENDING)
+
+    def test_backoff_is_capped(self):
+        row = make_response(attempts=1)
+        before = timezone.now()
+
+        self.drain(FirelyError("Bundle fehlgeschlagen: 503", status_code=503))
+
+        row.refresh_from_db()
+        # 30 * 2**1 = 60 = RETRY_BACKOFF_MAX
+        self.assertGreaterEqual(row.next_attempt_at, before + timedelta(seconds=60))
+        self.assertLess(row.next_attempt_at, before + timedelta(seconds=90))
+
+    def test_rejected_entry_fails_permanently(self):
+        rejected, accepted = make_response(), make_response()
+
+        stats, _ = self.drain(response_bundle("422 Unprocessable Entity", "201 Created"))
+
+        rejected.refresh_from_db()
+        accepted.refresh_from_db()
+        self.assertEqual(stats, {"claimed": 2, "delivered": 1, "retry": 0, "failed": 1})
+        self.assertEqual(rejected.delivery_status, QuestionnaireResponseModel.STATUS_FAILED)
+        self.assertIn("422", rejected.last_error)
+        self.assertEqual(accepted.delivery_status, QuestionnaireResponseModel.STATUS_DELIVERED)
+
+    def test_conflict_and_rate_limit_are_retried(self):
+        rows = [make_response(), make_response(), make_response()]
+
+        stats, _ = self.drain(response_bundle("409 Conflict", "429 Too Many Requests", "500 Internal Server Error"))
+
+        self.assertEqual(stats["retry"], 3)
+        for row in rows:
+            row.refresh_from_db()
+            self.assertEqual(row.delivery_status, QuestionnaireResponseModel.STATUS_PENDING)
+
+    def test_rejected_bundle_fails_all_rows(self):
+        rows = [make_response(), make_response()]
+
+        stats, _ = self.drain(FirelyError("Bundle fehlgeschlagen: 400", status_code=400))
+
+        self.assertEqual(stats["failed"], 2)
+        for row in rows:
+            row.refresh_from_db()
+            self.assertEqual(row.delivery_status, QuestionnaireResponseModel.STATUS_FAILED)
+
+    def test_missing_entry_is_retried(self):
+        first, second = make_response(), make_response()
+
+        stats, _ = self.drain(response_bundle("201 Created"))
+
+        second.refresh_from_db()
+        self.assertEqual(stats["delivered"], 1)
+        self.assertEqual(second.delivery_status, QuestionnaireResponseModel.STATUS_PENDING)
+
+    def test_fails_after_max_attempts(self):
+        row = make_response(attempts=OUTBOX_SETTINGS["MAX_ATTEMPTS"] - 1)
+
+        stats, _ = self.drain(FirelyError("Bundle fehlgeschlagen: 503", status_code=503))
+
+        row.refresh_from_db()
+        self.assertEqual(stats["failed"], 1)
+        self.assertEqual(row.delivery_status, QuestionnaireResponseModel.STATUS_FAILED)
+        self.assertEqual(row.attempts, OUTBOX_SETTINGS["MAX_ATTEMPTS"])
+
+    def test_only_due_rows_are_claimed(self):
+        now = timezone.now()
+        due = make_response()
+        later = make_response(next_attempt_at=now + timedelta(minutes=5))
+        make_response(delivery_status=QuestionnaireResponseModel.STATUS_FAILED)
+        make_response(delivery_status=QuestionnaireResponseModel.STATUS_DELIVERED, fhir_id="x")
+        # Lease abgelaufen: Worker ist nach dem Claim abgestürzt
+        orphaned = make_response(
+            delivery_status=QuestionnaireResponseModel.STATUS_SENDING,
+            next_attempt_at=now - timedelta(seconds=1),
+        )
+
+        stats, _ = self.drain(response_bundle("201 Created", "201 Created"))
+
+        self.assertEqual(stats["claimed"], 2)
+        for row in (due, orphaned):
+            row.refresh_from_db()
+            self.assertEqual(row.delivery_status, QuestionnaireResponseModel.STATUS_DELIVERED)
+        later.refresh_from_db()
+        self.assertEqual(later.delivery_status, QuestionnaireResponseModel.STATUS_PENDING)
+
+    def test_empty_outbox(self):
+        stats, post_bundle = self.drain(response_bundle())
+
+        self.assertEqual(stats["claimed"], 0)
+        post_bundle.assert_not_called()
+
+
+class ResponsePaginationTests(TestCase):
+    """
+    Keyset-Pagination über (authored, id) in response_cache.page_patient_responses.
+    """
+
+    def make(self, authored, patient_id="1") -> str:
+        # die Zusammenfassung enthält keine Zeilen-ID, daher eine eigene Ressourcen-ID
+        resource_id = f"qr-{QuestionnaireResponseModel.objects.count()}"
+        make_response(
+            patient_id=patient_id,
+            authored=authored,
+            fhir_response={"resourceType": "QuestionnaireResponse", "id": resource_id},
+        )
+        return resource_id
+
+    def page_ids(self, limit: int, **filters) -> list:
+        pages, cursor = [], None
+        while True:
+            page = response_cache.page_patient_responses("1", limit, cursor=cursor, fields=["raw"], **filters)
+            pages.append([row["raw"]["id"] for row in page["responses"]])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                return pages
+
+    def test_cursor_round_trip_with_equal_authored(self):
+        authored = datetime(2026, 10, 1, 8, 0, tzinfo=dt_timezone.utc)
+        latest = self.make(authored + timedelta(hours=1))
+        same = [self.make(authored) for _ in range(5)]
+        undated = self.make(None)
+        self.make(authored, patient_id="2")
+
+        pages = self.page_ids(2)
+
+        self.assertEqual([len(page) for page in pages], [2, 2, 2, 1])
+        self.assertEqual(sum(pages, []), [undated, *same, latest])
+
+    def test_cursor_survives_encoding(self):
+        row = make_response(authored=datetime(2026, 10, 1, 8, 0, 30, 123456, tzinfo=dt_timezone.utc))
+
+        self.assertEqual(response_cache.decode_cursor(response_cache.encode_cursor(row)), (row.authored, row.id))
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(ValueError):
+            response_cache.decode_cursor("kein-cursor")
+
+    def test_date_only_to_includes_whole_day(self):
+        self.make(datetime(2026, 10, 9, 23, 59, tzinfo=dt_timezone.utc))
+        inside = self.make(datetime(2026, 10, 10, 23, 30, tzinfo=dt_timezone.utc))
+        self.make(datetime(2026, 10, 11, 0, 0, tzinfo=dt_timezone.utc))
+
+        filters = parse_date_params({"from": "2026-10-10", "to": "2026-10-10"})
+
+        self.assertEqual(self.page_ids(10, **filters), [[inside]])
+
+    def test_datetime_to_is_inclusive(self):
+        filters = parse_date_params({"to": "2026-10-10T08:00:00Z"})
+
+        self.assertEqual(filters, {"authored_to": datetime(2026, 10, 10, 8, 0, tzinfo=dt_timezone.utc)})
+
+
+class BatchSubmitTests(TestCase):
+    def submit(self, bundle_type: str, result_bundle: dict):
+        entries = [
+            {"questionnaire_slug": "Tagebuch", "patient_id": "1", "fhir_response": {"item": []}}
+            for _ in range(2)
+        ]
+        with mock.patch("questionnaires.views.post_bundle", return_value=result_bundle) as post_bundle:
+            response = self.client.post(
+                "/api/questionnaires/responses/batch/",
+                {"type": bundle_type, "entries": entries},
+                content_type="application/json",
+            )
+        return response, post_bundle
+
+    @override_settings(FIRELY_OUTBOX={"ENABLED": True})
+    def test_transaction_bypasses_outbox(self):
+        response, post_bundle = self.submit("transaction", response_bundle("201 Created", "201 Created"))
+
+        self.assertEqual(response.status_code, 200, response.content)
+        (bundle,), _ = post_bundle.call_args
+        self.assertEqual(bundle["type"], "transaction")
+        self.assertEqual([r["status"] for r in response.json()["results"]], [201, 201])
+        self.assertFalse(
+            QuestionnaireResponseModel.objects.exclude(
+                delivery_status=QuestionnaireResponseModel.STATUS_DELIVERED,
+            ).exists()
+        )
+
+    @override_settings(FIRELY_OUTBOX={"ENABLED": True})
+    def test_batch_goes_through_outbox(self):
+        response, post_bundle = self.submit("batch", response_bundle())
+
+        self.assertEqual(response.status_code, 200, response.content)
+        post_bundle.assert_not_called()
+        self.assertEqual(
+            QuestionnaireResponseModel.objects.filter(delivery_status=QuestionnaireResponseModel.STATUS_PENDING).count(),
+            2,
+        )
+
+
+def answer(link_id, **value) -> dict:
+    return {"linkId": link_id, "answer": [value]}
+
+
+class ResponseValidationTests(TestCase):
+    def errors(self, slug, items) -> list:
+        return [(error["linkId"], error["error"]) for error in validate_response_items(slug, items)]
+
+    def test_integer_answers(self):
+        items = [answer("1", valueInteger=4), answer("2", valueCoding={"code": "2"}), answer("3", valueInteger=0)]
+        self.assertEqual(self.errors("IRLS", items), [])
+
+    def test_wrong_type(self):
+        errors = self.errors("IRLS", [answer("1", valueString="4"), answer("2", valueInteger=True)])
+        self.assertEqual([link_id for link_id, _ in errors], ["1", "2"])
+
+    def test_coding_must_be_numeric_for_integer_items(self):
+        errors = self.errors("IRLS", [answer("1", valueCoding={"code": "viel"})])
+        self.assertEqual([link_id for link_id, _ in errors], ["1"])
+
+    def test_irls_range(self):
+        items = [answer("1", valueInteger=5), answer("2", valueInteger=-1), answer("3", valueCoding={"code": "99"})]
+        errors = self.errors("IRLS", items)
+        self.assertEqual([link_id for link_id, _ in errors], ["1", "2", "3"])
+        self.assertIn("Maximum", errors[0][1])
+        self.assertIn("Minimum", errors[1][1])
+
+    def test_rls6_range_in_group(self):
+        group = {"linkId": "2", "item": [answer("2.1", valueInteger=10), answer("2.2", valueInteger=11)]}
+        errors = self.errors("RLS-6", [answer("1", valueInteger=0), group])
+        self.assertEqual([link_id for link_id, _ in errors], ["2.2"])
+
+    def test_answer_options(self):
+        group = {"linkId": "mhi5", "item": [answer("a", valueCoding={"code": "1"}), answer("b", valueCoding={"code": "9"})]}
+        errors = self.errors("MHI-5", [group])
+        self.assertEqual([link_id for link_id, _ in errors], ["b"])
+
+    def test_unknown_link_id(self):
+        errors = self.errors("IRLS", [answer("11", valueInteger=1), answer("2.1", valueInteger=1)])
+        self.assertEqual([link_id for link_id, _ in errors], ["11", "2.1"])
+
+    def test_out_of_range_submission_is_rejected(self):
+        items = [answer(str(link_id), valueInteger=99) for link_id in range(1, 11)]
+        response = self.client.post(
+            "/api/questionnaires/IRLS/responses/",
+            {"patient_id": "1", "fhir_response": {"item": items}},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(QuestionnaireResponseModel.objects.exists())
+
+
+def integer_items(values: dict) -> list:
+    return [answer(link_id, valueInteger=value) for link_id, value in values.items()]
+
+
+def mhi5_response(a, b, c, d, e) -> dict:
+    codes = {"a": a, "b": b, "c": c, "d": d, "e": e}
+    items = [answer(link_id, valueCoding={"code": str(code)}) for link_id, code in codes.items() if code is not None]
+    return {"item": [{"linkId": "mhi5", "item": items}]}
+
+
+class ScoringRuleTests(TestCase):
+    """
+    Festgeschriebene Ergebnisse der Scoring-Regeln (scoring.SCORING_RULES).
+    IRLS und Questionnaires ohne Regel liefern dasselbe wie vor der Umstellung auf Regeln.
+    """
+
+    def test_irls_bands(self):
+        # Bandgrenzen inklusive: 0 / 1–10 / 11–20 / 21–30 / 31–40
+        cases = [
+            (0, "kein RLS"),
+            (1, "mildes RLS"),
+            (10, "mildes RLS"),
+            (11, "mittelgradiges RLS"),
+            (20, "mittelgradiges RLS"),
+            (21, "schweres RLS"),
+            (30, "schweres RLS"),
+            (31, "sehr schweres RLS"),
+            (40, "sehr schweres RLS"),
+        ]
+        for total, interpretation in cases:
+            values = {str(i): min(4, max(0, total - 4 * (i - 1))) for i in range(1, 11)}
+            with self.subTest(total=total):
+                result = score_response("IRLS", {"item": integer_items(values)})
+                self.assertEqual(result["total_score"], total)
+                self.assertEqual(result["interpretation"], interpretation)
+
+    def test_irls_partial_and_coding_answers(self):
+        items = [answer("1", valueCoding={"code": "3"}), answer("2", valueInteger=2), {"linkId": "3", "answer": []}]
+
+        result = score_response("irls", {"item": items})
+
+        self.assertEqual(result["total_score"], 5)
+        self.assertEqual(result["computed"]["items"], {"1": 3, "2": 2})
+
+    def test_rls6_domains(self):
+        group = {"linkId": "2", "item": integer_items({"2.1": 4, "2.2": 5, "2.3": 6, "2.4": 7})}
+        result = score_response("RLS-6", {"item": [*integer_items({"1": 2, "3": 3}), group]})
+
+        self.assertIsNone(result["total_score"])
+        self.assertEqual(
+            result["computed"]["domains"],
+            {"sleep_quality": 5, "nighttime": 9, "daytime_relaxation": 6, "control_activity": 7},
+        )
+        self.assertIn("Sleep(1+3)=5", result["interpretation"])
+
+    def test_rls6_missing_item_leaves_domain_empty(self):
+        result = score_response("rls_6", {"item": integer_items({"1": 2})})
+
+        self.assertEqual(
+            result["computed"]["domains"],
+            {"sleep_quality": None, "nighttime": None, "daytime_relaxation": None, "control_activity": None},
+        )
+
+    def test_mhi5_reversal_and_transform(self):
+        cases = [
+            # a, b, c, d, e -> Rohsumme (c, e als 7 - x), 0–100, Interpretation
+            ((1, 1, 6, 1, 6), 5, 0.0, "Hinweis auf psychische Belastung"),
+            ((6, 6, 1, 6, 1), 30, 100.0, "unauffällig"),
+            ((1, 1, 1, 1, 1), 15, 40.0, "Hinweis auf psychische Belastung"),
+            ((4, 4, 4, 4, 4), 18, 52.0, "Hinweis auf psychische Belastung"),
+            ((5, 4, 4, 4, 4), 19, 56.0, "unauffällig"),
+            ((2, 3, 5, 2, 4), 12, 28.0, "Hinweis auf psychische Belastung"),
+        ]
+        for answers, raw_sum, total, interpretation in cases:
+            with self.subTest(answers=answers):
+                result = score_response("MHI-5", mhi5_response(*answers))
+                self.assertEqual(result["computed"]["raw_sum"], raw_sum)
+                self.assertEqual(result["total_score"], total)
+                self.assertEqual(result["interpretation"], interpretation)
+
+    def test_mhi5_requires_all_items(self):
+        result = score_response("MHI-5", mhi5_response(6, 6, 1, 6, None))
+
+        self.assertIsNone(result["total_score"])
+        self.assertIsNone(result["computed"]["raw_sum"])
+        self.assertEqual(result["interpretation"], "keine Interpretation verfügbar")
+
+    def test_unknown_questionnaire_sums_top_level_answers(self):
+        nested = {"linkId": "g", "item": integer_items({"x": 100})}
+        result = score_response("Unbekannt", {"item": [*integer_items({"a": 1, "b": 2}), nested]})
+
+        self.assertEqual(result["total_score"], 3)
+        self.assertEqual(result["interpretation"], "keine Interpretation verfügbar")
+
+
+def random_response(link_ids: list, rng: random.Random, low=0, high=6) -> dict:
+    """
+    Zufällige Response: Antworten als valueInteger oder valueCoding, teils fehlend
+    (ohne Item oder mit leerer answer-Liste), teils in einer Gruppe verschachtelt.
+    """
+    items, group = [], []
+    for link_id in link_ids:
+        roll = rng.random()
+        if roll < 0.1:
+            continue
+        if roll < 0.15:
+            item = {"linkId": link_id, "answer": []}
+        elif roll < 0.5:
+            item = answer(link_id, valueCoding={"code": str(rng.randint(low, high))})
+        else:
+            item = answer(link_id, valueInteger=rng.randint(low, high))
+        (group if rng.random() < 0.3 else items).append(item)
+    if group:
+        items.append({"linkId": "group", "item": group})
+    return {"resourceType": "QuestionnaireResponse", "item": items}
+
+
+@skipIf(batch_scoring.np is None, "numpy ist nicht installiert")
+class BatchScoringEquivalenceTests(TestCase):
+    """
+    batch_scoring (NumPy) muss für jede Response dasselbe liefern wie CompiledScorer.score.
+    """
+
+    RULES = {
+        "reverse_and_rounding": ScoringRule(
+            type="test",
+            items=("a", "b", "c"),
+            reverse={"b": 7},
+            transform=(0, 21, 100),
+            decimals=2,
+            bands=((33.33, "niedrig"), (66.67, "mittel"), (None, "hoch")),
+        ),
+        # (Summe / 20) auf eine Stelle: Werte wie 0.05 rundet np.round anders als round()
+        "rounding_ties": ScoringRule(type="test", items=("a", "b", "c", "d"), transform=(0, 20, 1), decimals=1),
+        "require_all_with_domains": ScoringRule(
+            type="test",
+            items=("a", "b", "c", "d"),
+            reverse={"d": 6},
+            domains={"first": ("a", "b"), "second": ("c", "x")},
+            require_all=True,
+            decimals=0,
+        ),
+    }
+
+    def assert_equivalent(self, scorer, link_ids, low=0, high=6, count=500):
+        rng = random.Random(f"{scorer.rule.type}-{link_ids}")
+        responses = [random_response(link_ids, rng, low, high) for _ in range(count)]
+
+        batch = batch_scoring.score_matrix(scorer, responses).results()
+
+        for response, result in zip(responses, batch):
+            self.assertEqual(result, scorer.score(response), response)
+
+    def test_registered_rules(self):
+        cases = [
+            ("IRLS", [str(i) for i in range(1, 11)], 0, 4),
+            ("RLS-6", ["1", "2.1", "2.2", "2.3", "2.4", "3"], 0, 10),
+            ("MHI-5", ["a", "b", "c", "d", "e"], 1, 6),
+            ("Unbekannt", ["a", "b", "c"], 0, 6),
+        ]
+        for slug, link_ids, low, high in cases:
+            with self.subTest(slug=slug):
+                self.assert_equivalent(get_scorer(slug), link_ids, low, high)
+
+    def test_custom_rules(self):
+        for name, rule in self.RULES.items():
+            with self.subTest(rule=name):
+                self.assert_equivalent(CompiledScorer(rule), ["a", "b", "c", "d", "x"])
+
+    def test_score_responses_groups_by_questionnaire(self):
+        rng = random.Random("mixed")
+        responses = []
+        for slug, link_ids in (("MHI-5", "abcde"), ("IRLS", "123"), ("Tagebuch", "")):
+            for _ in range(20):
+                response = random_response(list(link_ids), rng, 1, 4)
+                response["questionnaire"] = f"Questionnaire/{slug}"
+                responses.append(response)
+        rng.shuffle(responses)
+
+        expected = [score_response(r["questionnaire"].split("/")[-1], r) for r in responses]
+
+        self.assertEqual(batch_scoring.score_responses(responses), expected)
+
+
+def night(**metrics) -> dict:
+    return {metric: metrics.get(metric) for metric in METRICS}
+
+
+class SleepDiaryWindowTests(TestCase):
+    def test_no_entries(self):
+        self.assertEqual(rolling_windows([], (7, 30)), [])
+
+    def test_windows_end_with_latest_night(self):
+        entries = [
+            (date(2026, 3, 1), night(total_sleep_time=300)),
+            (date(2026, 3, 3), night(total_sleep_time=420)),   # erster Tag des 7-Tage-Fensters
+            (date(2026, 3, 2), night(total_sleep_time=360)),   # liegt einen Tag davor
+            (date(2026, 3, 9), night(total_sleep_time=451, sleep_efficiency=90.0)),
+        ]
+
+        week, month = rolling_windows(entries, (7, 30))
+
+        self.assertEqual(
+            (week["window_start"], week["window_end"], week["nights"], week["entries"]),
+            (date(2026, 3, 3), date(2026, 3, 9), 2, 2),
+        )
+        self.assertEqual(week["total_sleep_time"], 435.5)
+        self.assertEqual(week["sleep_efficiency"], 90.0)
+        self.assertIsNone(week["awakenings"])
+        self.assertEqual(
+            (month["window_start"], month["nights"], month["entries"], month["total_sleep_time"]),
+            (date(2026, 2, 8), 4, 4, 382.8),
+        )
+
+    def test_latest_entry_per_day_counts(self):
+        entries = [
+            (date(2026, 3, 9), night(total_sleep_time=300, awakenings=4)),
+            (date(2026, 3, 9), night(total_sleep_time=420)),    # Korrektur derselben Nacht
+        ]
+
+        [window] = rolling_windows(entries, (7,))
+
+        self.assertEqual((window["nights"], window["entries"]), (1, 2))
+        self.assertEqual(window["total_sleep_time"], 420)
+        self.assertIsNone(window["awakenings"])
+
+
+class DiaryDayTests(TestCase):
+    def utc(self, *args) -> datetime:
+        return datetime(*args, tzinfo=dt_timezone.utc)
+
+    def test_utc_midnight(self):
+        self.assertEqual(diary_day(self.utc(2026, 6, 1, 23, 59, 59)), date(2026, 6, 1))
+        self.assertEqual(diary_day(self.utc(2026, 6, 2, 0, 0)), date(2026, 6, 2))
+
+    @override_settings(TIME_ZONE="Europe/Berlin")
+    def test_local_midnight(self):
+        # Sommerzeit: lokale Mitternacht ist 22:00 UTC
+        self.assertEqual(diary_day(self.utc(2026, 6, 1, 21, 59, 59)), date(2026, 6, 1))
+        self.assertEqual(diary_day(self.utc(2026, 6, 1, 22, 0)), date(2026, 6, 2))
+        # Winterzeit: 23:00 UTC
+        self.assertEqual(diary_day(self.utc(2026, 1, 15, 22, 59, 59)), date(2026, 1, 15))
+        self.assertEqual(diary_day(self.utc(2026, 1, 15, 23, 0)), date(2026, 1, 16))
+
+    @override_settings(TIME_ZONE="Europe/Berlin")
+    def test_dst_transitions(self):
+        # 29.03.2026: 02:00 MEZ -> 03:00 MESZ, der Tag hat 23 Stunden
+        self.assertEqual(diary_day(self.utc(2026, 3, 28, 23, 0)), date(2026, 3, 29))
+        self.assertEqual(diary_day(self.utc(2026, 3, 29, 21, 59)), date(2026, 3, 29))
+        self.assertEqual(diary_day(self.utc(2026, 3, 29, 22, 0)), date(2026, 3, 30))
+        # 25.10.2026: 03:00 MESZ -> 02:00 MEZ, der Tag hat 25 Stunden
+        self.assertEqual(diary_day(self.utc(2026, 10, 24, 22, 0)), date(2026, 10, 25))
+        self.assertEqual(diary_day(self.utc(2026, 10, 25, 22, 59)), date(2026, 10, 25))
+        self.assertEqual(diary_day(self.utc(2026, 10, 25, 23, 0)), date(2026, 10, 26))
+
+    @override_settings(TIME_ZONE="Europe/Berlin")
+    def test_window_counts_nights_across_dst(self):
+        entries = [
+            (diary_day(self.utc(2026, 3, 28, 5, 0)), night(total_sleep_time=400)),
+            (diary_day(self.utc(2026, 3, 29, 5, 0)), night(total_sleep_time=380)),
+            (diary_day(self.utc(2026, 3, 29, 22, 30)), night(total_sleep_time=360)),   # 00:30 MESZ am 30.
+        ]
+
+        [window] = rolling_windows(entries, (3,))
+
+        self.assertEqual((window["window_start"], window["window_end"]), (date(2026, 3, 28), date(2026, 3, 30)))
+        self.assertEqual(window["nights"], 3)
+
+
+class QuestionnaireConditionalGetTests(TestCase):
+    def test_etag_varies_by_accept(self):
+        for url in ("/api/questionnaires/", "/api/questionnaires/IRLS/"):
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_ACCEPT="application/json")
+                self.assertEqual(response.status_code, 200)
+                self.assertIn("Accept", response["Vary"])
+
+                cached = self.client.get(url, HTTP_ACCEPT="application/json", HTTP_IF_NONE_MATCH=response["ETag"])
+                self.assertEqual(cached.status_code, 304)
+                self.assertIn("Accept", cached["Vary"])
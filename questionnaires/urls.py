@@ -1,20 +1,41 @@
+from django.conf import settings
 from django.urls import path
 from .views import (
     list_questionnaires,
     questionnaire_detail,
     submit_questionnaire_response,
+    submit_questionnaire_response_async,
+    submit_questionnaire_responses_batch,
     upload_questionnaire_to_firely,
-    get_patient_questionnaire_responses
+    get_patient_questionnaire_responses,
+    get_patient_questionnaire_responses_async,
+    get_patient_score_series,
+    get_patient_diary_summary,
 )
 
+# Unter ASGI blockieren die async Varianten keinen Worker-Thread während Firely-I/O.
+if getattr(settings, "QUESTIONNAIRES_ASYNC_VIEWS", False):
+    submit_view = submit_questionnaire_response_async
+    patient_responses_view = get_patient_questionnaire_responses_async
+else:
+    submit_view = submit_questionnaire_response
+    patient_responses_view = get_patient_questionnaire_responses
+
 urlpatterns = [
-    path("patients/<str:patient_id>/responses/", get_patient_questionnaire_responses),
+    path("patients/<str:patient_id>/responses/", patient_responses_view),
+    path("patients/<str:patient_id>/scores/", get_patient_score_series, name="patient-score-series"),
+    path("patients/<str:patient_id>/diary/", get_patient_diary_summary, name="patient-diary-summary"),
+    path(
+        "questionnaires/responses/batch/",
+        submit_questionnaire_responses_batch,
+        name="questionnaire-submit-responses-batch",
+    ),
     path("questionnaires/<slug:slug>/upload/", upload_questionnaire_to_firely),
     path("questionnaires/", list_questionnaires, name="questionnaire-list"),
     path("questionnaires/<slug:slug>/", questionnaire_detail, name="questionnaire-detail"),
     path(
         "questionnaires/<slug:slug>/responses/",
-        submit_questionnaire_response,
+        submit_view,
         name="questionnaire-submit-response",
     ),
 ]
@@ -0,0 +1,305 @@
+"""
+Vorkompilierte Validierung eingehender QuestionnaireResponse-Items gegen die Questionnaire-Definition.
+
+Pro Questionnaire wird einmal ein Baum aus ItemRule-Knoten gebaut (erlaubte linkIds je
+Ebene, Antworttyp, answerOption-Codes, required/repeats, Min/Max). Die Prüfung eines
+Requests ist danach ein einziger Durchlauf über die Items, ohne Netzwerk und ohne
+fhir.resources/pydantic.
+"""
+
+import re
+import threading
+from dataclasses import dataclass, field
+
+from .questionnaire_loader import registry
+
+MIN_VALUE_URL = "http://hl7.org/fhir/StructureDefinition/minValue"
+MAX_VALUE_URL = "http://hl7.org/fhir/StructureDefinition/maxValue"
+
+# FHIR-Primitive (Regex aus der Spezifikation)
+_PATTERNS = {
+    "valueDate": re.compile(
+        r"^([0-9]([0-9]([0-9][1-9]|[1-9]0)|[1-9]00)|[1-9]000)"
+        r"(-(0[1-9]|1[0-2])(-(0[1-9]|[1-2][0-9]|3[0-1]))?)?$"
+    ),
+    "valueTime": re.compile(r"^([01][0-9]|2[0-3]):[0-5][0-9]:([0-5][0-9]|60)(\.[0-9]{1,9})?$"),
+    "valueDateTime": re.compile(
+        r"^([0-9]([0-9]([0-9][1-9]|[1-9]0)|[1-9]00)|[1-9]000)"
+        r"(-(0[1-9]|1[0-2])(-(0[1-9]|[1-2][0-9]|3[0-1])"
+        r"(T([01][0-9]|2[0-3]):[0-5][0-9]:([0-5][0-9]|60)(\.[0-9]{1,9})?"
+        r"(Z|(\+|-)((0[0-9]|1[0-3]):[0-5][0-9]|14:00)))?)?)?$"
+    ),
+}
+
+
+def _is_int(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _check_string(value) -> bool:
+    return isinstance(value, str) and value.strip() != ""
+
+
+def _int_code(coding: dict) -> int | None:
+    code = coding.get("code")
+    if isinstance(code, str) and re.fullmatch(r"-?[0-9]+", code.strip()):
+        return int(code)
+    return None
+
+
+def _check_coding(value) -> bool:
+    return isinstance(value, dict) and ("code" in value or "display" in value)
+
+
+# value[x] -> Prüffunktion für den Wert
+VALUE_CHECKS = {
+    "valueBoolean": lambda v: isinstance(v, bool),
+    "valueInteger": _is_int,
+    "valueDecimal": _is_number,
+    "valueString": _check_string,
+    "valueUri": _check_string,
+    "valueCoding": _check_coding,
+    "valueDate": lambda v: isinstance(v, str) and _PATTERNS["valueDate"].match(v) is not None,
+    "valueTime": lambda v: isinstance(v, str) and _PATTERNS["valueTime"].match(v) is not None,
+    "valueDateTime": lambda v: isinstance(v, str) and _PATTERNS["valueDateTime"].match(v) is not None,
+    "valueQuantity": lambda v: isinstance(v, dict) and _is_number(v.get("value")),
+    "valueAttachment": lambda v: isinstance(v, dict),
+    "valueReference": lambda v: isinstance(v, dict) and bool(v.get("reference")),
+}
+
+# Questionnaire.item.type -> erlaubte value[x] der Antworten
+ANSWER_TYPES = {
+    "boolean": ("valueBoolean",),
+    "decimal": ("valueDecimal", "valueInteger"),
+    "integer": ("valueInteger", "valueCoding"),     # Coding mit numerischem Code (siehe scoring.answer_to_int)
+    "date": ("valueDate",),
+    "dateTime": ("valueDateTime", "valueDate"),
+    "time": ("valueTime",),
+    "string": ("valueString",),
+    "text": ("valueString",),
+    "url": ("valueUri",),
+    "choice": ("valueCoding",),
+    "coding": ("valueCoding",),      # R5
+    "open-choice": ("valueCoding", "valueString"),
+    "attachment": ("valueAttachment",),
+    "reference": ("valueReference",),
+    "quantity": ("valueQuantity",),
+    "group": (),
+    "display": (),
+    "question": None,               # beliebiger Typ
+}
+
+
+@dataclass
+class ItemRule:
+    """
+    Kompilierte Regel für ein Questionnaire-Item und seine Kinder.
+    """
+
+    link_id: str
+    type: str
+    value_keys: tuple | None
+    required: bool = False
+    repeats: bool = False
+    options: dict | None = None        # value[x] -> frozenset erlaubter Werte/Codes
+    min_value: float | None = None
+    max_value: float | None = None
+    children: dict = field(default_factory=dict)
+    required_children: tuple = ()
+
+
+def _extension_value(item: dict, url: str):
+    for ext in item.get("extension") or ():
+        if ext.get("url") == url:
+            for key, value in ext.items():
+                if key.startswith("value"):
+                    return value
+    return None
+
+
+def _option_key(option: dict):
+    for key, value in option.items():
+        if not key.startswith("value"):
+            continue
+        if key == "valueCoding":
+            return key, value.get("code")
+        if isinstance(value, dict):
+            return None
+        return key, value
+    return None
+
+
+def _compile_items(items) -> tuple:
+    children = {}
+    for item in items or ():
+        rule = _compile_item(item)
+        children[rule.link_id] = rule
+    required = tuple(link_id for link_id, rule in children.items() if rule.required)
+    return children, required
+
+
+def _compile_item(item) -> ItemRule:
+    item_type = item.get("type", "question")
+    options = None
+    if item.get("answerOption"):
+        options = {}
+        for option in item["answerOption"]:
+            key = _option_key(option)
+            if key is not None:
+                options.setdefault(key[0], set()).add(key[1])
+        options = {key: frozenset(values) for key, values in options.items()}
+
+    children, required_children = _compile_items(item.get("item"))
+    return ItemRule(
+        link_id=str(item.get("linkId")),
+        type=item_type,
+        value_keys=ANSWER_TYPES.get(item_type),
+        required=bool(item.get("required")),
+        repeats=bool(item.get("repeats")),
+        options=options,
+        min_value=_extension_value(item, MIN_VALUE_URL),
+        max_value=_extension_value(item, MAX_VALUE_URL),
+        children=children,
+        required_children=required_children,
+    )
+
+
+class ResponseValidator:
+    """
+    Aus einer Questionnaire-Definition kompilierter Validator.
+    validate(items) liefert eine Liste von Fehlern [{"linkId", "error"}] (leer = gültig).
+    """
+
+    def __init__(self, questionnaire):
+        self.children, self.required_children = _compile_items(questionnaire.get("item"))
+
+    def validate(self, items) -> list:
+        errors = []
+        self._validate_level(items, self.children, self.required_children, errors)
+        return errors
+
+    def _validate_level(self, items, children: dict, required: tuple, errors: list):
+        if not isinstance(items, list):
+            errors.append({"linkId": None, "error": "item muss eine Liste sein."})
+            return
+
+        seen = set()
+        for item in items:
+            if not isinstance(item, dict):
+                errors.append({"linkId": None, "error": "Item muss ein Objekt sein."})
+                continue
+
+            link_id = item.get("linkId")
+            rule = children.get(str(link_id)) if link_id is not None else None
+            if rule is None:
+                errors.append({"linkId": link_id, "error": "Unbekannte linkId an dieser Stelle."})
+                continue
+            if rule.link_id in seen and not rule.repeats:
+                errors.append({"linkId": link_id, "error": "Item darf nur einmal vorkommen."})
+            seen.add(rule.link_id)
+            self._validate_item(item, rule, errors)
+
+        for link_id in required:
+            if link_id not in seen:
+                errors.append({"linkId": link_id, "error": "Pflicht-Item fehlt."})
+
+    def _validate_item(self, item: dict, rule: ItemRule, errors: list):
+        answers = item.get("answer") or []
+        nested = item.get("item") or []
+
+        if rule.type in ("group", "display"):
+            if answers:
+                errors.append({"linkId": rule.link_id, "error": f"Item vom Typ {rule.type} hat keine Antworten."})
+            if rule.type == "group":
+                self._validate_level(nested, rule.children, rule.required_children, errors)
+            elif nested:
+                errors.append({"linkId": rule.link_id, "error": "display-Items haben keine Unter-Items."})
+            return
+
+        if not isinstance(answers, list):
+            errors.append({"linkId": rule.link_id, "error": "answer muss eine Liste sein."})
+            return
+        if rule.required and not answers:
+            errors.append({"linkId": rule.link_id, "error": "Antwort fehlt."})
+        if len(answers) > 1 and not rule.repeats:
+            errors.append({"linkId": rule.link_id, "error": "Nur eine Antwort erlaubt."})
+
+        for answer in answers:
+            self._validate_answer(answer, rule, errors)
+
+        # Fragen mit Unter-Items: Kinder stehen in answer.item (bzw. item.item)
+        if nested:
+            self._validate_level(nested, rule.children, (), errors)
+
+    def _validate_answer(self, answer, rule: ItemRule, errors: list):
+        if not isinstance(answer, dict):
+            errors.append({"linkId": rule.link_id, "error": "Antwort muss ein Objekt sein."})
+            return
+
+        value_keys = [key for key in answer if key.startswith("value")]
+        if len(value_keys) != 1:
+            errors.append({"linkId": rule.link_id, "error": "Antwort braucht genau ein value[x]."})
+            return
+
+        key = value_keys[0]
+        value = answer[key]
+        if rule.value_keys is not None and key not in rule.value_keys:
+            allowed = ", ".join(rule.value_keys)
+            errors.append({"linkId": rule.link_id, "error": f"{key} passt nicht zu Typ {rule.type} (erwartet {allowed})."})
+            return
+
+        check = VALUE_CHECKS.get(key)
+        if check is None or not check(value):
+            errors.append({"linkId": rule.link_id, "error": f"Ungültiger Wert für {key}."})
+            return
+
+        if rule.options is not None:
+            allowed = rule.options.get(key)
+            option = value.get("code") if key == "valueCoding" else value
+            if allowed is None or option not in allowed:
+                errors.append({"linkId": rule.link_id, "error": f"Wert {option!r} ist keine erlaubte Antwortoption."})
+                return
+
+        number = value if _is_number(value) else None
+        if rule.type == "integer" and key == "valueCoding":
+            number = _int_code(value)
+            if number is None:
+                errors.append({"linkId": rule.link_id, "error": "valueCoding.code muss bei Typ integer eine ganze Zahl sein."})
+                return
+
+        if rule.min_value is not None and number is not None and number < rule.min_value:
+            errors.append({"linkId": rule.link_id, "error": f"Wert {number} < Minimum {rule.min_value}."})
+        if rule.max_value is not None and number is not None and number > rule.max_value:
+            errors.append({"linkId": rule.link_id, "error": f"Wert {number} > Maximum {rule.max_value}."})
+
+        if answer.get("item"):
+            self._validate_level(answer["item"], rule.children, rule.required_children, errors)
+
+
+_validators = {}        # slug -> (etag, ResponseValidator)
+_validators_lock = threading.Lock()
+
+
+def get_validator(slug: str) -> ResponseValidator:
+    """
+    Validator für den Questionnaire; wird neu kompiliert, wenn sich die JSON-Datei ändert.
+    """
+    entry = registry.get(slug)
+    cached = _validators.get(slug)
+    if cached is not None and cached[0] == entry.etag:
+        return cached[1]
+
+    with _validators_lock:
+        cached = _validators.get(slug)
+        if cached is None or cached[0] != entry.etag:
+            cached = (entry.etag, ResponseValidator(entry.data))
+            _validators[slug] = cached
+        return cached[1]
+
+
+def validate_response_items(slug: str, items) -> list:
+    return get_validator(slug).validate(items)
@@ -1,203 +1,203 @@
 # questionnaires/views.py
 
-import re
+import json
+import logging
+import uuid
+from datetime import timedelta
+from functools import wraps
+from asgiref.sync import sync_to_async
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils.cache import patch_cache_control, patch_vary_headers
 from django.utils.timezone import now
-
-from .questionnaire_loader import load_all_questionnaires, load_questionnaire
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition, require_GET, require_POST
+
+from .questionnaire_loader import (
+    get_questionnaire,
+    load_all_questionnaires,
+    load_questionnaire,
+    questionnaire_exists,
+    registry,
+)
+from . import async_firely_client, outbox, response_cache, score_table
+from .scoring import score_response
+from .validation import VALUE_CHECKS, validate_response_items
 from .firely_client import (
+    bundle_entry_id,
+    bundle_entry_status,
+    make_bundle,
+    post_bundle,
     upload_questionnaire,
     upload_questionnaire_response,
-    get_patient_responses,
 )
 
+logger = logging.getLogger(__name__)
+
+# Maximale Anzahl Einträge pro Batch-Submit
+BATCH_MAX_ENTRIES = 500
+
+# Toleranz für abweichende Geräteuhren beim authored des Clients
+AUTHORED_CLOCK_SKEW = timedelta(minutes=5)
+
+# Seitengröße (?limit=) für /api/patients/<patient_id>/responses/
+RESPONSES_PAGE_SIZE = 100
+RESPONSES_MAX_PAGE_SIZE = 500
+
 
 # ----------------------------
-# Helpers
+# Submit / Auswertung (gemeinsam für sync + async Views)
 # ----------------------------
 
-def normalize_slug(slug: str) -> str:
-    """
-    Normalisiert Slugs robust:
-    - strip / lower
-    - "_" -> "-"
-    - CR/LF entfernen
-    - führende/abschließende "/" entfernen
-    - Sonderzeichen entfernen (nur [a-z0-9-] bleibt)
-    """
-    s = (slug or "").strip().lower()
-    s = s.replace("_", "-")
-    s = s.replace("\n", "").replace("\r", "")
-    s = s.strip("/")
-    s = re.sub(r"[^a-z0-9\-]", "", s)
-    return s
-
+class SubmissionError(Exception):
+    def __init__(self, detail: str, status_code: int, errors: list | None = None):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+        self.errors = errors
 
-def slug_key(slug: str) -> str:
-    """
-    Für stabile Erkennung unabhängig von Bindestrichen:
-    "rls-6" -> "rls6"
-    """
-    return normalize_slug(slug).replace("-", "")
+    def as_dict(self) -> dict:
+        body = {"detail": self.detail}
+        if self.errors:
+            body["errors"] = self.errors
+        return body
 
 
-def answer_to_int(answer_obj: dict):
+def prepare_submission(slug: str, data) -> dict:
     """
-    Unterstützt:
-    - {"valueInteger": 3}
-    - {"valueCoding": {"code": "3"}}
+    Prüft den Request-Body, baut die FHIR QuestionnaireResponse und berechnet die Scores.
+    Liefert den Antwort-Body (ohne Upload zu Firely), wirft SubmissionError bei ungültiger Eingabe.
     """
-    if not isinstance(answer_obj, dict):
-        return None
+    # Questionnaire existiert?
+    if not questionnaire_exists(slug):
+        raise SubmissionError(
+            f"Questionnaire with slug '{slug}' not found.",
+            status.HTTP_404_NOT_FOUND,
+        )
 
-    if "valueInteger" in answer_obj:
-        try:
-            return int(answer_obj["valueInteger"])
-        except (TypeError, ValueError):
-            return None
+    patient_id = data.get("patient_id")
+    payload = data.get("fhir_response")
 
-    coding = answer_obj.get("valueCoding")
-    if isinstance(coding, dict) and "code" in coding:
-        try:
-            return int(coding["code"])
-        except (TypeError, ValueError):
-            return None
+    if not patient_id or not payload:
+        raise SubmissionError(
+            "patient_id und fhir_response sind erforderlich.",
+            status.HTTP_400_BAD_REQUEST,
+        )
+    if not isinstance(payload, dict):
+        raise SubmissionError("fhir_response muss ein Objekt sein.", status.HTTP_400_BAD_REQUEST)
+
+    # Items lokal gegen die Questionnaire-Definition prüfen (vor jedem Firely-Request)
+    errors = validate_response_items(slug, payload.get("item", []))
+    if errors:
+        raise SubmissionError(
+            "Antworten passen nicht zum Questionnaire.",
+            status.HTTP_400_BAD_REQUEST,
+            errors=errors,
+        )
 
-    return None
+    # authored vom Client (z.B. nachgereichte Tagebuch-Einträge), sonst jetzt
+    authored = payload.get("authored")
+    if authored is None:
+        authored = now().isoformat()
+    else:
+        parsed = response_cache.parse_fhir_datetime(authored) if VALUE_CHECKS["valueDateTime"](authored) else None
+        if parsed is None:
+            raise SubmissionError("authored muss ein FHIR dateTime sein.", status.HTTP_400_BAD_REQUEST)
+        if parsed > now() + AUTHORED_CLOCK_SKEW:
+            raise SubmissionError("authored darf nicht in der Zukunft liegen.", status.HTTP_400_BAD_REQUEST)
 
+    # FHIR QuestionnaireResponse (R5)
+    qr = {
+        "resourceType": "QuestionnaireResponse",
+        "identifier": response_cache.local_identifier(uuid.uuid4()),
+        "status": "completed",
+        "authored": authored,
+        "questionnaire": f"Questionnaire/{slug}",
+        "subject": {"reference": f"Patient/{patient_id}"},
+        "item": payload.get("item", []),
+    }
 
-def calculate_total_score_from_response(qr: dict) -> int:
-    """
-    Summiert alle numerischen Antworten aus einer QuestionnaireResponse.
-    """
-    total = 0
-    for item in (qr.get("item") or []):
-        answers = item.get("answer") or []
-        if not answers:
-            continue
-        v = answer_to_int(answers[0])
-        if v is not None:
-            total += v
-    return total
+    # Auswertung nach der registrierten Regel (IRLS: Gesamtscore, RLS-6: Domains, MHI-5: 0–100)
+    result = score_response(slug, qr)
 
+    return {
+        "questionnaire_slug": slug,
+        "patient_id": patient_id,
+        "total_score": result["total_score"],
+        "interpretation": result["interpretation"],
+        "fhir_response": qr,
+        "computed": result["computed"],
+    }
 
-def score_rls6(qr: dict) -> dict:
-    """
-    RLS-6 domain-basiert (kein Gesamtscore):
-    - Sleep quality: Items 1 + 6
-    - Nighttime RLS: Items 2 + 3
-    - Daytime relaxation: Item 4
-    - Control (activity/mimics): Item 5
-    """
-    values = {}
 
-    for item in (qr.get("item") or []):
-        link_id = item.get("linkId")
-        if not link_id:
-            continue
+# ----------------------------
+# Conditional GET (ETag / Last-Modified)
+# ----------------------------
 
-        answers = item.get("answer") or []
-        if not answers:
-            continue
+def _list_etag(request):
+    return registry.listing().etag
 
-        v = answer_to_int(answers[0])
-        if v is not None:
-            values[str(link_id)] = v
 
-    sleep_quality = (values["1"] + values["6"]) if "1" in values and "6" in values else None
-    nighttime = (values["2"] + values["3"]) if "2" in values and "3" in values else None
-    daytime_relax = values.get("4")
-    control_activity = values.get("5")
+def _list_last_modified(request):
+    return registry.listing().last_modified
 
-    return {
-        "type": "rls6_domains",
-        "sleep_quality_items_1_6": sleep_quality,
-        "nighttime_items_2_3": nighttime,
-        "daytime_relaxation_item_4": daytime_relax,
-        "control_activity_item_5": control_activity,
-        "raw": values,
-    }
 
-def score_mhi5(qr: dict) -> dict:
-    """
-    MHI-5 Gesamtscore (0-100):
-    - Items a-e
-    - Umkehrung bei c und e
+def _detail_etag(request, slug):
+    try:
+        return registry.get(slug).etag
+    except (FileNotFoundError, ValueError):
+        return None
 
-    """
-    values = {}
 
-    for item in (qr.get("item") or[]):
-        link_id = item.get("linkId")
-        answers = item.get("answer"), []
-        if not link_id:
-            continue
-        a0 = answers[0]
-
-        if "valueInteger" in a0:
-            values[link_id]=int(a0["valueInteger"])
-        elif "valueCoding" in a0 and "code" in a0["valueCoding"]:
-            values[link_id]=int(a0["valueCoding"]["code"])    
-
-        #direct
-        a = values.get("a")
-        b = values.get("b")
-        d = values.get("d")    
-        #inversion
-        c= 7 - values.get("c") if "c" in values else None
-        e= 7 - values.get("e") if "e" in values else None
-
-        raw_sum = sum(v for v in [a,b,c,d,e] if v is not None)
-
-        transformed = None
-        if raw_sum  is not None:
-            transformed= round(((raw_sum - 5) / 20) * 100,1)
-
-            return {
-                "type": "mhi5",
-                "total_score": transformed,
-                "raw_items": values,
-                "raw_sum":raw_sum
-            }
-        
-                 
+def _detail_last_modified(request, slug):
+    try:
+        return registry.get(slug).last_modified
+    except (FileNotFoundError, ValueError):
+        return None
 
-def interpret_score(questionnaire_slug: str, total_score: int) -> str:
+
+def questionnaire_cache_control(view):
     """
-    Interpretation nur für Scores, die einen Gesamtscore haben (z.B. IRLS).
+    Cache-Control für Questionnaire-Definitionen: Clients dürfen sie
+    QUESTIONNAIRE_CACHE_MAX_AGE Sekunden cachen und danach per ETag revalidieren.
+    Vary: Accept, weil JSON und Browsable API (HTML) unter derselben URL und mit
+    demselben ETag ausgeliefert werden.
     """
-    key = slug_key(questionnaire_slug)
-
-    # IRLS: 0–40
-    if key == "irls":
-        if total_score == 0:
-            return "kein RLS"
-        if total_score <= 10:
-            return "mildes RLS"
-        if total_score <= 20:
-            return "mittelgradiges RLS"
-        if total_score <= 30:
-            return "schweres RLS"
-        return "sehr schweres RLS"
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            patch_cache_control(
+                response,
+                public=True,
+                max_age=settings.QUESTIONNAIRE_CACHE_MAX_AGE,
+            )
+            patch_vary_headers(response, ("Accept",))
+        return response
 
-    return "keine Interpretation verfügbar"
+    return wrapper
 
 
 # ----------------------------
 # Endpoints
 # ----------------------------
 
+@questionnaire_cache_control
+@condition(etag_func=_list_etag, last_modified_func=_list_last_modified)
 @api_view(["GET"])
 def list_questionnaires(request):
     return Response(load_all_questionnaires())
 
 
+@questionnaire_cache_control
+@condition(etag_func=_detail_etag, last_modified_func=_detail_last_modified)
 @api_view(["GET"])
 def questionnaire_detail(request, slug):
     try:
-        data = load_questionnaire(slug)
+        data = get_questionnaire(slug)
         return Response(data)
     except FileNotFoundError:
         return Response(
@@ -222,73 +222,148 @@ def submit_questionnaire_response(request, slug: str):
       }
     }
     """
-    # Questionnaire existiert?
     try:
-        load_questionnaire(slug)
-    except FileNotFoundError:
+        result = prepare_submission(slug, request.data)
+    except SubmissionError as e:
+        return Response(e.as_dict(), status=e.status_code)
+
+    if outbox.is_enabled():
+        # Write-behind: lokal speichern, drain_firely_outbox überträgt an Firely
+        obj = outbox.enqueue(result)
         return Response(
-            {"detail": f"Questionnaire with slug '{slug}' not found."},
-            status=status.HTTP_404_NOT_FOUND,
+            {**result, "outbox_id": obj.id, "delivery_status": obj.delivery_status},
+            status=status.HTTP_201_CREATED,
         )
 
-    patient_id = request.data.get("patient_id")
-    payload = request.data.get("fhir_response")
+    # Speichern in Firely
+    try:
+        created = upload_questionnaire_response(result["fhir_response"])
+    except Exception as e:
+        return Response(
+            {"detail": "Fehler beim Speichern in Firely", "error": str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        )
 
-    if not patient_id or not payload:
+    response_cache.store_delivered([(result, created.get("id"), created)])
+    return Response(result, status=status.HTTP_201_CREATED)
+
+
+@api_view(["POST"])
+def submit_questionnaire_responses_batch(request):
+    """
+    POST /api/questionnaires/responses/batch/
+
+    Mehrere Antworten (auch verschiedener Questionnaires) in einem Request, z.B. wenn
+    die App nach Offline-Zeit Tagebuch-Einträge nachreicht. Alle Einträge werden
+    ausgewertet und als ein FHIR Bundle (batch oder transaction) an Firely geschickt.
+
+    Body:
+    {
+      "type": "batch",            // optional, "batch" (default) oder "transaction"
+      "entries": [
+        {"questionnaire_slug": "Tagebuch", "patient_id": "123",
+         "fhir_response": {"authored": "2025-06-02T07:15:00+02:00", "item": [...]}},
+        ...
+      ]
+    }
+
+    fhir_response.authored (optional, FHIR dateTime, nicht in der Zukunft) ist der Zeitpunkt
+    des Eintrags in der App; ohne Angabe gilt der Zeitpunkt des Requests.
+
+    - batch: ungültige Einträge werden übersprungen, jeder Eintrag bekommt sein eigenes Ergebnis
+    - transaction: alles oder nichts, bei einem ungültigen Eintrag wird nichts gespeichert
+
+    Mit aktivierter Outbox (FIRELY_OUTBOX["ENABLED"]) werden batch-Einträge nur lokal
+    gespeichert (ein bulk_create) und später vom Drain-Worker übertragen. Eine transaction
+    geht immer direkt an Firely: der Drain-Worker überträgt einzeln, das Ergebnis
+    "alles oder nichts" gibt es nur synchron.
+    """
+    bundle_type = request.data.get("type") or "batch"
+    entries = request.data.get("entries")
+
+    if bundle_type not in ("batch", "transaction"):
         return Response(
-            {"detail": "patient_id und fhir_response sind erforderlich."},
+            {"detail": "type muss 'batch' oder 'transaction' sein."},
             status=status.HTTP_400_BAD_REQUEST,
         )
 
-    # FHIR QuestionnaireResponse (R5)
-    qr = {
-        "resourceType": "QuestionnaireResponse",
-        "status": "completed",
-        "authored": now().isoformat(),
-        "questionnaire": f"Questionnaire/{slug}",
-        "subject": {"reference": f"Patient/{patient_id}"},
-        "item": payload.get("item", []),
-    }
+    if not isinstance(entries, list) or not entries:
+        return Response(
+            {"detail": "entries (Liste) ist erforderlich."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
 
-    key = slug_key(slug)
-
-    # RLS-6 -> domains
-    if key == "rls6":
-        computed = score_rls6(qr)
-        total_score = None
-        interpretation = (
-            "RLS-6 wird domain-basiert ausgewertet (kein Gesamtscore). "
-            f"Sleep(1+6)={computed.get('sleep_quality_items_1_6')}, "
-            f"Night(2+3)={computed.get('nighttime_items_2_3')}, "
-            f"DayRelax(4)={computed.get('daytime_relaxation_item_4')}, "
-            f"Control(5)={computed.get('control_activity_item_5')}"
+    if len(entries) > BATCH_MAX_ENTRIES:
+        return Response(
+            {"detail": f"Maximal {BATCH_MAX_ENTRIES} Einträge pro Batch."},
+            status=status.HTTP_400_BAD_REQUEST,
         )
-    else:
-        # IRLS -> totalscore
-        total_score = calculate_total_score_from_response(qr)
-        interpretation = interpret_score(slug, total_score)
-        computed = {"type": "total_score", "total_score": total_score}
 
-    # Speichern in Firely
-    try:
-        upload_questionnaire_response(qr)
-    except Exception as e:
+    results = [None] * len(entries)
+    prepared = []  # (index, result)
+
+    for index, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            results[index] = {"index": index, "status": status.HTTP_400_BAD_REQUEST, "detail": "Eintrag muss ein Objekt sein."}
+            continue
+        try:
+            result = prepare_submission(entry.get("questionnaire_slug") or "", entry)
+        except SubmissionError as e:
+            results[index] = {"index": index, "status": e.status_code, **e.as_dict()}
+            continue
+        prepared.append((index, result))
+
+    if bundle_type == "transaction" and len(prepared) != len(entries):
         return Response(
-            {"detail": "Fehler beim Speichern in Firely", "error": str(e)},
-            status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            {"type": bundle_type, "results": [r for r in results if r is not None]},
+            status=status.HTTP_400_BAD_REQUEST,
         )
 
-    return Response(
-        {
-            "questionnaire_slug": slug,
-            "patient_id": patient_id,
-            "total_score": total_score,
-            "interpretation": interpretation,
-            "fhir_response": qr,
-            "computed": computed,
-        },
-        status=status.HTTP_201_CREATED,
-    )
+    if prepared and outbox.is_enabled() and bundle_type == "batch":
+        # Write-behind: alle Einträge in einem bulk_create, Firely-Upload übernimmt der Drain-Worker
+        objs = outbox.enqueue_many([result for _, result in prepared])
+        for (index, result), obj in zip(prepared, objs):
+            result.pop("fhir_response")
+            results[index] = {
+                "index": index,
+                "status": status.HTTP_201_CREATED,
+                "outbox_id": obj.id,
+                "delivery_status": obj.delivery_status,
+                **result,
+            }
+
+    elif prepared:
+        bundle = make_bundle(
+            [result["fhir_response"] for _, result in prepared],
+            bundle_type=bundle_type,
+        )
+
+        # Speichern in Firely (ein Round-Trip für alle Einträge)
+        try:
+            response_bundle = post_bundle(bundle)
+        except Exception as e:
+            return Response(
+                {"detail": "Fehler beim Speichern in Firely", "error": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+        response_entries = response_bundle.get("entry") or []
+        delivered = []
+        for position, (index, result) in enumerate(prepared):
+            response_entry = response_entries[position] if position < len(response_entries) else {}
+            code = bundle_entry_status(response_entry)
+            if code is not None and 200 <= code < 300:
+                delivered.append((dict(result), bundle_entry_id(response_entry), response_entry.get("resource")))
+            result.pop("fhir_response")
+            results[index] = {
+                "index": index,
+                "status": bundle_entry_status(response_entry),
+                "location": (response_entry.get("response") or {}).get("location"),
+                **result,
+            }
+        response_cache.store_delivered(delivered)
+
+    return Response({"type": bundle_type, "results": results})
 
 
 @api_view(["POST"])
@@ -317,55 +392,199 @@ def upload_questionnaire_to_firely(request, slug: str):
     return Response(result)
 
 
+def parse_date_params(params) -> dict:
+    """
+    ?from=/?to= (FHIR-Datum bzw. dateTime, inklusive) -> {"authored_from", "authored_to"}.
+    Ein reines Datum in ?to= wird zu authored_before (Folgetag, exklusiv), damit der
+    ganze Tag enthalten ist.
+    """
+    dates = {}
+    for key, name in (("from", "authored_from"), ("to", "authored_to")):
+        raw = params.get(key)
+        if raw:
+            dates[name] = response_cache.parse_fhir_datetime(raw)
+            if dates[name] is None:
+                raise ValueError(f"Ungültiges Datum für '{key}': {raw}")
+
+    day_end = response_cache.fhir_date_end(params.get("to"))
+    if day_end is not None:
+        del dates["authored_to"]
+        dates["authored_before"] = day_end
+    return dates
+
+
+def parse_responses_query(params) -> dict:
+    """
+    Query-Parameter des Responses-Endpoints -> kwargs für response_cache.page_patient_responses.
+    Wirft ValueError bei ungültigen Werten.
+    """
+    query = parse_date_params(params)
+    if params.get("questionnaire"):
+        query["questionnaire"] = params["questionnaire"]
+
+    try:
+        limit = int(params.get("limit", RESPONSES_PAGE_SIZE))
+    except ValueError:
+        raise ValueError("limit muss eine Zahl sein.") from None
+    if not 1 <= limit <= RESPONSES_MAX_PAGE_SIZE:
+        raise ValueError(f"limit muss zwischen 1 und {RESPONSES_MAX_PAGE_SIZE} liegen.")
+    query["limit"] = limit
+
+    cursor = params.get("cursor")
+    if cursor:
+        response_cache.decode_cursor(cursor)
+        query["cursor"] = cursor
+
+    fields = None
+    if params.get("fields"):
+        fields = [f.strip() for f in params["fields"].split(",") if f.strip()]
+        unknown = sorted(set(fields) - set(response_cache.RESPONSE_FIELDS))
+        if unknown:
+            raise ValueError(f"Unbekannte Felder: {', '.join(unknown)}")
+    if params.get("include_raw", "").lower() in ("0", "false", "no"):
+        fields = [f for f in (fields or response_cache.RESPONSE_FIELDS) if f != "raw"]
+    query["fields"] = fields
+
+    return query
+
+
 @api_view(["GET"])
 def get_patient_questionnaire_responses(request, patient_id: str):
     """
     GET /api/patients/<patient_id>/responses/
+        ?questionnaire=IRLS&from=2025-01-01&to=2025-06-30
+        &limit=100&cursor=<next_cursor>&include_raw=false&fields=authored,score
+
+    Liest aus dem lokalen Cache; neue Responses werden vorher inkrementell aus Firely
+    nachgeladen (siehe response_cache.sync_patient). Seitenweise nach authored
+    sortiert, die nächste Seite gibt es mit ?cursor=<next_cursor>.
+    """
+    try:
+        query = parse_responses_query(request.query_params)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    error = _sync_patient_cache(patient_id)
+    if error is not None:
+        return error
+
+    page = response_cache.page_patient_responses(patient_id, **query)
+
+    return Response({"patient_id": patient_id, **page})
+
+
+def _sync_patient_cache(patient_id: str):
+    """
+    Lädt neue Responses aus Firely nach. Fehler sind nur fatal (-> 500 Response),
+    solange für den Patienten noch nie synchronisiert wurde.
     """
     try:
-        bundle = get_patient_responses(patient_id)
+        response_cache.sync_patient(patient_id)
     except Exception as e:
-        return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        if not response_cache.is_synced(patient_id):
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        logger.warning("Firely-Sync für Patient %s fehlgeschlagen, liefere Cache: %s", patient_id, e)
+    return None
 
-    entries = bundle.get("entry") or []
-    results = []
 
-    for entry in entries:
-        res = entry.get("resource")
-        if not res:
-            continue
+@api_view(["GET"])
+def get_patient_score_series(request, patient_id: str):
+    """
+    GET /api/patients/<patient_id>/scores/?questionnaire=IRLS&from=2025-01-01&to=2025-06-30
 
-        questionnaire_ref = res.get("questionnaire")  # "Questionnaire/RLS-6"
-        authored = res.get("authored")
-
-        qslug = None
-        score = None
-        interpretation = None
-        computed = None
-
-        if questionnaire_ref:
-            qslug = questionnaire_ref.split("/")[-1]
-            qkey = slug_key(qslug)
-
-            if qkey == "rls6":
-                computed = score_rls6(res)
-                score = None
-                interpretation = "RLS-6 wird domain-basiert ausgewertet (kein Gesamtscore)."
-            else:
-                score = calculate_total_score_from_response(res)
-                interpretation = interpret_score(qslug, score)
-                computed = {"type": "total_score", "total_score": score}
-
-        results.append(
-            {
-                "questionnaire": qslug,
-                "score": score,
-                "computed": computed,
-                "interpretation": interpretation,
-                "authored": authored,
-                "raw": res,
-            }
+    Score-Verlauf aus der materialisierten Score-Tabelle (ein Index-Range-Scan,
+    ohne FHIR-JSON zu parsen). from/to: FHIR-Datum bzw. dateTime, inklusive.
+    """
+    try:
+        dates = parse_date_params(request.query_params)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    error = _sync_patient_cache(patient_id)
+    if error is not None:
+        return error
+
+    questionnaire = request.query_params.get("questionnaire")
+    points = score_table.read_score_series(patient_id, questionnaire=questionnaire, **dates)
+    return Response({"patient_id": patient_id, "questionnaire": questionnaire, "points": points})
+
+
+@api_view(["GET"])
+def get_patient_diary_summary(request, patient_id: str):
+    """
+    GET /api/patients/<patient_id>/diary/
+
+    Rollierende Schlaftagebuch-Kennzahlen (Mittelwerte über 7 bzw. 30 Tage bis zum
+    jüngsten Eintrag), vorberechnet beim Speichern der Einträge. days_since_last_entry
+    gibt an, wie lange das Fenster zurückliegt (0 = Eintrag von heute).
+    """
+    error = _sync_patient_cache(patient_id)
+    if error is not None:
+        return error
+
+    return Response({"patient_id": patient_id, "windows": score_table.read_diary_aggregates(patient_id)})
+
+
+# ----------------------------
+# Async Endpoints (ASGI, settings.QUESTIONNAIRES_ASYNC_VIEWS)
+# ----------------------------
+
+@csrf_exempt
+@require_POST
+async def submit_questionnaire_response_async(request, slug: str):
+    """
+    POST /api/questionnaires/<slug>/responses/ (async, gleiche Semantik wie sync)
+    """
+    try:
+        data = json.loads(request.body or b"{}")
+    except ValueError:
+        return JsonResponse({"detail": "Ungültiges JSON."}, status=status.HTTP_400_BAD_REQUEST)
+
+    if not isinstance(data, dict):
+        return JsonResponse({"detail": "Ungültiges JSON."}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        result = prepare_submission(slug, data)
+    except SubmissionError as e:
+        return JsonResponse(e.as_dict(), status=e.status_code)
+
+    if outbox.is_enabled():
+        # Write-behind: lokal speichern, drain_firely_outbox überträgt an Firely
+        obj = await sync_to_async(outbox.enqueue)(result)
+        return JsonResponse(
+            {**result, "outbox_id": obj.id, "delivery_status": obj.delivery_status},
+            status=status.HTTP_201_CREATED,
+        )
+
+    # Speichern in Firely
+    try:
+        created = await async_firely_client.upload_questionnaire_response(result["fhir_response"])
+    except Exception as e:
+        return JsonResponse(
+            {"detail": "Fehler beim Speichern in Firely", "error": str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR,
         )
 
-    results.sort(key=lambda x: x["authored"] or "")
-    return Response({"patient_id": patient_id, "responses": results})
+    await sync_to_async(response_cache.store_delivered)([(result, created.get("id"), created)])
+    return JsonResponse(result, status=status.HTTP_201_CREATED)
+
+
+@require_GET
+async def get_patient_questionnaire_responses_async(request, patient_id: str):
+    """
+    GET /api/patients/<patient_id>/responses/ (async, gleiche Semantik wie sync)
+    """
+    try:
+        query = parse_responses_query(request.GET)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        await response_cache.async_sync_patient(patient_id)
+    except Exception as e:
+        if not await sync_to_async(response_cache.is_synced)(patient_id):
+            return JsonResponse({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        logger.warning("Firely-Sync für Patient %s fehlgeschlagen, liefere Cache: %s", patient_id, e)
+
+    page = await sync_to_async(response_cache.page_patient_responses)(patient_id, **query)
+    return JsonResponse({"patient_id": patient_id, **page})
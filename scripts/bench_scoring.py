@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+"""
+Benchmark: Auswertung pro Response (scoring.score_response) vs. Batch (batch_scoring).
+
+    python scripts/bench_scoring.py --n 20000
+
+"Batch (dicts)" liefert dieselben Ergebnisse wie score_response() (wird geprüft),
+"Batch (Spalten)" nur die Arrays (BatchScores), wie sie Kohorten-Auswertungen nutzen.
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from questionnaires.batch_scoring import score_matrix, score_responses  # noqa: E402
+from questionnaires.scoring import get_scorer, score_response  # noqa: E402
+
+
+def integer_item(link_id, value):
+    return {"linkId": link_id, "answer": [{"valueInteger": value}]}
+
+
+def coding_item(link_id, value):
+    return {"linkId": link_id, "answer": [{"valueCoding": {"code": str(value)}}]}
+
+
+def fake_irls(rng):
+    return {"item": [integer_item(str(i), rng.randint(0, 4)) for i in range(1, 11)]}
+
+
+def fake_rls6(rng):
+    return {
+        "item": [
+            integer_item("1", rng.randint(0, 10)),
+            {"linkId": "2", "item": [integer_item(f"2.{i}", rng.randint(0, 10)) for i in range(1, 5)]},
+            integer_item("3", rng.randint(0, 10)),
+        ]
+    }
+
+
+def fake_mhi5(rng):
+    return {"item": [{"linkId": "mhi5", "item": [coding_item(x, rng.randint(1, 6)) for x in "abcde"]}]}
+
+
+FAKES = {"IRLS": fake_irls, "RLS-6": fake_rls6, "MHI-5": fake_mhi5}
+
+
+def build(n, seed):
+    rng = random.Random(seed)
+    responses = []
+    for i in range(n):
+        slug = list(FAKES)[i % len(FAKES)]
+        qr = FAKES[slug](rng)
+        qr["resourceType"] = "QuestionnaireResponse"
+        qr["questionnaire"] = f"Questionnaire/{slug}"
+        responses.append(qr)
+    return responses
+
+
+def best_of(repeat, fn):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=20000, help="Anzahl Responses")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    responses = build(args.n, args.seed)
+
+    def per_response():
+        return [score_response(res["questionnaire"].split("/")[-1], res) for res in responses]
+
+    groups = {}
+    for res in responses:
+        groups.setdefault(res["questionnaire"].split("/")[-1], []).append(res)
+
+    def columnar():
+        return [score_matrix(get_scorer(slug), members) for slug, members in groups.items()]
+
+    single_time, single = best_of(args.repeat, per_response)
+    batch_time, batch = best_of(args.repeat, lambda: score_responses(responses))
+    matrix_time, _ = best_of(args.repeat, columnar)
+
+    if single != batch:
+        mismatch = next(i for i, (a, b) in enumerate(zip(single, batch)) if a != b)
+        print(f"Ergebnisse weichen ab (Response {mismatch}): {single[mismatch]} != {batch[mismatch]}")
+        return 1
+
+    print(f"{args.n} Responses, best of {args.repeat}")
+    rows = [
+        ("pro Response (dicts)", single_time),
+        ("Batch (dicts)", batch_time),
+        ("Batch (Spalten)", matrix_time),
+    ]
+    for label, seconds in rows:
+        print(
+            f"  {label:<22}{seconds * 1000:8.1f} ms  {args.n / seconds:>10,.0f}/s"
+            f"  {single_time / seconds:6.2f}x"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())